@@ -0,0 +1,172 @@
+"""
+Description:    Library to calculate the B1 field of a calculated birdcage coil with Biot-Savart, and its homogeneity.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import numpy as np
+
+MU0_4PI = 1e-7  # mu0 / 4pi in T*m/A
+CHUNK_SIZE = 2 ** 18  # max number of point-segment pairs calculated at once, bounds the memory use to ~30 MB
+
+PLANES = {"xy": (0, 1, 2), "xz": (0, 2, 1), "yz": (1, 2, 0)}  # in-plane axes and the normal axis
+
+
+def conductorSegments(solver, shield=True):
+	"""Returns the start points, end points (both [segments, 3] in m) and currents of all straight conductors of a solved coil.
+
+	Legs run along z from -leg_length/2 to +leg_length/2 and carry legcurrs. End ring segment i connects leg i to leg i+1
+	and carries ercurrs, in the opposite direction on the bottom ring. With a shield the mirrored legs are added with
+	opposite currents, the same way the solver accounts for the shield.
+	"""
+	n = solver.nr_of_legs
+	x = np.array(solver.xcoords, dtype=float) / 100
+	y = np.array(solver.ycoords, dtype=float) / 100
+	half = solver.leg_length / 200
+	legcurrs = np.array(solver.legcurrs, dtype=float)
+	ercurrs = np.array(solver.ercurrs, dtype=float)
+
+	bottom = np.stack((x, y, np.full(n, -half)), axis=1)
+	top = np.stack((x, y, np.full(n, half)), axis=1)
+	next_ = np.roll(np.arange(n), -1)
+
+	starts = [bottom, top, bottom[next_]]
+	ends = [top, top[next_], bottom]
+	currents = [legcurrs, ercurrs, ercurrs]
+
+	if shield and solver.shield_radius != 0:
+		image = (solver.shield_radius / 100) ** 2 / np.hypot(x, y)
+		thetas = np.arctan2(y, x)
+		image_x = image * np.cos(thetas)
+		image_y = image * np.sin(thetas)
+		starts.append(np.stack((image_x, image_y, np.full(n, -half)), axis=1))
+		ends.append(np.stack((image_x, image_y, np.full(n, half)), axis=1))
+		currents.append(-legcurrs)
+
+	return np.concatenate(starts), np.concatenate(ends), np.concatenate(currents)
+
+
+def fieldAt(points, starts, ends, currents, chunk_size=CHUNK_SIZE):
+	"""Magnetic field (T, [points, 3]) of straight current segments at the given points ([points, 3] in m).
+
+	Uses the closed form Biot-Savart solution of a finite straight segment. The points are calculated in chunks,
+	so the temporary [points, segments] arrays stay below chunk_size elements. Points on a conductor give nan.
+	"""
+	points = np.asarray(points, dtype=float).reshape(-1, 3)
+	field = np.empty_like(points)
+	step = max(1, chunk_size // max(1, len(starts)))
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		for first in range(0, len(points), step):
+			p = points[first:first + step]
+			# [points, segments] arrays per component are faster than [points, segments, 3]
+			ax, ay, az = (starts[None, :, k] - p[:, k, None] for k in range(3))
+			bx, by, bz = (ends[None, :, k] - p[:, k, None] for k in range(3))
+			len_a = np.sqrt(ax * ax + ay * ay + az * az)
+			len_b = np.sqrt(bx * bx + by * by + bz * bz)
+			len_ab = len_a * len_b
+			factor = currents * (len_a + len_b) / (len_ab * (len_ab + ax * bx + ay * by + az * bz))
+			field[first:first + step, 0] = (factor * (ay * bz - az * by)).sum(axis=1)
+			field[first:first + step, 1] = (factor * (az * bx - ax * bz)).sum(axis=1)
+			field[first:first + step, 2] = (factor * (ax * by - ay * bx)).sum(axis=1)
+
+	return field * MU0_4PI
+
+
+class B1Map:
+	# Field of a coil on a regular grid. axes holds the x, y and z coordinates (cm) of the grid, field is [x, y, z, 3] in uT.
+	# A slice has one coordinate along its normal axis.
+
+	def __init__(self, axes, field, radius, short_radius, half_length):
+		self.axes = axes
+		self.field = field
+		self.radius = radius
+		self.short_radius = short_radius
+		self.half_length = half_length
+
+	@property
+	def magnitude(self):
+		# transverse B1 (the part that excites spins), z is along the main field
+		return np.hypot(self.field[..., 0], self.field[..., 1])
+
+	def image(self):
+		# 2D transverse field of a slice, for drawing
+		return np.squeeze(self.magnitude)
+
+	def coordinates(self):
+		# x, y, z (cm) of every grid point, each with the grid shape
+		return np.meshgrid(*self.axes, indexing='ij')
+
+	def roiMask(self, fraction=0.5):
+		# grid points within an ellipsoid of fraction times the coil radii and half the leg length
+		x, y, z = self.coordinates()
+		return (x / (fraction * self.radius)) ** 2 + (y / (fraction * self.short_radius)) ** 2 + (z / (fraction * self.half_length)) ** 2 <= 1
+
+	def homogeneity(self, fraction=0.5):
+		"""Homogeneity of the transverse field within the region of interest (see roiMask).
+
+		Returns a dict with the mean, min and max field in uT, the peak-to-peak deviation (max - min) / mean
+		and the standard deviation / mean, both in percent.
+		"""
+		values = self.magnitude[self.roiMask(fraction)]
+		values = values[np.isfinite(values)]
+		if values.size == 0:
+			raise ValueError("Region of interest contains no grid points")
+
+		mean = values.mean()
+		return {"mean": mean,
+				"min": values.min(),
+				"max": values.max(),
+				"peak_to_peak": (values.max() - values.min()) / mean * 100,
+				"std": values.std() / mean * 100}
+
+
+def _extents(solver):
+	return solver.coil_radius, solver.coil_shortradius, solver.leg_length / 2
+
+
+def calcB1Slice(solver, resolution=128, plane="xy", position=0, extent=None, shield=True):
+	"""Calculates the field of a solved coil (a BirdcageSolver) on a resolution x resolution slice.
+
+	plane is "xy" (transverse), "xz" or "yz", at position (cm) along the remaining axis. extent (cm) is the half width
+	of the square slice, by default the largest coil radius. Currents are the relative currents of the solver,
+	so the field is in uT per A of the leg with the largest current.
+	"""
+	if plane not in PLANES:
+		raise ValueError(f"Unknown plane '{plane}', use one of {', '.join(PLANES)}")
+	radius, short_radius, half_length = _extents(solver)
+	if extent is None:
+		extent = max(radius, short_radius)
+
+	first, second, _ = PLANES[plane]
+	axes = [np.array([position], dtype=float)] * 3
+	axes[first] = np.linspace(-extent, extent, resolution)
+	axes[second] = np.linspace(-extent, extent, resolution)
+	return _calcMap(solver, axes, shield, radius, short_radius, half_length)
+
+
+def calcB1Volume(solver, resolution=32, extent=None, shield=True):
+	"""Calculates the field of a solved coil on a 3D grid of resolution points in every direction.
+
+	extent is (x, y, z) half sizes in cm, by default the coil radii and half the leg length.
+	"""
+	radius, short_radius, half_length = _extents(solver)
+	if extent is None:
+		extent = (radius, short_radius, half_length)
+	axes = [np.linspace(-e, e, resolution) for e in extent]
+	return _calcMap(solver, axes, shield, radius, short_radius, half_length)
+
+
+def _calcMap(solver, axes, shield, radius, short_radius, half_length):
+	starts, ends, currents = conductorSegments(solver, shield)
+	scale = np.abs(solver.legcurrs).max()
+
+	grid = np.meshgrid(*axes, indexing='ij')
+	points = np.stack([g.ravel() for g in grid], axis=1) / 100
+	field = fieldAt(points, starts, ends, currents / scale) * 1e6
+
+	field = field.reshape(tuple(len(a) for a in axes) + (3,))
+	return B1Map(axes, field, radius, short_radius, half_length)
@@ -0,0 +1,349 @@
+"""
+Description:    Vectorized (NumPy) version of the birdcage math, to calculate many coil designs at once.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+In a circular coil the distance between two legs (and between a leg and a mirrored leg) only depends on how many legs
+apart they are. The Grover kernels are therefore evaluated once per offset for every design, and the sums over all
+legs become a matrix product with the current ratios, which are the same for all designs with the same number of legs.
+
+With dtype=np.float32 the [batch, legs] arrays (coordinates, distances, inductance tables and their products with the
+currents) are kept in single precision, which halves the memory and bandwidth of large batches. The steps that lose
+precision in float32 stay in float64: the differences of arctanh terms of the end ring segments (calculated per block
+of rows from the exact coordinates) and the capacitance formula with its denominator of nearly cancelling terms. See
+comparePrecision for the error this gives.
+"""
+
+import math
+import time
+import tracemalloc
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, solve, RESULT_COLUMNS, ELLIPSE, RECT, HIGHPASS, LOWPASS, BANDPASS, LEG, ER
+
+BLOCK_SIZE = 16384  # elements of the inductance tables that are calculated in float64 at a time
+
+
+def settingsToColumns(settings_list):
+	# list of BirdcageSettings -> dict of arrays, one array per setting
+	return {key: np.array([getattr(s, key) for s in settings_list]) for key in BirdcageSettings.DEFAULTS.keys()}
+
+
+def solveBatch(settings_list, solve_columns=None):
+	"""Calculates a list of BirdcageSettings and returns a list of result dicts (see RESULT_COLUMNS).
+
+	Designs are grouped per number of legs and every group is calculated in one vectorized pass, with solve_columns
+	(default: solveColumns). Elliptical coils are not vectorized and go through the scalar solver.
+	"""
+	solve_columns = solve_columns or solveColumns
+	results = [None] * len(settings_list)
+
+	groups = {}
+	for i, settings in enumerate(settings_list):
+		if settings.coil_shape == ELLIPSE:
+			results[i] = solve(settings).results()
+		else:
+			groups.setdefault(int(settings.nr_of_legs), []).append(i)
+
+	for nr_of_legs, indices in groups.items():
+		columns = solve_columns(settingsToColumns([settings_list[i] for i in indices]), nr_of_legs)
+		for row, i in enumerate(indices):
+			results[i] = {key: float(columns[key][row]) for key in RESULT_COLUMNS}
+			results[i]["capacitors"] = [results[i]["capacitor"]] * (nr_of_legs // 4)  # all equal on a circular coil
+
+	return results
+
+
+def solveColumns(columns, nr_of_legs, dtype=np.float64):
+	"""Calculates a batch of circular coils with the same number of legs.
+
+	columns is a dict with one array per BirdcageSettings key (see settingsToColumns).
+	Returns a dict with one array per RESULT_COLUMNS key, of dtype. Invalid inputs give nan/inf instead of raising.
+	"""
+	with np.errstate(divide='ignore', invalid='ignore'):
+		geometry = calcGeometry(columns, nr_of_legs, dtype)
+		leg_self_ind, er_self_ind = calcSelfInductances(columns, geometry["er_segment_length"])
+		legeff = calcEffLeg(columns, geometry, leg_self_ind)
+		ereff = calcEffER(geometry, er_self_ind)
+		cap = calcCapacitance(columns, geometry, legeff, ereff)
+
+	k = nr_of_legs // 4 - 1
+	return _results(cap, geometry, leg_self_ind, er_self_ind, legeff[:, k], ereff[:, k], dtype)
+
+
+def _results(cap, geometry, leg_self_ind, er_self_ind, leg_eff, er_eff, dtype):
+	results = {"capacitor": cap,
+				"er_segment_length": geometry["er_segment_length"],
+				"er_self_ind": er_self_ind,
+				"leg_self_ind": leg_self_ind,
+				"er_eff_ind": er_eff * 1e9,
+				"leg_eff_ind": leg_eff * 1e9}
+	return {key: np.asarray(value).astype(dtype, copy=False) for key, value in results.items()}
+
+
+def solveColumnsCirculant(columns, nr_of_legs, dtype=np.float64):
+	"""The same as solveColumns, but only the two legs and the end ring segment the capacitor depends on are calculated.
+
+	The inductance tables per offset are still made for all legs, but the products with the currents are only taken
+	for those columns, so the work per design grows with the number of legs instead of its square. The effective
+	inductances of the other elements are not needed for the results.
+	"""
+	k = nr_of_legs // 4 - 1
+	legs = (k, k + 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		geometry = calcGeometry(columns, nr_of_legs, dtype)
+		leg_self_ind, er_self_ind = calcSelfInductances(columns, geometry["er_segment_length"])
+		legeff = calcEffLeg(columns, geometry, leg_self_ind, legs)
+		ereff = calcEffER(geometry, er_self_ind, legs)
+		cap = calcCapacitance(columns, geometry, legeff, ereff, legs)
+
+	return _results(cap, geometry, leg_self_ind, er_self_ind, legeff[:, 0], ereff[:, 0], dtype)
+
+
+def comparePrecision(columns, nr_of_legs, dtype=np.float32, solve_columns=None, measure=False):
+	"""Calculates a batch in float64 and in dtype (with solve_columns, default: solveColumns) and compares them.
+
+	Returns {"error": {key: largest relative difference}}, with measure also "time": {dtype name: s} and
+	"memory": {dtype name: peak bytes}.
+	"""
+	solve_columns = solve_columns or solveColumns
+	report = {"error": {}}
+	if measure:
+		report.update(time={}, memory={})
+	results = {}
+	for current in (np.float64, dtype):
+		name = np.dtype(current).name
+		start = time.perf_counter()
+		results[name] = solve_columns(columns, nr_of_legs, current)
+		if measure:
+			report["time"][name] = time.perf_counter() - start
+			tracemalloc.start()
+			solve_columns(columns, nr_of_legs, current)
+			report["memory"][name] = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+
+	reference = results["float64"]
+	reduced = results[np.dtype(dtype).name]
+	for key in RESULT_COLUMNS:
+		valid = np.isfinite(reference[key]) & (reference[key] != 0)
+		difference = np.abs(reduced[key][valid] - reference[key][valid]) / np.abs(reference[key][valid])
+		report["error"][key] = float(difference.max()) if difference.size else 0.0
+	return report
+
+
+def calcGeometry(columns, nr_of_legs, dtype=np.float64):
+	# the [batch, legs] coordinates are of dtype, the per design values and the currents stay float64
+	coil_radius = np.asarray(columns["coil_diameter"], dtype=float) / 2
+	n = nr_of_legs
+	dtype = np.dtype(dtype)
+
+	thetas = math.pi / n * (2 * np.arange(n) + 1)
+	if dtype == np.float64:
+		xcoords = coil_radius[:, None] * np.cos(thetas)[None, :]
+		ycoords = coil_radius[:, None] * np.sin(thetas)[None, :]
+	else:
+		xcoords = coil_radius.astype(dtype)[:, None] * np.cos(thetas).astype(dtype)[None, :]
+		ycoords = coil_radius.astype(dtype)[:, None] * np.sin(thetas).astype(dtype)[None, :]
+
+	# circular coil: legcurrs reduces to cos(theta), the same for every design
+	legcurrs = np.broadcast_to(np.cos(thetas), xcoords.shape)
+	ercurrs = np.cumsum(np.cos(thetas))
+	ercurrs[n // 2 - 1] = 0
+	ercurrs[n - 1] = 0
+	ercurrs = np.broadcast_to(ercurrs, xcoords.shape)
+
+	return {"nr_of_legs": n,
+			"coil_radius": coil_radius,
+			"thetas": thetas,
+			"xcoords": xcoords,
+			"ycoords": ycoords,
+			"legcurrs": legcurrs,
+			"ercurrs": ercurrs,
+			"er_segment_length": 2 * math.pi * (coil_radius / n),
+			"dtype": dtype}
+
+
+def _selfInductance(length, config, width, od, id_):
+	# Self inductance of a rectangular strip or a (hollow) tube in nH
+	n = id_ / od
+	rect = 2 * length * (np.log(2 * length / width) + 0.5)
+	solid = 2 * length * (np.log(4 * length / od) - 0.75)
+	hollow = 2 * length * (np.log(4 * length / od) + (0.1493 * n ** 3 - 0.3606 * n ** 2 - 0.0405 * n + 0.2526) - 1)
+	return np.where(config == RECT, rect, np.where(n == 0, solid, hollow))
+
+
+def calcSelfInductances(columns, er_segment_length):
+	er_self_ind = _selfInductance(er_segment_length, np.asarray(columns["er_config"]), np.asarray(columns["er_width"], dtype=float),
+									np.asarray(columns["er_od"], dtype=float), np.asarray(columns["er_id"], dtype=float))
+	leg_length = np.asarray(columns["leg_length"], dtype=float)
+	leg_self_ind = _selfInductance(leg_length, np.asarray(columns["leg_config"]), np.asarray(columns["leg_width"], dtype=float),
+									np.asarray(columns["leg_od"], dtype=float), np.asarray(columns["leg_id"], dtype=float))
+	return leg_self_ind, er_self_ind
+
+
+def mutualInductance(length, distance):
+	# Mutual inductance (nH) of two parallel filaments of equal length at the given distance (Grover)
+	ratio = length / distance
+	return 2 * length * (np.log(ratio + np.sqrt(1 + ratio ** 2)) - np.sqrt(1 + (distance / length) ** 2) + distance / length)
+
+
+def _offsetWeights(currents, absolute=False, legs=None):
+	"""W[o, i] = I(i + o) / I(i) for one set of currents, 0 where I(i) is 0.
+
+	In a circular coil the mutual inductance of two elements only depends on their offset o, so with a [batch, o] table
+	of the mutual inductances sum_j M(i, j) * I(j) / I(i) becomes the matrix product table @ W.
+	legs selects the columns i (default: all).
+	"""
+	n = len(currents)
+	index = np.arange(n)
+	legs = index if legs is None else np.asarray(legs)
+	safe = np.where(currents[legs] != 0, currents[legs], 1)
+	weights = currents[(index[:, None] + legs[None, :]) % n] / safe[None, :]
+	if absolute:
+		weights = np.abs(weights)
+	return np.where(currents[legs][None, :] != 0, weights, 0)
+
+
+def calcEffLeg(columns, geometry, leg_self_ind, legs=None):
+	# [batch, legs] effective inductances of the legs (default: all)
+	dtype = geometry["dtype"]
+	radius = geometry["coil_radius"][:, None]
+	cos_thetas = np.cos(geometry["thetas"])
+	sin_thetas = np.sin(geometry["thetas"])
+	weights = _offsetWeights(geometry["legcurrs"][0], legs=legs).astype(dtype)  # the currents are the same for every circular coil
+	leg_length = np.asarray(columns["leg_length"], dtype=float)[:, None]
+	shield_radius = np.asarray(columns["shield_diameter"], dtype=float) / 2
+	image_radius = (shield_radius ** 2 / geometry["coil_radius"])[:, None]
+
+	# mutual inductance of leg 0 with every other leg (the same for all legs at that offset) and with the mirror
+	# currents in the RF shield, in float64 per block of rows because the terms cancel for distant legs
+	table = np.empty((len(radius), len(cos_thetas)), dtype=dtype)
+	image_table = np.empty_like(table)
+	block = max(1, BLOCK_SIZE // len(cos_thetas))
+	for start in range(0, len(radius), block):
+		rows = slice(start, start + block)
+		x = radius[rows] * cos_thetas
+		y = radius[rows] * sin_thetas
+		distance = np.sqrt((x - x[:, :1]) ** 2 + (y - y[:, :1]) ** 2)
+		table[rows] = mutualInductance(leg_length[rows], distance)
+		distance = np.sqrt((image_radius[rows] * cos_thetas - x[:, :1]) ** 2 + (image_radius[rows] * sin_thetas - y[:, :1]) ** 2)
+		image_table[rows] = mutualInductance(leg_length[rows], distance)
+	table[:, 0] = leg_self_ind
+	legeff = table @ weights
+	legeff += np.where(shield_radius[:, None] != 0, -(image_table @ weights), 0)
+
+	return legeff * 1e-9
+
+
+def _segmentMutual(ax, ay, bx, by, cx, cy, dx, dy):
+	# Mutual inductance term of two non-parallel straight segments A->B and C->D (Grover), as used in the original
+	sqrt_ = np.sqrt((bx - ax) ** 2 + (by - ay) ** 2)
+	sqrt2 = np.sqrt((dx - cx) ** 2 + (dy - cy) ** 2)
+	a2 = (ax - cx) ** 2 + (ay - cy) ** 2
+	a3 = (bx - cx) ** 2 + (by - cy) ** 2
+	a4 = (ax - dx) ** 2 + (ay - dy) ** 2
+	a5 = (bx - dx) ** 2 + (by - dy) ** 2
+	n13 = a3 - a2 + a4 - a5
+	n14 = n13 / (sqrt2 * sqrt_)
+	den = 4 * sqrt2 ** 2 * sqrt_ ** 2 - n13 ** 2
+	safe_den = np.where(den == 0, 1, den)
+	n17 = np.where(den == 0, 0, (2 * sqrt_ ** 2 * (a4 - a2 - sqrt2 ** 2) + n13 * (a3 - a2 - sqrt_ ** 2)) * sqrt2 / safe_den)
+	n18 = np.where(den == 0, 0, (2 * sqrt2 ** 2 * (a3 - a2 - sqrt_ ** 2) + n13 * (a4 - a2 - sqrt2 ** 2)) * sqrt_ / safe_den)
+
+	sqrt3 = np.sqrt(a3)
+	sqrt4 = np.sqrt(a2)
+	sqrt5 = np.sqrt(a4)
+	sqrt6 = np.sqrt(a5)
+	return n14 * ((n17 + sqrt2) * np.arctanh(sqrt_ / (sqrt6 + sqrt5)) + (n18 + sqrt_) * np.arctanh(sqrt2 / (sqrt6 + sqrt3)) - n17
+					* np.arctanh(sqrt_ / (sqrt4 + sqrt3)) - n18 * np.arctanh(sqrt2 / (sqrt5 + sqrt4)))
+
+
+def _neighbourMutual(length_a, length_b, length_c):
+	# Mutual inductance term of two segments sharing one end point, with length_c the distance between the free ends
+	return np.abs(2 * ((length_b ** 2 + length_a ** 2 - length_c ** 2) / (2 * length_b * length_a))
+					* (length_b * np.arctanh(length_a / (length_b + length_c)) + length_a * np.arctanh(length_b / (length_a + length_c))))
+
+
+def calcEffER(geometry, er_self_ind, legs=None):
+	# [batch, legs] effective inductances of the end ring segments after the legs (default: all)
+	n = geometry["nr_of_legs"]
+	dtype = geometry["dtype"]
+	radius = geometry["coil_radius"][:, None]
+	cos_thetas = np.cos(geometry["thetas"])
+	sin_thetas = np.sin(geometry["thetas"])
+	index = np.arange(n) if legs is None else np.asarray(legs)
+	ercurrs = geometry["ercurrs"][0]  # the same for every circular coil
+	nonzero = ercurrs[index] != 0
+
+	def leg(i):
+		# float64 coordinates, also when the geometry is float32
+		return radius[:, 0] * cos_thetas[i % n], radius[:, 0] * sin_thetas[i % n]
+
+	def length(a, b):
+		return np.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2)
+
+	# every term is calculated for segment 0 (leg 0 -> leg 1) only, all segments of a circular coil see the same
+	leg0, leg1 = leg(0), leg(1)
+	segment = length(leg0, leg1)
+	ereff = np.broadcast_to(er_self_ind[:, None], (len(radius), len(index))).astype(dtype)
+
+	# opposite segment
+	ereff += np.where(nonzero, mutualInductance(segment, length(leg(n // 2), leg1))[:, None], 0)
+
+	# neighbouring segments
+	abs_ = _neighbourMutual(segment, length(leg1, leg(2)), length(leg(2), leg0))
+	abs2 = _neighbourMutual(length(leg0, leg(-1)), segment, length(leg1, leg(-1)))
+	safe = np.where(nonzero, ercurrs[index], 1)
+	ereff += np.where(nonzero, abs_[:, None] * (ercurrs[(index + 1) % n] / safe) + abs2[:, None] * (ercurrs[(index - 1) % n] / safe), 0)
+
+	# all other segments, except the parallel (opposite) one
+	offsets = np.array([o for o in range(2, n - 1) if o != n // 2])
+	if len(offsets):
+		# the arctanh terms nearly cancel, so they are calculated in float64 per block of rows
+		cos_start, sin_start = cos_thetas[offsets], sin_thetas[offsets]
+		cos_end, sin_end = cos_thetas[(offsets + 1) % n], sin_thetas[(offsets + 1) % n]
+		table = np.empty((len(radius), len(offsets)), dtype=dtype)
+		block = max(1, BLOCK_SIZE // len(offsets))
+		for start in range(0, len(radius), block):
+			rows = slice(start, start + block)
+			r = radius[rows]
+			table[rows] = _segmentMutual(leg0[0][rows, None], leg0[1][rows, None], leg1[0][rows, None], leg1[1][rows, None],
+											r * cos_start, r * sin_start, r * cos_end, r * sin_end)
+		ereff += table @ _offsetWeights(ercurrs, absolute=True, legs=legs)[offsets].astype(dtype)
+
+	return ereff * 1e-9
+
+
+def calcCapacitance(columns, geometry, legeff, ereff, legs=None):
+	# legs are the columns of legeff and ereff (default: all), they have to include n/4 - 1 and n/4
+	n = geometry["nr_of_legs"]
+	k = n // 4 - 1
+	column = {leg: i for i, leg in enumerate(range(n) if legs is None else legs)}
+	legcurr = geometry["legcurrs"][:, k]
+	next_legcurr = geometry["legcurrs"][:, k + 1]
+	ercurr = geometry["ercurrs"][:, k]
+	# in float64, the terms of the denominators nearly cancel
+	leg_eff = legeff[:, column[k]].astype(float)
+	next_leg_eff = legeff[:, column[k + 1]].astype(float)
+	er_eff = ereff[:, column[k]].astype(float)
+	coil_mode = np.asarray(columns["coil_mode"])
+	bp_config = np.asarray(columns["bp_config"])
+	bp_cap = np.asarray(columns["bp_cap"], dtype=float)
+	omega = 2 * math.pi * np.asarray(columns["res_freq"], dtype=float) * 1e6
+
+	bandpass = coil_mode == BANDPASS
+	caps_on_er = (coil_mode == HIGHPASS) | (bandpass & (bp_config == LEG))
+
+	# capacitors on the end ring segments
+	array = 0.5 * omega * leg_eff * legcurr
+	n2 = np.where(bandpass, -0.5 * (legcurr / (omega * bp_cap)) * 1e12, 0)
+	cap_er = ercurr / (omega ** 2 * ercurr * er_eff + omega * 2 * (array + n2)) * 1e12
+
+	# capacitors on the legs
+	n3 = -ercurr * (omega ** 2 * er_eff - np.where(bandpass & (bp_config == ER), 1 / bp_cap * 1e12, 0))
+	n4 = next_legcurr * omega ** 2 * next_leg_eff
+	cap_leg = next_legcurr / (n4 + n3) * 1e12
+
+	return np.where(caps_on_er, cap_er, np.where((coil_mode == LOWPASS) | bandpass, cap_leg, np.nan))
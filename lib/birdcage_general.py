@@ -0,0 +1,273 @@
+"""
+Description:    Library to calculate birdcage coils with arbitrary leg positions and current patterns.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The coil is a ladder network. Leg k stands at (x[k], y[k]) and end ring segment k runs straight from leg k to leg k+1,
+in the top ring and (with the opposite current) in the bottom ring. With leg currents I the end ring currents follow
+from Kirchhoff's current law, J[k] = J[k-1] + I[k]. Every mesh k (leg k, top segment k, leg k+1, bottom segment k)
+gives one voltage equation
+
+	I[k] s_leg[k] - I[k+1] s_leg[k+1] + 2 J[k] s_er[k] = w^2 X[k],   X[k] = (M_leg I)[k] - (M_leg I)[k+1] + 2 (M_er J)[k]
+
+with s = 1/C the elastances of the capacitors and M_leg, M_er the full mutual inductance matrices of the legs (with
+their mirror images in the shield) and of the end ring segments. The unknown elastances follow from this linear
+system. As in the solver, the two end rings do not couple to each other and the legs do not couple to the end rings.
+The end ring flux (M_er J)[k] uses the same terms as BirdcageSolver._calcEffER: the self inductance of the arc between
+the legs, the opposite and neighbouring segments with their current ratios and the other segments with the absolute
+current ratios, taken from the phase of the pattern and its quadrature pattern (see BirdcageSolver._currentRatio). For
+equally spaced legs and the homogeneous pattern the capacitors are those of the solver.
+"""
+
+import math
+import numpy as np
+from lib.birdcage_math import HIGHPASS, LOWPASS, BANDPASS, LEG
+from lib.birdcage_batch import settingsToColumns, calcSelfInductances, mutualInductance, _segmentMutual, _neighbourMutual
+
+PARALLEL_TOLERANCE = 1e-9  # relative cross product below which two end ring segments count as parallel
+ZERO_CURRENT = 1e-9  # currents below this fraction of the largest one count as zero
+
+
+def circularPositions(nr_of_legs, diameter, removed=()):
+	# x, y (cm) of equally spaced legs on a circle as in the solver, without the leg numbers in removed (e.g. a window)
+	thetas = math.pi / nr_of_legs * (2 * np.arange(nr_of_legs) + 1)
+	thetas = np.delete(thetas, list(removed))
+	return diameter / 2 * np.cos(thetas), diameter / 2 * np.sin(thetas)
+
+
+def homogeneousCurrents(xcoords, ycoords, angle=0):
+	"""Leg currents for a homogeneous field at arbitrary leg positions.
+
+	Every leg carries the cos(theta - angle) current density of an ideal birdcage over the arc it covers (half way to
+	both neighbours), relative to the arc of equally spaced legs. The mean is subtracted, so the currents obey
+	Kirchhoff's law. For equally spaced legs and angle 0 these are the currents of the solver.
+	"""
+	return modeCurrents(xcoords, ycoords, 1, angle)
+
+
+def modeCurrents(xcoords, ycoords, m, angle=0):
+	"""Leg currents of azimuthal mode m, cos(m * (theta - angle)) sampled like homogeneousCurrents().
+
+	m = 1 is the homogeneous mode. m and angle may be sequences, which gives a [modes, legs] array. A mode above half
+	the number of legs aliases to a lower one.
+	"""
+	thetas = np.arctan2(ycoords, xcoords)
+	arcs = ((np.roll(thetas, -1) - np.roll(thetas, 1)) % (2 * math.pi)) / 2
+	m = np.asarray(m, dtype=float)[..., None]
+	angle = np.asarray(angle, dtype=float)[..., None]
+	currents = np.cos(m * (thetas - angle)) * arcs / (2 * math.pi / len(thetas))
+	return currents - currents.mean(axis=-1, keepdims=True)
+
+
+def quadratureCurrents(xcoords, ycoords, m, angle=0):
+	# the pattern of modeCurrents() turned a quarter period, for GeneralBirdcage.solve()
+	return modeCurrents(xcoords, ycoords, m, np.asarray(angle, dtype=float) + math.pi / (2 * np.asarray(m, dtype=float)))
+
+
+def allModes(xcoords, ycoords):
+	"""The cos and sin pattern of every mode m = 1 .. legs/2, for solving them all at once.
+
+	Returns the list of (m, angle), the [modes, legs] currents and their quadrature patterns. Patterns without leg
+	currents (like the cos pattern of the highest mode of equally spaced legs) are left out.
+	"""
+	modes = [(m, a) for m in range(1, len(xcoords) // 2 + 1) for a in (0, math.pi / (2 * m))]
+	currents = modeCurrents(xcoords, ycoords, *zip(*modes))
+	quadrature = quadratureCurrents(xcoords, ycoords, *zip(*modes))
+	scale = np.abs(currents).max(axis=1)
+	keep = scale > ZERO_CURRENT * scale.max()
+	return [mode for mode, k in zip(modes, keep) if k], currents[keep], quadrature[keep]
+
+
+def _parallelMutual(ax, ay, bx, by, cx, cy, dx, dy):
+	# Mutual inductance (nH) of two parallel straight segments A->B and C->D, at any offset along their direction (Grover)
+	length = np.sqrt((bx - ax) ** 2 + (by - ay) ** 2)
+	ux, uy = (bx - ax) / length, (by - ay) / length
+	distance = np.abs(ux * (cy - ay) - uy * (cx - ax))
+	start = ux * (cx - ax) + uy * (cy - ay)
+	end = ux * (dx - ax) + uy * (dy - ay)
+	sign = np.sign(end - start)
+	start, end = np.minimum(start, end), np.maximum(start, end)
+
+	def f(t):
+		return t * np.arcsinh(t / distance) - np.sqrt(t ** 2 + distance ** 2)
+
+	return sign * (f(end) - f(end - length) - f(start) + f(start - length))
+
+
+class GeneralResult:
+	# Currents and capacitors (pF) of one current pattern. leg_caps and er_caps hold the capacitor of every leg and
+	# end ring segment (the same in the top and bottom ring). nan means no capacitor there, or a zero current that leaves
+	# the value free. A negative value means the pattern can not be tuned with capacitors at that place.
+
+	def __init__(self, legcurrs, ercurrs, leg_caps, er_caps, leg_eff_ind, er_eff_ind, solved_legs):
+		self.legcurrs = legcurrs
+		self.ercurrs = ercurrs
+		self.leg_caps = leg_caps
+		self.er_caps = er_caps
+		self.leg_eff_ind = leg_eff_ind
+		self.er_eff_ind = er_eff_ind
+		self.solved_legs = solved_legs
+
+	@property
+	def capacitors(self):
+		# the solved capacitors: in the end ring for high-pass coils, in the legs for low-pass
+		return self.leg_caps if self.solved_legs else self.er_caps
+
+
+class GeneralBirdcage:
+	"""A coil with legs at arbitrary positions (cm), given in order around the end rings.
+
+	The conductor sizes, shield, frequency and coil mode come from a BirdcageSettings, nr_of_legs and the coil diameters
+	are not used. The inductance matrices are calculated once, after which solve() handles any current pattern.
+	The shield is a circle around (0, 0).
+	"""
+
+	def __init__(self, settings, xcoords, ycoords):
+		self.settings = settings
+		self.xcoords = np.asarray(xcoords, dtype=float)
+		self.ycoords = np.asarray(ycoords, dtype=float)
+		self.nr_of_legs = len(self.xcoords)
+		if self.nr_of_legs < 4 or len(self.ycoords) != self.nr_of_legs:
+			raise ValueError("Give the x and y coordinates of at least 4 legs")
+		if settings.coil_mode not in (HIGHPASS, LOWPASS, BANDPASS):
+			raise ValueError(f"Unknown coil mode {settings.coil_mode}")
+
+		self.omega = 2 * math.pi * settings.res_freq * 1e6
+		columns = settingsToColumns([settings])
+		x, y = self.xcoords, self.ycoords
+		next_x, next_y = np.roll(x, -1), np.roll(y, -1)
+		self.er_lengths = np.sqrt((next_x - x) ** 2 + (next_y - y) ** 2)
+		# the self inductance is that of the arc between the legs around (0, 0), like the solver
+		angles = (np.arctan2(next_y, next_x) - np.arctan2(y, x)) % (2 * math.pi)
+		self.er_arcs = (np.sqrt(x ** 2 + y ** 2) + np.sqrt(next_x ** 2 + next_y ** 2)) / 2 * angles
+		leg_self_ind, er_self_ind = calcSelfInductances(columns, self.er_arcs)
+
+		self.leg_matrix = self._legMatrix(leg_self_ind[0])
+		self.er_matrix = self._erMatrix(er_self_ind)
+
+	def _legMatrix(self, leg_self_ind):
+		x, y = self.xcoords, self.ycoords
+		length = float(self.settings.leg_length)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			matrix = mutualInductance(length, np.sqrt((x[None, :] - x[:, None]) ** 2 + (y[None, :] - y[:, None]) ** 2))
+			np.fill_diagonal(matrix, leg_self_ind)
+
+			# mirror currents in the RF shield
+			shield_radius = self.settings.shield_diameter / 2
+			if shield_radius != 0:
+				scale = shield_radius ** 2 / (x ** 2 + y ** 2)
+				distance = np.sqrt(((scale * x)[None, :] - x[:, None]) ** 2 + ((scale * y)[None, :] - y[:, None]) ** 2)
+				matrix -= mutualInductance(length, distance)
+		return matrix
+
+	def _erMatrix(self, er_self_ind):
+		# [segment, segment] mutual inductances of the end ring segments, signed by their directions. The neighbours are
+		# absolute values, as in the solver.
+		n = self.nr_of_legs
+		x, y = self.xcoords, self.ycoords
+		index = np.arange(n)
+		i, j = index[:, None], index[None, :]
+		ax, ay, bx, by = x[i], y[i], x[(i + 1) % n], y[(i + 1) % n]
+		cx, cy, dx, dy = x[j], y[j], x[(j + 1) % n], y[(j + 1) % n]
+		cross = (bx - ax) * (dy - cy) - (by - ay) * (dx - cx)
+		lengths = self.er_lengths[i] * self.er_lengths[j]
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			parallel = np.abs(cross) <= PARALLEL_TOLERANCE * lengths
+			matrix = np.where(parallel, _parallelMutual(ax, ay, bx, by, cx, cy, dx, dy), _segmentMutual(ax, ay, bx, by, cx, cy, dx, dy))
+
+			# segments k and k+1 share leg k+1
+			after = (index + 1) % n
+			touching = _neighbourMutual(self.er_lengths, self.er_lengths[after], np.sqrt((x[(index + 2) % n] - x) ** 2 + (y[(index + 2) % n] - y) ** 2))
+		matrix[index, after] = touching
+		matrix[after, index] = touching
+		matrix[index, index] = er_self_ind
+		return matrix
+
+	def solve(self, legcurrs=None, quadrature=None):
+		"""Capacitors that make the given leg currents resonate at the frequency of the settings.
+
+		legcurrs defaults to homogeneousCurrents() and has to sum to zero. A [patterns, legs] array solves all patterns
+		at once against the same inductance matrices, and gives a GeneralResult of [patterns, legs] arrays.
+		quadrature are the leg currents of the same patterns turned a quarter period (see quadratureCurrents), which set
+		the current ratios of the end ring (see the module description). Without them the ratios of the end ring
+		currents themselves are used, as the solver does for the one segment of a circular coil it calculates.
+		High-pass coils (and band-pass with fixed leg capacitors) solve the end ring capacitors, one per mesh equation.
+		The current circulating through the whole ring is free then and set to zero on average. Low-pass coils (and
+		band-pass with fixed end ring capacitors) solve the leg capacitors. Their mesh equations only fix differences
+		between neighbouring legs, so the circulating current follows from the voltage around the end ring and the leg
+		voltages are set to zero on average.
+		"""
+		settings = self.settings
+		n = self.nr_of_legs
+		if legcurrs is None:
+			legcurrs = homogeneousCurrents(self.xcoords, self.ycoords)
+			if quadrature is None:
+				quadrature = homogeneousCurrents(self.xcoords, self.ycoords, math.pi / 2)
+		legcurrs = np.asarray(legcurrs, dtype=float)
+		single = legcurrs.ndim == 1
+		legcurrs = np.atleast_2d(legcurrs)
+		quadrature = np.zeros_like(legcurrs) if quadrature is None else np.atleast_2d(np.asarray(quadrature, dtype=float))
+		if legcurrs.ndim != 2 or legcurrs.shape[1] != n or quadrature.shape != legcurrs.shape:
+			raise ValueError(f"Give one current for each of the {n} legs")
+		for currents in (legcurrs, quadrature):
+			if (np.abs(currents.sum(axis=1)) > 1e-9 * np.abs(currents).sum(axis=1)).any():
+				raise ValueError("The leg currents have to sum to zero")
+
+		omega2 = self.omega ** 2 * 1e-9  # the inductances are in nH
+		fixed = 1 / (settings.bp_cap * 1e-12) if settings.coil_mode == BANDPASS else 0
+		solve_legs = settings.coil_mode == LOWPASS or (settings.coil_mode == BANDPASS and settings.bp_config != LEG)
+
+		ercurrs = self._ringCurrents(legcurrs, solve_legs, omega2, fixed)
+		leg_flux = legcurrs @ self.leg_matrix.T
+		er_flux = self._ringFlux(ercurrs, self._ringCurrents(quadrature, solve_legs, omega2, fixed))
+		rhs = omega2 * (leg_flux - np.roll(leg_flux, -1, axis=1) + 2 * er_flux)
+
+		leg_zero = np.abs(legcurrs) <= ZERO_CURRENT * np.abs(legcurrs).max(axis=1, keepdims=True)
+		er_zero = np.abs(ercurrs) <= ZERO_CURRENT * np.abs(ercurrs).max(axis=1, keepdims=True)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			if solve_legs:
+				# e[k] - e[k+1] = rhs[k] - 2 J[k] s_er with e = I s_leg, and sum(e) = w^2 sum(M_leg I)
+				rhs -= 2 * ercurrs * fixed
+				e = np.zeros_like(rhs)
+				e[:, 1:] = -np.cumsum(rhs[:, :-1], axis=1)
+				e += (omega2 * leg_flux.sum(axis=1) - e.sum(axis=1))[:, None] / n
+				leg_elastance = np.where(leg_zero, np.nan, e / legcurrs)
+				er_elastance = np.full(rhs.shape, fixed if fixed else np.nan)
+			else:
+				leg_elastance = np.full(rhs.shape, fixed if fixed else np.nan)
+				if fixed:
+					rhs -= fixed * (legcurrs - np.roll(legcurrs, -1, axis=1))
+				er_elastance = np.where(er_zero, np.nan, rhs / (2 * ercurrs))
+
+			values = (legcurrs, ercurrs, 1 / leg_elastance * 1e12, 1 / er_elastance * 1e12, leg_flux / legcurrs, er_flux / ercurrs)
+		if single:
+			values = tuple(value[0] for value in values)
+		return GeneralResult(*values, solve_legs)
+
+	def _ringCurrents(self, legcurrs, solve_legs, omega2, fixed):
+		# end ring currents of [patterns, legs] leg currents
+		currents = np.cumsum(legcurrs, axis=1)  # plus an offset, the current circulating through the whole ring
+		if solve_legs:
+			# no voltage around the top ring: w^2 sum(M_er J) = fixed * sum(J)
+			ring = self.er_matrix.sum(axis=0)
+			offset = -(omega2 * currents @ ring - fixed * currents.sum(axis=1)) / (omega2 * ring.sum() - fixed * self.nr_of_legs)
+		else:
+			offset = -currents.mean(axis=1)
+		return currents + offset[:, None]
+
+	def _ringFlux(self, ercurrs, quadcurrs):
+		# (M_er J) of [patterns, segments] end ring currents, with the terms of BirdcageSolver._calcEffER
+		n = self.nr_of_legs
+		index = np.arange(n)
+		offset = (index[None, :] - index[:, None]) % n
+		signed = (offset == 1) | (offset == n - 1) | (2 * offset == n)  # neighbours and the opposite segment
+		with np.errstate(divide='ignore', invalid='ignore'):
+			# ratio of segment j to segment i, [patterns, i, j]
+			ratio = (ercurrs[:, None, :] * ercurrs[:, :, None] + quadcurrs[:, None, :] * quadcurrs[:, :, None]) / (ercurrs ** 2 + quadcurrs ** 2)[:, :, None]
+		ratio = np.where(np.isfinite(ratio), ratio, 0)
+		weights = np.where(signed, ratio, np.abs(ratio)) * (offset != 0)
+		return ercurrs * (np.diag(self.er_matrix) + (self.er_matrix * weights).sum(axis=2))
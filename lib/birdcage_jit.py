@@ -0,0 +1,471 @@
+"""
+Description:    Compiled (Numba) version of the scalar birdcage math, to calculate many coil designs in parallel.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The loops are the same as in BirdcageSolver, written as functions on arrays so Numba can compile them. Unlike
+birdcage_batch no [batch, legs, legs] arrays are made, so the memory use stays small for huge batches.
+Without Numba the same functions run as plain Python.
+"""
+
+import math
+import os
+import numpy as np
+from lib.logging import logger
+from lib.birdcage_math import BirdcageSettings, solve, RESULT_COLUMNS, _GAUSS_NODES, _GAUSS_WEIGHTS
+
+# keep the compiled kernels between runs, also when the program folder is read-only (e.g. the Windows executable)
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "pyBirdcagebuilder", "numba"))
+
+try:
+	import numba
+	NUMBA_AVAILABLE = True
+	prange = numba.prange
+
+	def njit(*args, **kwargs):
+		# floats divided by zero give inf/nan like in NumPy, invalid designs are filtered afterwards
+		return numba.njit(*args, cache=True, error_model='numpy', **kwargs)
+except ImportError:
+	NUMBA_AVAILABLE = False
+	prange = range
+
+	def njit(*args, **kwargs):
+		if args and callable(args[0]):
+			return args[0]
+		return lambda function: function
+
+# column of every setting in the parameter array
+PARAMETERS = tuple(BirdcageSettings.DEFAULTS.keys())
+(RES_FREQ, NR_OF_LEGS, COIL_DIAMETER, SHIELD_DIAMETER, LEG_LENGTH, LEG_WIDTH, LEG_OD, LEG_ID, ER_WIDTH, ER_OD, ER_ID, BP_CAP,
+	LEG_CONFIG, ER_CONFIG, COIL_MODE, BP_CONFIG, COIL_SHAPE, SHORTAXIS, COIL_LONG_DIAMETER, COIL_SHORT_DIAMETER) = [PARAMETERS.index(key) for key in (
+	"res_freq", "nr_of_legs", "coil_diameter", "shield_diameter", "leg_length", "leg_width", "leg_od", "leg_id", "er_width", "er_od", "er_id", "bp_cap",
+	"leg_config", "er_config", "coil_mode", "bp_config", "coil_shape", "shortaxis", "coil_long_diameter", "coil_short_diameter")]
+
+# the same constants as in birdcage_math, as plain globals for the compiled code
+HIGHPASS, LOWPASS, BANDPASS = 1, 2, 3
+RECT = 1
+LEG = 1
+ELLIPSE = 0
+GAUSS_NODES = np.array(_GAUSS_NODES)
+GAUSS_WEIGHTS = np.array(_GAUSS_WEIGHTS)
+
+
+def solveBatch(settings_list):
+	"""Calculates a list of BirdcageSettings and returns a list of result dicts (see RESULT_COLUMNS and BirdcageSolver.results).
+
+	Designs are grouped per number of legs, every group is calculated in parallel. Invalid designs give None.
+	Without Numba the scalar solver is used, which is faster than running the kernels as plain Python.
+	"""
+	if not NUMBA_AVAILABLE:
+		return [_solveOne(settings) for settings in settings_list]
+
+	results = [None] * len(settings_list)
+
+	groups = {}
+	for i, settings in enumerate(settings_list):
+		groups.setdefault(int(settings.nr_of_legs), []).append(i)
+
+	for nr_of_legs, indices in groups.items():
+		params = np.array([[getattr(settings_list[i], key) for key in PARAMETERS] for i in indices], dtype=float)
+		out, caps = solveParameters(params, nr_of_legs)
+		for row, i in enumerate(indices):
+			if np.all(np.isfinite(out[row])) and np.all(np.isfinite(caps[row])):
+				results[i] = dict(zip(RESULT_COLUMNS, out[row].tolist()), capacitors=caps[row].tolist())
+
+	return results
+
+
+def _solveOne(settings):
+	try:
+		result = solve(settings).results()
+	except (ArithmeticError, ValueError):
+		return None
+	if not all(math.isfinite(v) for v in [result[key] for key in RESULT_COLUMNS] + list(result["capacitors"])):
+		return None
+	return result
+
+
+def solveParameters(params, nr_of_legs):
+	"""Calculates a [batch, PARAMETERS] array of designs with the same number of legs.
+
+	Returns a [batch, RESULT_COLUMNS] array and a [batch, nr_of_legs/4] array of the capacitors. Invalid designs give nan.
+	"""
+	out = np.full((len(params), len(RESULT_COLUMNS)), np.nan)
+	caps = np.full((len(params), nr_of_legs // 4), np.nan)
+	if NUMBA_AVAILABLE:
+		_solveRows(params, nr_of_legs, out, caps)
+	else:
+		for row in range(len(params)):
+			try:
+				_solveDesign(params[row], nr_of_legs, out[row], caps[row])
+			except (ArithmeticError, ValueError):
+				out[row] = np.nan
+				caps[row] = np.nan
+	return out, caps
+
+
+@njit(parallel=True)
+def _solveRows(params, n, out, caps):
+	for row in prange(params.shape[0]):
+		_solveDesign(params[row], n, out[row], caps[row])
+
+
+@njit
+def _solveDesign(p, n, out, caps):
+	coil_shape = int(p[COIL_SHAPE])
+	shortaxis = int(p[SHORTAXIS])
+	coil_mode = int(p[COIL_MODE])
+	if coil_shape == ELLIPSE:
+		if coil_mode != HIGHPASS:
+			return  # elliptical coils can only be calculated as high-pass
+		coil_radius = p[COIL_LONG_DIAMETER] / 2
+		coil_shortradius = p[COIL_SHORT_DIAMETER] / 2
+	else:
+		coil_radius = p[COIL_DIAMETER] / 2
+		coil_shortradius = coil_radius
+
+	radius = np.zeros(n)
+	thetas = np.zeros(n)
+	xcoords = np.zeros(n)
+	ycoords = np.zeros(n)
+	if coil_shape == ELLIPSE:
+		er_segment_length = _calcEllipseGeometry(n, coil_radius, coil_shortradius, radius, thetas, xcoords, ycoords)
+	else:
+		er_segment_length = _calcCircleGeometry(n, coil_radius, radius, thetas, xcoords, ycoords)
+
+	legcurrs = np.zeros(n)
+	ercurrs = np.zeros(n)
+	_calcCurrents(n, coil_shape, shortaxis, coil_radius, coil_shortradius, thetas, legcurrs, ercurrs)
+	quadcurrs = np.zeros(n)
+	if coil_shape == ELLIPSE:
+		# er currents of the other drive axis, see BirdcageSolver._currentRatio
+		_calcCurrents(n, coil_shape, not shortaxis, coil_radius, coil_shortradius, thetas, np.zeros(n), quadcurrs)
+
+	er_self_ind = _selfInductance(er_segment_length, int(p[ER_CONFIG]), p[ER_WIDTH], p[ER_OD], p[ER_ID])
+	leg_self_ind = _selfInductance(p[LEG_LENGTH], int(p[LEG_CONFIG]), p[LEG_WIDTH], p[LEG_OD], p[LEG_ID])
+
+	legeff = np.zeros(n)
+	_calcEffLeg(n, p[LEG_LENGTH], leg_self_ind, p[SHIELD_DIAMETER] / 2, radius, thetas, xcoords, ycoords, legcurrs, legeff)
+	ereff = np.zeros(n)
+	_calcEffER(n, coil_shape == ELLIPSE, er_self_ind, xcoords, ycoords, ercurrs, quadcurrs, ereff)
+
+	cap = np.zeros(n)
+	_calcCapacitance(n, coil_shape, shortaxis, coil_mode, int(p[BP_CONFIG]), p[RES_FREQ], p[BP_CAP], legcurrs, ercurrs, legeff, ereff, cap)
+
+	quarter = n // 4
+	if coil_shape == ELLIPSE and not shortaxis:
+		capacitor = cap[n - 1]
+		caps[0] = cap[n - 1]
+		for j in range(quarter - 1):
+			caps[j + 1] = cap[j]
+	elif coil_shape == ELLIPSE:
+		capacitor = cap[quarter - 1]
+		for j in range(quarter):
+			caps[j] = cap[j]
+	else:
+		capacitor = cap[quarter - 1]
+		for j in range(quarter):
+			caps[j] = capacitor
+
+	out[0] = capacitor
+	out[1] = er_segment_length
+	out[2] = er_self_ind
+	out[3] = leg_self_ind
+	out[4] = ereff[quarter - 1] * 1e9
+	out[5] = legeff[quarter - 1] * 1e9
+
+
+@njit
+def _calcCircleGeometry(n, coil_radius, radius, thetas, xcoords, ycoords):
+	for i in range(n // 4):
+		radius[i] = coil_radius
+		thetas[i] = math.pi / n * (2 * i + 1)
+		xcoords[i] = coil_radius * math.cos(thetas[i])
+		ycoords[i] = coil_radius * math.sin(thetas[i])
+	_mirrorQuadrant(n, radius, thetas, xcoords, ycoords)
+	return 2 * math.pi * (coil_radius / n)
+
+
+@njit
+def _mirrorQuadrant(n, radius, thetas, xcoords, ycoords):
+	for i in range(n // 4):
+		xcoords[n // 2 - (i + 1)] = -xcoords[i]
+		xcoords[n // 2 + i] = -xcoords[i]
+		xcoords[n - (i + 1)] = xcoords[i]
+		ycoords[n // 2 - (i + 1)] = ycoords[i]
+		ycoords[n // 2 + i] = -ycoords[i]
+		ycoords[n - (i + 1)] = -ycoords[i]
+		radius[n // 2 - (i + 1)] = radius[i]
+		radius[n // 2 + i] = radius[i]
+		radius[n - (i + 1)] = radius[i]
+		thetas[n // 2 - (i + 1)] = math.pi - thetas[i]
+		thetas[n // 2 + i] = math.pi + thetas[i]
+		thetas[n - (i + 1)] = 2 * math.pi - thetas[i]
+
+
+@njit
+def _ellipseArcDerivative(a, b, phi):
+	return math.sqrt((a * math.cos(phi)) ** 2 + (b * math.sin(phi)) ** 2)
+
+
+@njit
+def _ellipseArcLength(a, b, phi_start, phi_end):
+	# composite Gauss-Legendre integration, panels of at most pi/16
+	panels = max(1, math.ceil(abs(phi_end - phi_start) / (math.pi / 16)))
+	half_width = (phi_end - phi_start) / panels / 2
+	length = 0.0
+	for panel in range(panels):
+		middle = phi_start + half_width * (2 * panel + 1)
+		for k in range(len(GAUSS_NODES)):
+			length += GAUSS_WEIGHTS[k] * (_ellipseArcDerivative(a, b, middle - half_width * GAUSS_NODES[k])
+											+ _ellipseArcDerivative(a, b, middle + half_width * GAUSS_NODES[k]))
+	return length * half_width
+
+
+@njit
+def _calcEllipseGeometry(n, a, b, radius, thetas, xcoords, ycoords):
+	# see BirdcageSolver._calcEllipseGeometry
+	er_segment_length = _ellipseArcLength(a, b, 0, math.pi / 2) * 4 / n
+
+	phi = 0.0
+	arc = 0.0
+	for i in range(1, n // 4 + 1):
+		target = er_segment_length / 2 * (2 * i - 1)
+		new_phi = phi + (target - arc) / _ellipseArcDerivative(a, b, phi)
+		for _ in range(50):  # Newton's method on the arc length
+			error = arc + _ellipseArcLength(a, b, phi, new_phi) - target
+			new_phi -= error / _ellipseArcDerivative(a, b, new_phi)
+			if abs(error) < 1e-12 * er_segment_length:
+				break
+		phi = new_phi
+		arc = target
+
+		k = n // 4 - i
+		xcoords[k] = a * math.sin(phi)
+		ycoords[k] = b * math.cos(phi)
+		thetas[k] = math.atan(ycoords[k] / xcoords[k])
+		radius[k] = math.sqrt(xcoords[k] ** 2 + ycoords[k] ** 2)
+
+	_mirrorQuadrant(n, radius, thetas, xcoords, ycoords)
+	return er_segment_length
+
+
+@njit
+def _calcCurrents(n, coil_shape, shortaxis, coil_radius, coil_shortradius, thetas, legcurrs, ercurrs):
+	# see BirdcageSolver._calcCurrents
+	n1 = 1
+	n2 = 1
+	if shortaxis or coil_shape != ELLIPSE:
+		n2 = 0
+	else:
+		n1 = 0
+
+	for i in range(n):
+		legcurrs[i] = (n1 * coil_shortradius * coil_shortradius * math.cos(thetas[i]) + n2 * coil_radius * coil_radius * math.sin(thetas[i])) \
+						/ (coil_shortradius * coil_shortradius * math.cos(thetas[i]) * math.cos(thetas[i]) + coil_radius * coil_radius
+						* math.sin(thetas[i]) * math.sin(thetas[i]))
+
+	quarter = n // 4
+	if (not shortaxis) and coil_shape == ELLIPSE:
+		ercurrs[quarter - 1] = 0
+		ercurrs[3 * quarter - 1] = 0
+		ercurrs[quarter - 1 - 1] = -legcurrs[quarter - 1]
+
+		for i in range(1, quarter - 1):
+			ercurrs[quarter - 1 - (i + 1)] = ercurrs[quarter - 1 - i] - legcurrs[quarter - 1 - i]
+		ercurrs[n - 1] = ercurrs[0] - legcurrs[0]
+		ercurrs[n // 2 - 1] = -ercurrs[n - 1]
+
+		for i in range(quarter - 1):
+			ercurrs[quarter + i] = -ercurrs[quarter - (i + 1) - 1]
+			ercurrs[3 * quarter - (i + 1) - 1] = -ercurrs[quarter - (i + 1) - 1]
+			ercurrs[3 * quarter + i] = ercurrs[quarter - (i + 1) - 1]
+	else:
+		total = 0.0
+		for i in range(n):
+			total += legcurrs[i]
+			ercurrs[i] = total
+
+		ercurrs[n // 2 - 1] = 0
+		ercurrs[n - 1] = 0
+
+
+@njit
+def _selfInductance(length, config, width, od, id_):
+	# self inductance (nH) of a rectangular strip or a (hollow) tube, see BirdcageSolver._calcSelfInductances
+	if config == RECT:
+		return 2 * length * (math.log(2 * length / width) + 0.5)
+	n = id_ / od
+	if n == 0:
+		return 2 * length * (math.log(4 * length / od) - 0.75)
+	return 2 * length * (math.log(4 * length / od) + (0.1493 * n ** 3 - 0.3606 * n ** 2 - 0.0405 * n + 0.2526) - 1)
+
+
+@njit
+def _mutual(length, distance):
+	return 2 * length * (math.log(length / distance + math.sqrt(1 + (length / distance) ** 2)) - math.sqrt(1 + (distance / length) ** 2) + distance / length)
+
+
+@njit
+def _calcEffLeg(n, leg_length, leg_self_ind, shield_radius, radius, thetas, xcoords, ycoords, legcurrs, legeff):
+	# see BirdcageSolver._calcEffLeg
+	for i in range(n):
+		total = 0.0
+		for j in range(n):
+			if i == j:
+				total += leg_self_ind
+			else:
+				distance = math.sqrt((xcoords[j] - xcoords[i]) ** 2 + (ycoords[j] - ycoords[i]) ** 2)
+				total += _mutual(leg_length, distance) * legcurrs[j] / legcurrs[i]
+		legeff[i] = total * 1e-9
+
+	if shield_radius != 0:
+		for i in range(n):
+			total = 0.0
+			for j in range(n):
+				image = shield_radius * shield_radius / radius[j]
+				distance = math.sqrt((image * math.cos(thetas[j]) - xcoords[i]) ** 2 + (image * math.sin(thetas[j]) - ycoords[i]) ** 2)
+				total += _mutual(leg_length, distance) * -1 * legcurrs[j] / legcurrs[i]
+			legeff[i] += total * 1e-9
+
+
+@njit
+def _neighbourTerm(ax, ay, bx, by, cx, cy):
+	# mutual inductance term of the end ring segments A->B and B->C, see BirdcageSolver._calcEffER
+	sqrt_ = math.sqrt((bx - ax) ** 2 + (by - ay) ** 2)
+	sqrt2 = math.sqrt((cx - ax) ** 2 + (cy - ay) ** 2)
+	sqrt3 = math.sqrt((bx - cx) ** 2 + (by - cy) ** 2)
+	return abs(2 * ((sqrt3 ** 2 + sqrt_ ** 2 - sqrt2 ** 2) / (2 * sqrt3 * sqrt_)) * (sqrt3 * math.atanh(sqrt_ / (sqrt3 + sqrt2)) + sqrt_ * math.atanh(sqrt3 / (sqrt_ + sqrt2))))
+
+
+@njit
+def _currentRatio(ellipse, ercurrs, quadcurrs, j, i):
+	# see BirdcageSolver._currentRatio
+	if not ellipse:
+		return ercurrs[j] / ercurrs[i]
+	return (ercurrs[j] * ercurrs[i] + quadcurrs[j] * quadcurrs[i]) / (ercurrs[i] ** 2 + quadcurrs[i] ** 2)
+
+
+@njit
+def _calcEffER(n, ellipse, er_self_ind, xcoords, ycoords, ercurrs, quadcurrs, ereff):
+	# see BirdcageSolver._calcEffER
+	for i in range(n):
+		ereff[i] += er_self_ind
+
+	for i in range(n):
+		n1 = xcoords[(i + n // 2) % n]
+		n2 = ycoords[(i + n // 2) % n]
+		n5 = xcoords[(i + 1) % n]
+		n6 = ycoords[(i + 1) % n]
+		n7 = xcoords[i]
+		n8 = ycoords[i]
+		sqrt_ = math.sqrt((n7 - n5) ** 2 + (n8 - n6) ** 2)
+		sqrt2 = math.sqrt((n1 - n5) ** 2 + (n2 - n6) ** 2)
+		if ercurrs[i] != 0:
+			ereff[i] += 2 * sqrt_ * (math.log(sqrt_ / sqrt2 + math.sqrt(1 + (sqrt_ / sqrt2) ** 2)) - math.sqrt(1 + (sqrt2 / sqrt_) ** 2) + sqrt2 / sqrt_)
+
+	for i in range(n):
+		abs_ = _neighbourTerm(xcoords[i], ycoords[i], xcoords[(i + 1) % n], ycoords[(i + 1) % n], xcoords[(i + 2) % n], ycoords[(i + 2) % n])
+
+		n1 = xcoords[(i - 1 + n) % n]
+		n2 = ycoords[(i - 1 + n) % n]
+		n3 = xcoords[i]
+		n4 = ycoords[i]
+		n5 = xcoords[(i + 1) % n]
+		n6 = ycoords[(i + 1) % n]
+		sqrt_ = math.sqrt((n3 - n1) ** 2 + (n4 - n2) ** 2)
+		sqrt2 = math.sqrt((n3 - n5) ** 2 + (n4 - n6) ** 2)
+		sqrt3 = math.sqrt((n5 - n1) ** 2 + (n6 - n2) ** 2)
+		abs2 = abs(2 * ((sqrt2 ** 2 + sqrt_ ** 2 - sqrt3 ** 2) / (2 * sqrt2 * sqrt_)) * (sqrt2 * math.atanh(sqrt_ / (sqrt2 + sqrt3)) + sqrt_ * math.atanh(sqrt2 / (sqrt_ + sqrt3))))
+		if ercurrs[i] != 0 and ellipse:
+			ereff[i] += abs_ * _currentRatio(ellipse, ercurrs, quadcurrs, (i + 1) % n, i) + abs2 * _currentRatio(ellipse, ercurrs, quadcurrs, (i - 1 + n) % n, i)
+		elif ercurrs[i] != 0:
+			ereff[i] += (abs_ * ercurrs[(i + 1) % n] + abs2 * ercurrs[(i - 1 + n) % n]) / ercurrs[i]
+
+	for i in range(n):
+		if ercurrs[i] == 0:
+			continue
+		n1 = xcoords[i]
+		n2 = ycoords[i]
+		n3 = xcoords[(i + 1) % n]
+		n4 = ycoords[(i + 1) % n]
+		total = 0.0
+		for j in range(i + 2, i + n - 1):
+			if j - i - 2 == (n - 4) / 2:
+				continue
+			n7 = xcoords[j % n]
+			n8 = ycoords[j % n]
+			n9 = xcoords[(j + 1) % n]
+			n10 = ycoords[(j + 1) % n]
+
+			sqrt_ = math.sqrt((n3 - n1) ** 2 + (n4 - n2) ** 2)
+			sqrt2 = math.sqrt((n9 - n7) ** 2 + (n10 - n8) ** 2)
+			a2 = (n1 - n7) ** 2 + (n2 - n8) ** 2
+			a3 = (n3 - n7) ** 2 + (n4 - n8) ** 2
+			a4 = (n1 - n9) ** 2 + (n2 - n10) ** 2
+			a5 = (n3 - n9) ** 2 + (n4 - n10) ** 2
+			n13 = a3 - a2 + a4 - a5
+			n14 = n13 / (sqrt2 * sqrt_)
+			n15 = 4 * sqrt2 * sqrt2 * sqrt_ * sqrt_ - n13 * n13
+
+			if n15 == 0:
+				n17 = 0.0
+				n18 = 0.0
+			else:
+				n17 = (2 * sqrt_ ** 2 * (a4 - a2 - sqrt2 * sqrt2) + n13 * (a3 - a2 - sqrt_ ** 2)) * sqrt2 / (4 * sqrt2 ** 2 * sqrt_ * sqrt_ - n13 ** 2)
+				n18 = (2 * sqrt2 ** 2 * (a3 - a2 - sqrt_ ** 2) + n13 * (a4 - a2 - sqrt2 ** 2)) * sqrt_ / (4 * sqrt2 ** 2 * sqrt_ * sqrt_ - n13 ** 2)
+
+			sqrt3 = math.sqrt(a3)
+			sqrt4 = math.sqrt(a2)
+			sqrt5 = math.sqrt(a4)
+			sqrt6 = math.sqrt(a5)
+
+			mutual = n14 * ((n17 + sqrt2) * math.atanh(sqrt_ / (sqrt6 + sqrt5)) + (n18 + sqrt_) * math.atanh(sqrt2 / (sqrt6 + sqrt3)) - n17
+							* math.atanh(sqrt_ / (sqrt4 + sqrt3)) - n18 * math.atanh(sqrt2 / (sqrt5 + sqrt4)))
+			total += mutual * abs(_currentRatio(ellipse, ercurrs, quadcurrs, j % n, i))
+		ereff[i] += total
+
+	for i in range(n):
+		ereff[i] *= 1e-9
+
+
+@njit
+def _calcCapacitance(n, coil_shape, shortaxis, coil_mode, bp_config, res_freq, bp_cap, legcurrs, ercurrs, legeff, ereff, cap):
+	# see BirdcageSolver._calcCapacitance
+	omega = 2 * math.pi * res_freq * 1e6
+	array = np.zeros(n)
+	for i in range(n):
+		array[i] = 0.5 * omega * legeff[i] * legcurrs[i]
+
+	k = n // 4 - 1
+	if coil_shape == ELLIPSE:
+		if shortaxis:
+			cap[k] = ercurrs[k] / (omega * omega * ercurrs[k] * ereff[k] + omega * 2.0 * array[k]) * 1e12
+		else:
+			cap[n - 1] = -ercurrs[n - 1] / (-omega * omega * ercurrs[n - 1] * ereff[n - 1] + omega * (array[0] - array[n - 1])) * 1e12
+		for j in range(k):
+			cap[j] = ercurrs[j] / (omega * omega * ercurrs[j] * ereff[j] + omega * (array[j] - array[j + 1])) * 1e12
+
+	elif coil_mode == HIGHPASS or (coil_mode == BANDPASS and bp_config == LEG):
+		n2 = 0.0
+		if coil_mode == BANDPASS:
+			n2 = -0.5 * (legcurrs[k] / (omega * bp_cap)) * 1e12
+		cap[k] = ercurrs[k] / (omega ** 2 * ercurrs[k] * ereff[k] + omega * 2 * (array[k] + n2)) * 1e12
+
+	else:
+		if coil_mode == BANDPASS:
+			n3 = -ercurrs[k] * (omega ** 2 * ereff[k] - 1 / bp_cap * 1e12)
+		else:
+			n3 = -ercurrs[k] * omega ** 2 * ereff[k]
+		n4 = legcurrs[k + 1] * omega ** 2 * legeff[k + 1]
+		cap[k] = legcurrs[k + 1] / (n4 + n3) * 1e12
+
+
+def warmUp():
+	# compiles (or loads from the cache) all kernels with a small design
+	if NUMBA_AVAILABLE:
+		solveParameters(np.array([[BirdcageSettings.DEFAULTS[key] for key in PARAMETERS]], dtype=float), BirdcageSettings.DEFAULTS["nr_of_legs"])
+		logger.debug("Compiled solver ready")
@@ -7,20 +7,187 @@ License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
 				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
 """
 
+import copy
 import math
-from lib.logging import logger
+from lib.logging import logger, solveLoggingEnabled, SOLVE_LOG_LEVEL
+
+HIGHPASS = 1
+LOWPASS = 2
+BANDPASS = 3
+RECT = 1
+TUBE = 2
+LEG = 1
+ER = 2
+
+ELLIPSE = 0
+CIRCLE = 1
+SHORT = 1
+LONG = 0
+
+RESULT_COLUMNS = ("capacitor", "er_segment_length", "er_self_ind", "leg_self_ind", "er_eff_ind", "leg_eff_ind")
+E12 = (1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2)  # standard capacitor values per decade
+
+# the stages of a calculation and their settings, a stage also depends on the settings of the stages before it
+STAGES = (("geometry", ("nr_of_legs", "coil_shape", "coil_diameter", "coil_long_diameter", "coil_short_diameter", "shortaxis")),
+			("inductance", ("shield_diameter", "leg_length", "leg_width", "leg_od", "leg_id", "er_width", "er_od", "er_id", "leg_config", "er_config")),
+			("capacitance", ("res_freq", "coil_mode", "bp_config", "bp_cap")))
+
+# 8 point Gauss-Legendre quadrature, positive half (the nodes are symmetric around 0)
+_GAUSS_NODES = (0.1834346424956498, 0.5255324099163290, 0.7966664774136267, 0.9602898564975363)
+_GAUSS_WEIGHTS = (0.3626837833783620, 0.3137066458778873, 0.2223810344533745, 0.1012285362903763)
+
+INT_SETTINGS = ("nr_of_legs", "leg_config", "er_config", "coil_mode", "bp_config", "coil_shape", "shortaxis")
+
+
+class SettingsError(Exception):
+	pass
+
+
+class BirdcageSettings:
+	# All inputs needed for one calculation. Dimensions in cm, frequency in MHz, capacitance in pF.
+	DEFAULTS = {"res_freq": 298,
+				"nr_of_legs": 12,
+				"coil_diameter": 30,
+				"shield_diameter": 34,
+				"leg_length": 20,
+				"leg_width": 0.5,
+				"leg_od": 1,
+				"leg_id": 0.6,
+				"er_width": 0.5,
+				"er_od": 1,
+				"er_id": 0.6,
+				"bp_cap": 56,
+				"leg_config": RECT,
+				"er_config": RECT,
+				"coil_mode": HIGHPASS,
+				"bp_config": LEG,
+				"coil_shape": CIRCLE,
+				"shortaxis": SHORT,
+				"coil_long_diameter": 40,
+				"coil_short_diameter": 30}
+
+	def __init__(self, **kwargs):
+		for key in kwargs.keys():
+			if key not in self.DEFAULTS:
+				raise TypeError(f"Unknown birdcage setting '{key}'")
+
+		for key, value in self.DEFAULTS.items():
+			setattr(self, key, kwargs.get(key, value))
+
+	def asDict(self):
+		return {key: getattr(self, key) for key in self.DEFAULTS.keys()}
+
+	def copy(self, **changes):
+		values = self.asDict()
+		values.update(changes)
+		return BirdcageSettings(**values)
+
+
+def settingsFromJson(values, base=None):
+	# BirdcageSettings of a decoded JSON object, missing settings come from base (or the defaults)
+	if not isinstance(values, dict):
+		raise SettingsError("Settings should be a JSON object")
+	if base is not None:
+		merged = base.asDict()
+		merged.update(values)
+		values = merged
+
+	converted = {}
+	for key, value in values.items():
+		if key not in BirdcageSettings.DEFAULTS:
+			raise SettingsError(f"Unknown setting '{key}'")
+		if isinstance(value, bool) or not isinstance(value, (int, float)):
+			raise SettingsError(f"Setting '{key}' should be a number")
+		converted[key] = int(value) if key in INT_SETTINGS else float(value)
+	return BirdcageSettings(**converted)
+
+
+def solve(settings):
+	# Every call gets its own solver context, so this is safe to call from multiple threads at once
+	return BirdcageSolver(settings).solve()
+
+
+def selfInductance(length, config, width, od, id_):
+	# Self inductance (nH) of a rectangular strip (RECT) or a (hollow) tube (TUBE)
+	if config == RECT:
+		return 2 * length * (math.log(2 * length / width) + 0.5)
+	n = id_ / od
+	if n == 0:
+		return 2 * length * (math.log(4 * length / od) - 0.75)
+	return 2 * length * (math.log(4 * length / od) + (0.1493 * n ** 3 - 0.3606 * n ** 2 - 0.0405 * n + 0.2526) - 1)
 
 
 class CalculateBirdcage:
-	# All math is copied from the original Birdcage Builder made by PennState Health, and converted to Python
+	# Connects the GUI to the solver. The last result is kept for drawing the graphs.
 
 	def __init__(self, parent):
 		self.parent = parent
-
-		self._division = 97684  # magic number?
+		self.result = None
 
 	def calculate(self):
-		self._getValuesFromGui()
+		self.result = solve(self.settingsFromGui())
+		self._exportResults()
+
+	def settingsFromGui(self):
+		return BirdcageSettings(
+			res_freq=self.parent.guiTabSettings.v_res_freq.get(),
+			nr_of_legs=self.parent.guiTabSettings.v_nr_of_legs.get(),
+			coil_diameter=self.parent.guiTabSettings.v_coil_diameter.get(),
+			shield_diameter=self.parent.guiTabSettings.v_shield_diameter.get(),
+			leg_length=self.parent.guiTabSettings.v_leg_length.get(),
+			leg_width=self.parent.guiTabSettings.v_leg_width.get(),
+			leg_od=self.parent.guiTabSettings.v_leg_od.get(),
+			leg_id=self.parent.guiTabSettings.v_leg_id.get(),
+			er_width=self.parent.guiTabSettings.v_er_width.get(),
+			er_od=self.parent.guiTabSettings.v_er_od.get(),
+			er_id=self.parent.guiTabSettings.v_er_id.get(),
+			bp_cap=self.parent.guiTabSettings.v_bp_cap.get(),
+			leg_config=self.parent.guiTabSettings.v_rb_legs_selected.get(),
+			er_config=self.parent.guiTabSettings.v_rb_er_selected.get(),
+			coil_mode=self.parent.guiTabSettings.v_rb_config_selected.get(),
+			bp_config=self.parent.guiTabSettings.v_rb_bp.get(),
+			coil_shape=self.parent.menuBar.coil_shape.get(),
+			shortaxis=self.parent.guiTabSettings.v_coil_shortaxis.get(),
+			coil_long_diameter=self.parent.guiTabSettings.v_coil_long_diameter.get(),
+			coil_short_diameter=self.parent.guiTabSettings.v_coil_short_diameter.get())
+
+	def _exportResults(self):
+		# export results to gui
+		result = self.result
+		self.parent.guiTabMoreInfo.v_ind_self_er.set(result.er_self_ind)
+		self.parent.guiTabMoreInfo.v_ind_self_legs.set(result.leg_self_ind)
+		self.parent.guiTabMoreInfo.v_ind_eff_er.set(result.ereff[int(result.nr_of_legs / 4 - 1)] * 1e9)
+		self.parent.guiTabMoreInfo.v_ind_eff_legs.set(result.legeff[int(result.nr_of_legs / 4 - 1)] * 1e9)
+		self.parent.guiTabSettings.v_er_seg_length.set(result.er_segment_length)
+		self.parent.guiTabResults.v_cap_res.set(result.capacitor)
+		if result.coil_shape == ELLIPSE:
+			self.parent.guiTabResults.v_caps_res.set("\n".join(f"C{i + 1}: {c:.2f} pF" for i, c in enumerate(result.capacitors)))
+		else:
+			self.parent.guiTabResults.v_caps_res.set("")
+
+		if not solveLoggingEnabled():
+			return
+		result = f""" Results:
+			Result Capacitor: {self.parent.guiTabResults.v_cap_res.get()} pF
+			Result ER Segment Length: {self.parent.guiTabSettings.v_er_seg_length.get()} nH
+			Result Self Inductance ER: {self.parent.guiTabMoreInfo.v_ind_self_er.get()} nH
+			Result Self Inductance Legs: {self.parent.guiTabMoreInfo.v_ind_self_legs.get()} nH
+			Result Effective Inductance ER: {self.parent.guiTabMoreInfo.v_ind_eff_er.get()} nH
+			Result Effective Inductance Legs: {self.parent.guiTabMoreInfo.v_ind_eff_legs.get()} mm
+		"""
+		# logger.info(result.replace('\t', ''))
+		logger.log(SOLVE_LOG_LEVEL, result)
+
+
+class BirdcageSolver:
+	# All math is copied from the original Birdcage Builder made by PennState Health, and converted to Python
+	# A solver instance holds the state of exactly one calculation. Use solve() instead of sharing an instance.
+
+	def __init__(self, settings):
+		self.settings = settings
+
+	def solve(self):
+		self._getValuesFromSettings()
 		self._initLocalValues()
 
 		self._calcGeometry()
@@ -29,36 +196,80 @@ class CalculateBirdcage:
 		self._calcEffLeg()
 		self._calcEffER()
 		self._calcCapacitance()
-		
-		self._exportResults()
-	
-	def _getValuesFromGui(self):
-		self.res_freq = self.parent.guiTabSettings.v_res_freq.get()  # variable for Resonance frequency
-		self.nr_of_legs = self.parent.guiTabSettings.v_nr_of_legs.get()
-		self.shield_radius = self.parent.guiTabSettings.v_shield_diameter.get() / 2
-		self.leg_length = self.parent.guiTabSettings.v_leg_length.get()
-		self.er_width = self.parent.guiTabSettings.v_er_width.get()
-		self.leg_width = self.parent.guiTabSettings.v_leg_width.get()
-		self.er_od = self.parent.guiTabSettings.v_er_od.get()
-		self.er_id = self.parent.guiTabSettings.v_er_id.get()
-		self.leg_od = self.parent.guiTabSettings.v_leg_od.get()
-		self.leg_id = self.parent.guiTabSettings.v_leg_id.get()
-
-		self.bp_cap = self.parent.guiTabSettings.v_bp_cap.get()
-		self.leg_config = self.parent.guiTabSettings.v_rb_legs_selected.get()
-		self.er_config = self.parent.guiTabSettings.v_rb_er_selected.get()
-		self.coil_mode = self.parent.guiTabSettings.v_rb_config_selected.get()
-		self.bp_config = self.parent.guiTabSettings.v_rb_bp.get()
-		self.coil_shape = self.parent.menuBar.coil_shape.get()
-
-		self.shortaxis = self.parent.guiTabSettings.v_coil_shortaxis.get()
-		if self.coil_shape == self.parent.ELLIPSE:
-			raise NotImplementedError
-			# noinspection PyUnreachableCode
-			self.coil_radius = self.parent.guiTabSettings.v_coil_long_diameter.get() / 2
-			self.coil_shortradius = self.parent.guiTabSettings.v_coil_short_diameter.get() / 2
+		return self
+
+	def update(self, settings, stage):
+		"""A new solver for settings that only differ from the settings of this solver in the inputs of stage and later
+		stages (see STAGES). The earlier stages are taken over, stage and the later stages are calculated.
+		"""
+		if stage == "geometry":
+			return BirdcageSolver(settings).solve()
+		solver = copy.copy(self)
+		solver.settings = settings
+		solver._getValuesFromSettings()
+		solver.cap = [0.0 for _ in range(int(solver.nr_of_legs))]
+		if stage == "inductance":
+			solver.legeff = [0.0 for _ in range(solver.nr_of_legs)]
+			solver.ereff = [0 for _ in range(solver.nr_of_legs)]
+			solver._calcSelfInductances()
+			solver._calcEffLeg()
+			solver._calcEffER()
+		solver._calcCapacitance()
+		return solver
+
+	@property
+	def capacitor(self):
+		if self.coil_shape == ELLIPSE and not self.shortaxis:
+			return self.cap[int(self.nr_of_legs - 1)]
+		return self.cap[int(self.nr_of_legs / 4 - 1)]
+
+	@property
+	def capacitors(self):
+		# The nr_of_legs/4 distinct capacitor values, starting at the +X axis going to +Y. All equal for a circular coil.
+		if self.coil_shape != ELLIPSE:
+			return [self.capacitor] * int(self.nr_of_legs / 4)
+		if self.shortaxis:
+			return self.cap[0:int(self.nr_of_legs / 4)]
+		return [self.cap[self.nr_of_legs - 1]] + self.cap[0:int(self.nr_of_legs / 4 - 1)]
+
+	def results(self):
+		# the calculated values shown in the GUI, see RESULT_COLUMNS. Inductances in nH.
+		return {"capacitor": self.capacitor,
+				"er_segment_length": self.er_segment_length,
+				"er_self_ind": self.er_self_ind,
+				"leg_self_ind": self.leg_self_ind,
+				"er_eff_ind": self.ereff[int(self.nr_of_legs / 4 - 1)] * 1e9,
+				"leg_eff_ind": self.legeff[int(self.nr_of_legs / 4 - 1)] * 1e9,
+				"capacitors": self.capacitors}
+
+	def _getValuesFromSettings(self):
+		settings = self.settings
+		self.res_freq = settings.res_freq  # variable for Resonance frequency
+		self.nr_of_legs = settings.nr_of_legs
+		self.shield_radius = settings.shield_diameter / 2
+		self.leg_length = settings.leg_length
+		self.er_width = settings.er_width
+		self.leg_width = settings.leg_width
+		self.er_od = settings.er_od
+		self.er_id = settings.er_id
+		self.leg_od = settings.leg_od
+		self.leg_id = settings.leg_id
+
+		self.bp_cap = settings.bp_cap
+		self.leg_config = settings.leg_config
+		self.er_config = settings.er_config
+		self.coil_mode = settings.coil_mode
+		self.bp_config = settings.bp_config
+		self.coil_shape = settings.coil_shape
+
+		self.shortaxis = settings.shortaxis
+		if self.coil_shape == ELLIPSE:
+			if self.coil_mode != HIGHPASS:
+				raise ValueError("Elliptical coils can only be calculated as high-pass")
+			self.coil_radius = settings.coil_long_diameter / 2
+			self.coil_shortradius = settings.coil_short_diameter / 2
 		else:
-			self.coil_radius = self.parent.guiTabSettings.v_coil_diameter.get() / 2
+			self.coil_radius = settings.coil_diameter / 2
 			self.coil_shortradius = self.coil_radius
 
 	def _initLocalValues(self):
@@ -68,6 +279,7 @@ class CalculateBirdcage:
 		self.ycoords = [0.0 for _ in range(self.nr_of_legs)]
 		self.legcurrs = [0.0 for _ in range(self.nr_of_legs)]
 		self.ercurrs = [0.0 for _ in range(self.nr_of_legs)]
+		self.quadcurrs = [0.0 for _ in range(self.nr_of_legs)]
 		self.legeff = [0.0 for _ in range(self.nr_of_legs)]
 		self.ereff = [0 for _ in range(self.nr_of_legs)]
 		self.cap = [0.0 for _ in range(int(self.nr_of_legs))]
@@ -75,32 +287,9 @@ class CalculateBirdcage:
 		self.er_self_ind = 0
 		self.er_segment_length = 0
 
-		self.delta = self.coil_radius / self._division
-
 	def _calcGeometry(self):
-		if self.coil_shape == self.parent.ELLIPSE:
-			n = 0
-			n2 = 0
-			for i in range(0, self._division):
-				n2 = i * self.delta
-				n += self.delta * math.sqrt(1 + (self.coil_shortradius / self.coil_radius * n2)**2 / (self.coil_radius * self.coil_radius - n2**2))
-			self.er_segment_length = n * 4 / self.nr_of_legs
-
-			for i in range(1, int(self.nr_of_legs / 4)+1):
-				n4 = 0
-				n5 = self.er_segment_length / 2 * (2 * i - 1)
-				# for (int n6 = 1; n5 - n4 > 0.0; n4 += self.delta * math.sqrt(1.0 + math.pow(self.coil_shortradius / self.coil_radius * n2, 2.0)
-				#	   / (self.coil_radius * self.coil_radius - math.pow(n2, 2.0))), ++n6) { #original
-				n6 = 1
-				while n5 - n4 > 0:  # todo check if correct, the original for-loop was strange
-					n4 += self.delta * math.sqrt(1 + ((self.coil_shortradius / self.coil_radius) * n2)**2 / (self.coil_radius**2 - n2**2))
-					n2 = (n6 - 1) * self.delta
-					n6 += 1
-
-				self.xcoords[int(self.nr_of_legs / 4 - i)] = n2
-				self.ycoords[int(self.nr_of_legs / 4 - i)] = abs(math.sqrt(self.coil_shortradius * self.coil_shortradius * (1.0 - n2 / self.coil_radius * (n2 / self.coil_radius))))
-				self.thetas[int(self.nr_of_legs / 4 - i)] = math.atan(self.ycoords[int(self.nr_of_legs / 4 - i)] / self.xcoords[int(self.nr_of_legs / 4 - i)])
-				self.radius[int(self.nr_of_legs / 4 - i)] = math.sqrt((self.xcoords[int(self.nr_of_legs / 4 - i)])**2 + (self.ycoords[int(self.nr_of_legs / 4 - i)])**2)
+		if self.coil_shape == ELLIPSE:
+			self._calcEllipseGeometry()
 		else:
 			self.er_segment_length = 2 * math.pi * (self.coil_radius / self.nr_of_legs)
 
@@ -126,62 +315,107 @@ class CalculateBirdcage:
 			self.thetas[int(self.nr_of_legs / 2 + i)] = math.pi + self.thetas[i]
 			self.thetas[int(self.nr_of_legs - (i + 1))] = 2 * math.pi - self.thetas[i]
 
+	def _calcEllipseGeometry(self):
+		# Places the legs of the first quadrant at equal arc length along the ellipse, the first one half a segment from the top.
+		# The ellipse is parametrized from the top as x = a*sin(phi), y = b*cos(phi), with a the long and b the short radius.
+		self.er_segment_length = self._ellipseArcLength(0, math.pi / 2) * 4 / self.nr_of_legs
+
+		phi = 0
+		arc = 0
+		for i in range(1, int(self.nr_of_legs / 4) + 1):
+			target = self.er_segment_length / 2 * (2 * i - 1)
+			new_phi = phi + (target - arc) / self._ellipseArcDerivative(phi)
+			for _ in range(50):  # Newton's method on the arc length
+				error = arc + self._ellipseArcLength(phi, new_phi) - target
+				new_phi -= error / self._ellipseArcDerivative(new_phi)
+				if abs(error) < 1e-12 * self.er_segment_length:
+					break
+			phi = new_phi
+			arc = target
+
+			k = int(self.nr_of_legs / 4 - i)
+			self.xcoords[k] = self.coil_radius * math.sin(phi)
+			self.ycoords[k] = self.coil_shortradius * math.cos(phi)
+			self.thetas[k] = math.atan(self.ycoords[k] / self.xcoords[k])
+			self.radius[k] = math.sqrt(self.xcoords[k] ** 2 + self.ycoords[k] ** 2)
+
+	def _ellipseArcDerivative(self, phi):
+		return math.sqrt((self.coil_radius * math.cos(phi)) ** 2 + (self.coil_shortradius * math.sin(phi)) ** 2)
+
+	def _ellipseArcLength(self, phi_start, phi_end):
+		# composite Gauss-Legendre integration, panels of at most pi/16
+		panels = max(1, math.ceil(abs(phi_end - phi_start) / (math.pi / 16)))
+		half_width = (phi_end - phi_start) / panels / 2
+		length = 0
+		for panel in range(panels):
+			middle = phi_start + half_width * (2 * panel + 1)
+			for node, weight in zip(_GAUSS_NODES, _GAUSS_WEIGHTS):
+				length += weight * (self._ellipseArcDerivative(middle - half_width * node) + self._ellipseArcDerivative(middle + half_width * node))
+		return length * half_width
+
 	def _calcCurrents(self):
 		# Calc leg/er currents
+		longaxis = (not self.shortaxis) and self.coil_shape == ELLIPSE
+		self.legcurrs, self.ercurrs = self._currents(longaxis)
+		if self.coil_shape == ELLIPSE:
+			# er currents of the other drive axis, 90 degrees out of phase with ercurrs, see _currentRatio
+			self.quadcurrs = self._currents(not longaxis)[1]
+
+	def _currents(self, longaxis):
+		legcurrs = [0.0 for _ in range(self.nr_of_legs)]
+		ercurrs = [0.0 for _ in range(self.nr_of_legs)]
 		n = 1
 		n2 = 1
-		if self.shortaxis or self.coil_shape == self.parent.CIRCLE:
+		if not longaxis:
 			n2 = 0
 		else:
 			n = 0
 
 		for i in range(0, self.nr_of_legs):
-			self.legcurrs[i] = (n * self.coil_shortradius * self.coil_shortradius * math.cos(self.thetas[i]) + n2 * self.coil_radius * self.coil_radius * math.sin(self.thetas[i])) \
-								/ (self.coil_shortradius * self.coil_shortradius * math.cos(self.thetas[i]) * math.cos(self.thetas[i]) + self.coil_radius * self.coil_radius
-								* math.sin(self.thetas[i]) * math.sin(self.thetas[i]))
+			legcurrs[i] = (n * self.coil_shortradius * self.coil_shortradius * math.cos(self.thetas[i]) + n2 * self.coil_radius * self.coil_radius * math.sin(self.thetas[i])) \
+							/ (self.coil_shortradius * self.coil_shortradius * math.cos(self.thetas[i]) * math.cos(self.thetas[i]) + self.coil_radius * self.coil_radius
+							* math.sin(self.thetas[i]) * math.sin(self.thetas[i]))
 
-		if (not self.shortaxis) and self.coil_shape == self.parent.ELLIPSE:
-			self.ercurrs[int(self.nr_of_legs / 4 - 1)] = 0
-			self.ercurrs[int(3 * self.nr_of_legs / 4 - 1)] = 0
-			self.ercurrs[int(self.nr_of_legs / 4 - 1 - 1)] = -self.legcurrs[int(self.nr_of_legs / 4 - 1)]
+		if longaxis:
+			ercurrs[int(self.nr_of_legs / 4 - 1)] = 0
+			ercurrs[int(3 * self.nr_of_legs / 4 - 1)] = 0
+			ercurrs[int(self.nr_of_legs / 4 - 1 - 1)] = -legcurrs[int(self.nr_of_legs / 4 - 1)]
 
 			for i in range(1, int(self.nr_of_legs / 4 - 1)):
-				self.ercurrs[int(self.nr_of_legs / 4 - 1 - (i + 1))] = self.ercurrs[int(self.nr_of_legs / 4 - 1 - i)] - self.legcurrs[int(self.nr_of_legs / 4 - 1 - i)]
-			self.ercurrs[int(self.nr_of_legs - 1)] = self.ercurrs[0] - self.legcurrs[0]
-			self.ercurrs[int(self.nr_of_legs / 2 - 1)] = -self.ercurrs[self.nr_of_legs - 1]
+				ercurrs[int(self.nr_of_legs / 4 - 1 - (i + 1))] = ercurrs[int(self.nr_of_legs / 4 - 1 - i)] - legcurrs[int(self.nr_of_legs / 4 - 1 - i)]
+			ercurrs[int(self.nr_of_legs - 1)] = ercurrs[0] - legcurrs[0]
+			ercurrs[int(self.nr_of_legs / 2 - 1)] = -ercurrs[self.nr_of_legs - 1]
 
 			for i in range(0, int(self.nr_of_legs / 4 - 1)):
-				self.ercurrs[int(self.nr_of_legs / 4 + i)] = -self.ercurrs[int(self.nr_of_legs / 4 - (i + 1) - 1)]
-				self.ercurrs[int(3 * self.nr_of_legs / 4 - (i + 1) - 1)] = -self.ercurrs[int(self.nr_of_legs / 4 - (i + 1) - 1)]
-				self.ercurrs[int(3 * self.nr_of_legs / 4 + i)] = self.ercurrs[int(self.nr_of_legs / 4 - (i + 1) - 1)]
+				ercurrs[int(self.nr_of_legs / 4 + i)] = -ercurrs[int(self.nr_of_legs / 4 - (i + 1) - 1)]
+				ercurrs[int(3 * self.nr_of_legs / 4 - (i + 1) - 1)] = -ercurrs[int(self.nr_of_legs / 4 - (i + 1) - 1)]
+				ercurrs[int(3 * self.nr_of_legs / 4 + i)] = ercurrs[int(self.nr_of_legs / 4 - (i + 1) - 1)]
 
 		else:
 			n = 0
 			for i in range(0, self.nr_of_legs):
-				n += self.legcurrs[i]
-				self.ercurrs[i] = n
+				n += legcurrs[i]
+				ercurrs[i] = n
 
-			self.ercurrs[int(self.nr_of_legs / 2 - 1)] = 0
-			self.ercurrs[int(self.nr_of_legs - 1)] = 0
+			ercurrs[int(self.nr_of_legs / 2 - 1)] = 0
+			ercurrs[int(self.nr_of_legs - 1)] = 0
+		return legcurrs, ercurrs
 
-	def _calcSelfInductances(self):
-		if self.er_config == self.parent.RECT:
-			self.er_self_ind = 2 * self.er_segment_length * (math.log(2 * self.er_segment_length / self.er_width) + 0.5)
-		else:
-			n = self.er_id / self.er_od
-			if n == 0:
-				self.er_self_ind = 2 * self.er_segment_length * (math.log(4 * self.er_segment_length / self.er_od) - 0.75)
-			else:
-				self.er_self_ind = 2 * self.er_segment_length * (math.log(4 * self.er_segment_length / self.er_od) + (0.1493 * n ** 3 - 0.3606 * n ** 2 - 0.0405 * n + 0.2526) - 1)
+	def _currentRatio(self, j, i):
+		"""Ratio of the er current of segment j to segment i, as used for the end ring mutual inductances.
 
-		if self.leg_config == self.parent.RECT:
-			self.leg_self_ind = 2 * self.leg_length * (math.log(2 * self.leg_length / self.leg_width) + 0.5)
-		else:
-			n = self.leg_id / self.leg_od
-			if n == 0:
-				self.leg_self_ind = 2 * self.leg_length * (math.log(4 * self.leg_length / self.leg_od) - 0.75)
-			else:
-				self.leg_self_ind = 2 * self.leg_length * (math.log(4 * self.leg_length / self.leg_od) + (0.1493 * n ** 3 - 0.3606 * n ** 2 - 0.0405 * n + 0.2526) - 1)
+		On a circle it is ercurrs[j] / ercurrs[i] of the segment the capacitor is calculated for. On an ellipse every
+		segment has its own capacitor, so the ratio is taken from the phase of the rotating current pattern of both drive
+		axes (ercurrs and quadcurrs) instead, which does not depend on the segment and becomes the circular ratio when
+		the ellipse becomes a circle.
+		"""
+		if self.coil_shape != ELLIPSE:
+			return self.ercurrs[j] / self.ercurrs[i]
+		return (self.ercurrs[j] * self.ercurrs[i] + self.quadcurrs[j] * self.quadcurrs[i]) / (self.ercurrs[i] ** 2 + self.quadcurrs[i] ** 2)
+
+	def _calcSelfInductances(self):
+		self.er_self_ind = selfInductance(self.er_segment_length, self.er_config, self.er_width, self.er_od, self.er_id)
+		self.leg_self_ind = selfInductance(self.leg_length, self.leg_config, self.leg_width, self.leg_od, self.leg_id)
 
 	def _calcEffLeg(self):
 		# Calc effective inductance of legs
@@ -259,17 +493,17 @@ class CalculateBirdcage:
 			if self.ercurrs[i] == 0:
 				self.ereff[i] += 0
 			else:
-				self.ereff[i] += (abs_ * self.ercurrs[(i + 1) % self.nr_of_legs] + abs2 * self.ercurrs[(i - 1 + self.nr_of_legs) % self.nr_of_legs]) / self.ercurrs[i]
+				if self.coil_shape == ELLIPSE:
+					self.ereff[i] += abs_ * self._currentRatio((i + 1) % self.nr_of_legs, i) + abs2 * self._currentRatio((i - 1 + self.nr_of_legs) % self.nr_of_legs, i)
+				else:
+					self.ereff[i] += (abs_ * self.ercurrs[(i + 1) % self.nr_of_legs] + abs2 * self.ercurrs[(i - 1 + self.nr_of_legs) % self.nr_of_legs]) / self.ercurrs[i]
 
 		array_ = [0 for _ in range(self.nr_of_legs - 3)]
-		array2 = [0 for _ in range(self.nr_of_legs - 3)]
 		for i in range(0, self.nr_of_legs):
 			n = self.xcoords[i]
 			n2 = self.ycoords[i]
 			n3 = self.xcoords[(i + 1) % self.nr_of_legs]
 			n4 = self.ycoords[(i + 1) % self.nr_of_legs]
-			n5 = n3 - n
-			n6 = n4 - n2
 			if self.ercurrs[i] == 0:
 				self.ereff[i] += 0
 			else:
@@ -278,15 +512,6 @@ class CalculateBirdcage:
 					n8 = self.ycoords[j % self.nr_of_legs]
 					n9 = self.xcoords[(j + 1) % self.nr_of_legs]
 					n10 = self.ycoords[(j + 1) % self.nr_of_legs]
-					n11 = n9 - n7
-					n12 = n10 - n8
-
-					if self.ercurrs[i] == 0:
-						array2[j - i - 2] = 0
-					elif n5 * n11 + n6 * n12 > 0:
-						array2[j - i - 2] = 1
-					else:
-						array2[j - i - 2] = -1
 
 					sqrt_ = math.sqrt((n3 - n) ** 2 + (n4 - n2) ** 2)
 					sqrt2 = math.sqrt((n9 - n7) ** 2 + (n10 - n8) ** 2)
@@ -320,10 +545,7 @@ class CalculateBirdcage:
 				n19 = 0
 				for j in range(0, self.nr_of_legs - 3):
 					if j != (self.nr_of_legs - 4) / 2:
-						if self.coil_shape == self.parent.ELLIPSE:
-							n19 += array_[j] * abs(self.ercurrs[(j + i + 2) % self.nr_of_legs] / self.ercurrs[i]) * array2[j]
-						else:
-							n19 += array_[j] * abs(self.ercurrs[(j + i + 2) % self.nr_of_legs] / self.ercurrs[i])
+						n19 += array_[j] * abs(self._currentRatio((j + i + 2) % self.nr_of_legs, i))
 				self.ereff[i] += n19
 
 		for i in range(0, self.nr_of_legs):
@@ -335,7 +557,7 @@ class CalculateBirdcage:
 		for i in range(0, self.nr_of_legs):
 			array[i] = 0.5 * n * self.legeff[i] * self.legcurrs[i]
 
-		if self.coil_shape == self.parent.ELLIPSE:
+		if self.coil_shape == ELLIPSE:
 			if self.shortaxis:
 				self.cap[int(self.nr_of_legs / 4 - 1)] = self.ercurrs[int(self.nr_of_legs / 4 - 1)] / (n * n * self.ercurrs[int(self.nr_of_legs / 4 - 1)]
 														* self.ereff[int(self.nr_of_legs / 4 - 1)] + n * 2.0 * array[int(self.nr_of_legs / 4 - 1)]) * 1e12
@@ -346,15 +568,15 @@ class CalculateBirdcage:
 				self.cap[j] = self.ercurrs[j] / (n * n * self.ercurrs[j] * self.ereff[j] + n * (array[j] - array[j + 1])) * 1e12
 		
 		else:
-			if self.coil_mode == self.parent.HIGHPASS or (self.coil_mode == self.parent.BANDPASS and self.bp_config == self.parent.LEG):
+			if self.coil_mode == HIGHPASS or (self.coil_mode == BANDPASS and self.bp_config == LEG):
 				n2 = 0
-				if self.coil_mode == self.parent.BANDPASS:
+				if self.coil_mode == BANDPASS:
 					n2 = -0.5 * (self.legcurrs[int(self.nr_of_legs / 4 - 1)] / (n * self.bp_cap)) * 1e12
 	
 				self.cap[int(self.nr_of_legs / 4 - 1)] = self.ercurrs[int(self.nr_of_legs / 4 - 1)] / (
 							n ** 2 * self.ercurrs[int(self.nr_of_legs / 4 - 1)] * (self.ereff[int(self.nr_of_legs / 4 - 1)]) + n * 2 * (array[int(self.nr_of_legs / 4 - 1)] + n2)) * 1e12
 			else:
-				if self.coil_mode == self.parent.BANDPASS:
+				if self.coil_mode == BANDPASS:
 					n3 = -self.ercurrs[int(self.nr_of_legs / 4 - 1)] * (n ** 2 * self.ereff[int(self.nr_of_legs / 4 - 1)] - 1 / self.bp_cap * 1e12)
 					n4 = self.legcurrs[int(self.nr_of_legs / 4)] * n ** 2 * self.legeff[int(self.nr_of_legs / 4)]
 				else:
@@ -362,27 +584,3 @@ class CalculateBirdcage:
 					n4 = self.legcurrs[int(self.nr_of_legs / 4)] * n ** 2 * self.legeff[int(self.nr_of_legs / 4)]
 	
 				self.cap[int(self.nr_of_legs / 4 - 1)] = self.legcurrs[int(self.nr_of_legs / 4)] / (n4 + n3) * 1e12
-
-	def _exportResults(self):
-		# export results to gui
-		self.parent.guiTabMoreInfo.v_ind_self_er.set(self.er_self_ind)
-		self.parent.guiTabMoreInfo.v_ind_self_legs.set(self.leg_self_ind)
-		self.parent.guiTabMoreInfo.v_ind_eff_er.set(self.ereff[int(self.nr_of_legs / 4 - 1)] * 1e9)
-		self.parent.guiTabMoreInfo.v_ind_eff_legs.set(self.legeff[int(self.nr_of_legs / 4 - 1)] * 1e9)
-		self.parent.guiTabSettings.v_er_seg_length.set(self.er_segment_length)
-
-		if self.coil_shape == self.parent.ELLIPSE and not self.shortaxis:  # todo add export multiple C's @ ellipse
-			self.parent.guiTabResults.v_cap_res.set(self.cap[int(self.nr_of_legs - 1)])
-		else:
-			self.parent.guiTabResults.v_cap_res.set(self.cap[int(self.nr_of_legs / 4 - 1)])
-
-		result = f""" Results:
-			Result Capacitor: {self.parent.guiTabResults.v_cap_res.get()} pF
-			Result ER Segment Length: {self.parent.guiTabSettings.v_er_seg_length.get()} nH
-			Result Self Inductance ER: {self.parent.guiTabMoreInfo.v_ind_self_er.get()} nH
-			Result Self Inductance Legs: {self.parent.guiTabMoreInfo.v_ind_self_legs.get()} nH
-			Result Effective Inductance ER: {self.parent.guiTabMoreInfo.v_ind_eff_er.get()} nH
-			Result Effective Inductance Legs: {self.parent.guiTabMoreInfo.v_ind_eff_legs.get()} mm
-		"""
-		# logger.info(result.replace('\t', ''))
-		logger.info(result)
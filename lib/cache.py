@@ -0,0 +1,53 @@
+"""
+Description:    Library with an in-memory cache for calculation results.
+Author: 	    Dimitri Welting
+Website:    	http://github.com/dwelting/
+License: 	    Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import threading
+from collections import OrderedDict
+from lib.birdcage_math import BirdcageSettings
+
+
+def settingsKey(settings):
+	# hashable key of all inputs of a calculation
+	return tuple(getattr(settings, key) for key in BirdcageSettings.DEFAULTS.keys())
+
+
+class ResultCache:
+	# Least recently used cache, safe to share between threads
+
+	def __init__(self, max_size=100000):
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self._items = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._items)
+
+	def get(self, key):
+		with self._lock:
+			try:
+				value = self._items[key]
+			except KeyError:
+				self.misses += 1
+				return None
+			self._items.move_to_end(key)
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		with self._lock:
+			self._items[key] = value
+			self._items.move_to_end(key)
+			while len(self._items) > self.max_size:
+				self._items.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._items.clear()
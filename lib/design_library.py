@@ -0,0 +1,299 @@
+"""
+Description:    Library of saved designs, with an index to find the designs that are closest to a new one.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The library is a directory with records.bin, one row of float64 FIELDS per design, that is only ever appended to, so
+saving is cheap and safe while other programs read it. Designs are compared on normalized coordinates (see
+designCoordinates): sizes and the frequency on a log scale, so a 10% difference counts the same for every size, and the
+coil mode, shape and conductor types so far apart that designs only match within the same configuration.
+The KD-tree over the coordinates is saved as index.npy (the order of the designs in the tree). Designs saved after the
+tree was built are searched one by one, until there are enough of them to rebuild the tree.
+"""
+
+import heapq
+import math
+import os
+import time
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, RESULT_COLUMNS, INT_SETTINGS, ELLIPSE, RECT
+from lib.birdcage_batch import settingsToColumns, solveBatch
+from lib.validation import validateColumns, errorMessages
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".pyBirdcagebuilder", "library")
+SETTINGS = tuple(BirdcageSettings.DEFAULTS.keys())
+FIELDS = SETTINGS + RESULT_COLUMNS + ("saved",)
+RECORDS_FILE = "records.bin"
+INDEX_FILE = "index.npy"
+LEAF_SIZE = 64
+REBUILD_FRACTION = 0.05  # the tree is rebuilt when more than this part of the designs is not in it
+MIN_REBUILD = 1024
+RELATIVE_STEP = 0.1  # a 10% difference in a size or the frequency is a distance of 1
+SHIELD_STEP = 0.1  # the same for coil diameter / shield diameter
+CATEGORY_DISTANCE = 1000  # distance between designs with a different coil mode, shape or conductor type
+
+
+def designCoordinates(columns):
+	# [designs, dimensions] coordinates of a dict of setting arrays (see settingsToColumns)
+	ellipse = np.asarray(columns["coil_shape"]) == ELLIPSE
+	diameter = np.where(ellipse, columns["coil_long_diameter"], columns["coil_diameter"]).astype(float)
+	short = np.where(ellipse, columns["coil_short_diameter"], diameter)
+	shield = np.asarray(columns["shield_diameter"], dtype=float)
+	leg = np.where(np.asarray(columns["leg_config"]) == RECT, columns["leg_width"], columns["leg_od"])
+	er = np.where(np.asarray(columns["er_config"]) == RECT, columns["er_width"], columns["er_od"])
+
+	step = math.log(1 + RELATIVE_STEP)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		sizes = [np.log(np.asarray(value, dtype=float)) / step for value in (columns["res_freq"], columns["nr_of_legs"], diameter,
+																			short, columns["leg_length"], leg, er)]
+		shield_ratio = np.where(shield > 0, diameter / np.where(shield > 0, shield, 1), 0) / SHIELD_STEP
+	categories = [np.asarray(columns[key], dtype=float) * CATEGORY_DISTANCE for key in ("coil_mode", "coil_shape", "leg_config", "er_config")]
+	return np.stack(sizes + [shield_ratio] + categories, axis=1)
+
+
+class KDTree:
+	"""Balanced KD-tree over a [n, d] array of points, for k-nearest and range queries.
+
+	The points are reordered so every node covers a contiguous range of them: node i has children 2i + 1 and 2i + 2,
+	and the leaves hold at most leaf_size points. Nodes keep the bounding box of their points for pruning.
+	"""
+
+	def __init__(self, points, leaf_size=LEAF_SIZE, order=None):
+		n = len(points)
+		self.leaf_size = leaf_size
+		self.depth = max(0, math.ceil(math.log2(n / leaf_size))) if n else 0
+		nodes = 2 ** (self.depth + 1) - 1
+		self.starts = np.zeros(nodes, dtype=np.int64)
+		self.ends = np.zeros(nodes, dtype=np.int64)
+		self.ends[0] = n
+
+		build = order is None
+		if build:
+			order = np.arange(n)
+		for node in range(2 ** self.depth - 1):
+			start, end = self.starts[node], self.ends[node]
+			middle = (start + end) // 2
+			if build and end - start > 1:
+				segment = order[start:end]
+				values = points[segment]
+				dim = int(np.argmax(values.max(axis=0) - values.min(axis=0)))
+				order[start:end] = segment[np.argpartition(values[:, dim], middle - start)]
+			self.starts[2 * node + 1], self.ends[2 * node + 1] = start, middle
+			self.starts[2 * node + 2], self.ends[2 * node + 2] = middle, end
+		self.order = order
+		self.points = points[order]
+
+		# bounding boxes, the leaves from their points and the other nodes from their children
+		first_leaf = 2 ** self.depth - 1
+		self.low = np.full((nodes, points.shape[1]), np.inf)
+		self.high = np.full((nodes, points.shape[1]), -np.inf)
+		filled = self.ends[first_leaf:] > self.starts[first_leaf:]
+		if filled.any():
+			leaf_starts = self.starts[first_leaf:][filled]
+			self.low[first_leaf:][filled] = np.minimum.reduceat(self.points, leaf_starts)
+			self.high[first_leaf:][filled] = np.maximum.reduceat(self.points, leaf_starts)
+		for level in range(self.depth - 1, -1, -1):
+			level_nodes = np.arange(2 ** level - 1, 2 ** (level + 1) - 1)
+			self.low[level_nodes] = np.minimum(self.low[2 * level_nodes + 1], self.low[2 * level_nodes + 2])
+			self.high[level_nodes] = np.maximum(self.high[2 * level_nodes + 1], self.high[2 * level_nodes + 2])
+
+	def __len__(self):
+		return len(self.points)
+
+	def _boxDistance(self, node, point):
+		# squared distance of a point to the box of a node
+		gap = np.maximum(np.maximum(self.low[node] - point, point - self.high[node]), 0)
+		return float(gap @ gap)
+
+	def _isLeaf(self, node):
+		return node >= 2 ** self.depth - 1
+
+	def nearest(self, point, k=1):
+		# (indices into the original points, squared distances) of the k nearest points, closest first
+		best_distances = np.empty(0)
+		best_indices = np.empty(0, dtype=np.int64)
+		if not len(self.points):
+			return best_indices, best_distances
+		queue = [(self._boxDistance(0, point), 0)]
+		while queue:
+			distance, node = heapq.heappop(queue)
+			if len(best_distances) == k and distance > best_distances[-1]:
+				break
+			if self._isLeaf(node):
+				start, end = self.starts[node], self.ends[node]
+				difference = self.points[start:end] - point
+				best_distances = np.concatenate([best_distances, np.einsum('ij,ij->i', difference, difference)])
+				best_indices = np.concatenate([best_indices, self.order[start:end]])
+				keep = np.argsort(best_distances, kind='stable')[:k]
+				best_distances, best_indices = best_distances[keep], best_indices[keep]
+			else:
+				for child in (2 * node + 1, 2 * node + 2):
+					if self.ends[child] > self.starts[child]:
+						heapq.heappush(queue, (self._boxDistance(child, point), child))
+		return best_indices, best_distances
+
+	def within(self, point, radius):
+		# (indices into the original points, squared distances) of all points within radius, unsorted
+		indices, distances = [], []
+		stack = [0] if len(self.points) else []
+		while stack:
+			node = stack.pop()
+			if self.ends[node] <= self.starts[node] or self._boxDistance(node, point) > radius ** 2:
+				continue
+			if not self._isLeaf(node):
+				stack.extend((2 * node + 1, 2 * node + 2))
+				continue
+			start, end = self.starts[node], self.ends[node]
+			difference = self.points[start:end] - point
+			squared = np.einsum('ij,ij->i', difference, difference)
+			inside = squared <= radius ** 2
+			indices.append(self.order[start:end][inside])
+			distances.append(squared[inside])
+		if not indices:
+			return np.empty(0, dtype=np.int64), np.empty(0)
+		return np.concatenate(indices), np.concatenate(distances)
+
+
+class DesignLibrary:
+	# The designs in a library directory, with the index kept up to date when designs are added.
+
+	def __init__(self, directory=DEFAULT_DIRECTORY):
+		self.directory = directory
+		self.path = os.path.join(directory, RECORDS_FILE)
+		self.records = np.zeros((0, len(FIELDS)))
+		self.coordinates = np.zeros((0, len(designCoordinates(settingsToColumns([BirdcageSettings()]))[0])))
+		self.tree = None
+		self.reload()
+
+	def __len__(self):
+		return len(self.records)
+
+	def reload(self):
+		# reads designs that were added since the last time, also by other programs
+		rows = os.path.getsize(self.path) // (8 * len(FIELDS)) if os.path.exists(self.path) else 0  # without a row that is still being written
+		if rows > len(self.records):
+			known = len(self.records)
+			self.records = np.memmap(self.path, dtype=np.float64, mode='r', shape=(rows, len(FIELDS)))
+			self.coordinates = np.concatenate([self.coordinates, designCoordinates(self._columns(self.records[known:]))])
+		if self.tree is None:
+			self._loadIndex()
+		self._updateIndex()
+
+	@staticmethod
+	def _columns(records):
+		return {field: records[:, i] for i, field in enumerate(FIELDS)}
+
+	def _loadIndex(self):
+		path = os.path.join(self.directory, INDEX_FILE)
+		try:
+			order = np.load(path)
+		except (OSError, ValueError):
+			return
+		if len(order) <= len(self.records) and (np.sort(order) == np.arange(len(order))).all():
+			self.tree = KDTree(self.coordinates[:len(order)], order=order)
+
+	def _updateIndex(self):
+		indexed = len(self.tree) if self.tree is not None else 0
+		pending = len(self.records) - indexed
+		if self.tree is None or pending > max(MIN_REBUILD, REBUILD_FRACTION * len(self.records)):
+			self.tree = KDTree(self.coordinates)
+			if len(self.records):
+				os.makedirs(self.directory, exist_ok=True)
+				temporary = os.path.join(self.directory, INDEX_FILE + ".tmp.npy")
+				np.save(temporary, self.tree.order)
+				os.replace(temporary, os.path.join(self.directory, INDEX_FILE))
+
+	def add(self, settings_list):
+		"""Calculates and saves designs, returns their numbers in the library.
+
+		Raises ValueError when a design is not valid (see lib.validation) or can not be calculated.
+		"""
+		columns = settingsToColumns(settings_list)
+		codes = validateColumns(columns)
+		for code in codes:
+			if code:
+				raise ValueError(", ".join(title for title, _ in errorMessages(int(code))))
+		results = solveBatch(settings_list)
+		rows = np.empty((len(settings_list), len(FIELDS)))
+		for i, field in enumerate(SETTINGS):
+			rows[:, i] = columns[field]
+		for i, field in enumerate(RESULT_COLUMNS):
+			rows[:, len(SETTINGS) + i] = [result[field] for result in results]
+		if not np.isfinite(rows).all():
+			raise ValueError("No valid result for these settings")
+		rows[:, -1] = time.time()
+
+		return self._append(rows)
+
+	def importSweep(self, store, chunk_size=65536):
+		# saves all valid designs of a sweep (see lib.result_store) without calculating them again, returns how many
+		count = 0
+		for start in range(0, store.size, chunk_size):
+			stop = min(store.size, start + chunk_size)
+			rows = np.empty((stop - start, len(FIELDS)))
+			for i, field in enumerate(FIELDS[:-1]):
+				rows[:, i] = store.columns[field][start:stop]
+			rows[:, -1] = time.time()
+			rows = rows[(store.columns["error_code"][start:stop] == 0) & np.isfinite(rows).all(axis=1)]
+			count += len(self._append(rows, reload=False))
+		self.reload()
+		return count
+
+	def _append(self, rows, reload=True):
+		first = os.path.getsize(self.path) // (8 * len(FIELDS)) if os.path.exists(self.path) else 0
+		os.makedirs(self.directory, exist_ok=True)
+		with open(self.path, "ab") as file:
+			file.write(rows.tobytes())
+		if reload:
+			self.reload()
+		return list(range(first, first + len(rows)))
+
+	def settings(self, number):
+		return BirdcageSettings(**{field: int(value) if field in INT_SETTINGS else float(value) for field, value in zip(SETTINGS, self.records[number])})
+
+	def results(self, number):
+		# dict of RESULT_COLUMNS and the time the design was saved
+		return {field: float(self.records[number, i]) for i, field in enumerate(FIELDS) if field not in SETTINGS}
+
+	def _point(self, settings):
+		return designCoordinates(settingsToColumns([settings]))[0]
+
+	def _pending(self, point):
+		# squared distances of the designs that are not in the tree yet
+		start = len(self.tree)
+		difference = self.coordinates[start:] - point
+		return np.arange(start, len(self.records)), np.einsum('ij,ij->i', difference, difference)
+
+	def nearest(self, settings, k=5):
+		# [(number, distance)] of the k designs closest to settings, closest first
+		point = self._point(settings)
+		indices, distances = self.tree.nearest(point, k)
+		pending, pending_distances = self._pending(point)
+		indices = np.concatenate([indices, pending])
+		distances = np.concatenate([distances, pending_distances])
+		keep = np.argsort(distances, kind='stable')[:k]
+		return [(int(i), math.sqrt(d)) for i, d in zip(indices[keep], distances[keep])]
+
+	def within(self, settings, radius):
+		# [(number, distance)] of all designs within radius (see designCoordinates), closest first
+		point = self._point(settings)
+		indices, distances = self.tree.within(point, radius)
+		pending, pending_distances = self._pending(point)
+		inside = pending_distances <= radius ** 2
+		indices = np.concatenate([indices, pending[inside]])
+		distances = np.concatenate([distances, pending_distances[inside]])
+		keep = np.argsort(distances, kind='stable')
+		return [(int(i), math.sqrt(d)) for i, d in zip(indices[keep], distances[keep])]
+
+	def summary(self, matches):
+		# text table of [(number, distance)]
+		lines = [f"{'design':>8} {'distance':>9} {'MHz':>7} {'legs':>5} {'diam.':>7} {'shield':>7} {'length':>7} {'C (pF)':>9}"]
+		for number, distance in matches:
+			settings = self.settings(number)
+			diameter = settings.coil_long_diameter if settings.coil_shape == ELLIPSE else settings.coil_diameter
+			lines.append(f"{number:>8} {distance:>9.3f} {settings.res_freq:>7.2f} {settings.nr_of_legs:>5} {diameter:>7.2f} "
+						f"{settings.shield_diameter:>7.2f} {settings.leg_length:>7.2f} {self.results(number)['capacitor']:>9.3f}")
+		return "\n".join(lines)
@@ -0,0 +1,262 @@
+"""
+Description:    Library that picks the fastest solver engine for every calculation, measured on this computer.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+An engine calculates a list of BirdcageSettings and returns a result dict per design (see BirdcageSolver.results), or
+None for a design it could not calculate. Which engine is fastest depends on the computer, the number of legs, the
+number of designs and the coil shape: a single design is fastest scalar, batches vectorized or compiled, and coils with
+many legs with the circulant solver. The first time it is needed every available engine is timed on a grid of these,
+and the fastest per grid point is saved. Calculations use the engine of the nearest grid point. When the available
+engines change (e.g. Numba is installed) they are timed again.
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from lib.logging import logger
+from lib.birdcage_math import BirdcageSettings, solve, ELLIPSE, CIRCLE
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pyBirdcagebuilder", "engines.json")
+TUNING_VERSION = 1  # changing the engines or the grid needs a new tuning
+
+# the grid that is timed
+LEG_COUNTS = (8, 16, 32, 64, 128, 256)
+BATCH_SIZES = (1, 16, 256, 4096)
+SHAPES = {"circle": CIRCLE, "ellipse": ELLIPSE}
+MAX_MEASURE_TIME = 0.05  # s per engine and grid point, larger batches of slower engines are extrapolated from fewer designs
+
+
+class Engine:
+	# A solver engine. The loader imports it when first needed and returns the solve function, or None when it is not available.
+
+	def __init__(self, name, loader, ellipses=True):
+		self.name = name
+		self.loader = loader
+		self.ellipses = ellipses
+		self._solve = None
+		self._loaded = False
+
+	@property
+	def available(self):
+		if not self._loaded:
+			try:
+				self._solve = self.loader()
+			except ImportError:
+				self._solve = None
+			self._loaded = True
+		return self._solve is not None
+
+	def solve(self, settings_list):
+		return self._solve(settings_list)
+
+
+ENGINES = {}
+
+
+def registerEngine(name, loader, ellipses=True):
+	# ellipses: whether the engine can calculate elliptical coils
+	ENGINES[name] = Engine(name, loader, ellipses)
+
+
+def _solveScalar(settings_list):
+	results = []
+	for settings in settings_list:
+		try:
+			results.append(solve(settings).results())
+		except (ArithmeticError, ValueError, IndexError):
+			results.append(None)
+	return results
+
+
+def _loadBatch():
+	from lib.birdcage_batch import solveBatch
+	return solveBatch
+
+
+def _loadCirculant():
+	from lib.birdcage_batch import solveBatch, solveColumnsCirculant
+	return lambda settings_list: solveBatch(settings_list, solveColumnsCirculant)
+
+
+def _loadJit():
+	from lib.birdcage_jit import solveBatch, warmUp, NUMBA_AVAILABLE
+	if not NUMBA_AVAILABLE:  # it would run as plain Python
+		return None
+	warmUp()
+	return solveBatch
+
+
+registerEngine("scalar", lambda: _solveScalar)
+registerEngine("batch", _loadBatch, ellipses=False)
+registerEngine("circulant", _loadCirculant, ellipses=False)
+registerEngine("jit", _loadJit)
+
+
+def availableEngines():
+	return [name for name, engine in ENGINES.items() if engine.available]
+
+
+def testDesigns(shape, nr_of_legs, size, seed=0):
+	# size valid designs of a shape with slightly different sizes, so no engine can reuse results
+	generator = random.Random(seed)
+	designs = []
+	for _ in range(size):
+		scale = generator.uniform(0.9, 1.1)
+		diameter = max(30.0, nr_of_legs * 1.0) * scale
+		designs.append(BirdcageSettings(nr_of_legs=nr_of_legs, coil_shape=shape, coil_diameter=diameter, shield_diameter=diameter * 1.2,
+										coil_long_diameter=diameter, coil_short_diameter=diameter * 0.8, leg_length=generator.uniform(10, 30),
+										leg_width=0.5, er_width=0.5))
+	return designs
+
+
+def measure(engine, shape, nr_of_legs, size, max_time=MAX_MEASURE_TIME):
+	"""Time in s per design of an engine for a batch of size designs.
+
+	Starts with a single design (the best of a few tries when it is fast), when the whole batch would take longer than
+	max_time only as many designs are timed as fit in it.
+	"""
+	designs = testDesigns(shape, nr_of_legs, size)
+	single = math.inf
+	for _ in range(3):
+		start = time.perf_counter()
+		engine.solve(designs[:1])
+		single = min(single, time.perf_counter() - start)
+		if single > max_time / 3:
+			break
+	if size == 1:
+		return single
+	count = min(size, max(2, int(max_time / max(single, 1e-9))))
+	start = time.perf_counter()
+	engine.solve(designs[:count])
+	return (time.perf_counter() - start) / count
+
+
+def autotune(path=DEFAULT_PATH, leg_counts=LEG_COUNTS, batch_sizes=BATCH_SIZES):
+	"""Times every available engine on the grid of shapes, leg counts and batch sizes, saves and returns the tuning.
+
+	The tuning is {"engines": [...], "fastest": {"circle,16,256": "batch", ...}, "times": {"circle,16,256": {"batch": s per design, ...}}}.
+	"""
+	names = availableEngines()
+	logger.info(f"Timing the solver engines {', '.join(names)}")
+	fastest = {}
+	times = {}
+	for shape_name, shape in SHAPES.items():
+		for nr_of_legs in leg_counts:
+			for size in batch_sizes:
+				key = f"{shape_name},{nr_of_legs},{size}"
+				candidates = [name for name in names if shape == CIRCLE or ENGINES[name].ellipses]
+				if len(candidates) == 1:  # nothing to choose from
+					fastest[key] = candidates[0]
+					continue
+				times[key] = {name: measure(ENGINES[name], shape, nr_of_legs, size) for name in candidates}
+				fastest[key] = min(times[key], key=times[key].get)
+
+	tuning = {"version": TUNING_VERSION, "engines": names, "fastest": fastest, "times": times}
+	if path is not None:
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			with open(path, "w") as file:
+				json.dump(tuning, file, indent=1)
+		except OSError as e:
+			logger.warning(f"Could not save the solver engine tuning: {e}")
+	return tuning
+
+
+def loadTuning(path=DEFAULT_PATH):
+	# the saved tuning, or None when there is none or it is out of date
+	try:
+		with open(path) as file:
+			tuning = json.load(file)
+	except (OSError, ValueError):
+		return None
+	if tuning.get("version") != TUNING_VERSION or tuning.get("engines") != availableEngines():
+		return None
+	return tuning
+
+
+def tuningTable(tuning):
+	# the fastest engines as text, a row per shape and number of legs, a column per batch size
+	sizes = sorted({int(key.split(",")[2]) for key in tuning["fastest"]})
+	rows = sorted({(key.split(",")[0], int(key.split(",")[1])) for key in tuning["fastest"]})
+	lines = ["shape    legs " + "".join(f"{size:>11}" for size in sizes)]
+	for shape_name, nr_of_legs in rows:
+		cells = []
+		for size in sizes:
+			key = f"{shape_name},{nr_of_legs},{size}"
+			cells.append(f"{tuning['fastest'][key]:>11}" if key in tuning["fastest"] else " " * 11)
+		lines.append(f"{shape_name:<8} {nr_of_legs:>4} " + "".join(cells))
+	return "\n".join(lines)
+
+
+class EngineSelector:
+	# Picks the engine per call from a tuning, which is loaded (or measured) when first needed. Safe to share between threads.
+
+	def __init__(self, path=DEFAULT_PATH):
+		self.path = path
+		self._tuning = None
+		self._lock = threading.Lock()
+
+	@property
+	def tuning(self):
+		with self._lock:
+			if self._tuning is None:
+				self._tuning = loadTuning(self.path) or autotune(self.path)
+			return self._tuning
+
+	def choose(self, shape, nr_of_legs, size):
+		# name of the fastest engine at the nearest grid point, in log scale
+		shape_name = "ellipse" if shape == ELLIPSE else "circle"
+		best = None
+		for key, name in self.tuning["fastest"].items():
+			key_shape, key_legs, key_size = key.split(",")
+			if key_shape != shape_name:
+				continue
+			distance = abs(math.log(int(key_legs) / max(nr_of_legs, 1))) + abs(math.log(int(key_size) / max(size, 1)))
+			if best is None or distance < best[0]:
+				best = (distance, name)
+		return best[1] if best is not None else "scalar"
+
+	def solveMany(self, settings_list):
+		"""Calculates a list of BirdcageSettings with the fastest engine per shape and number of legs.
+
+		Returns a result dict per design, or None for a design that could not be calculated.
+		"""
+		results = [None] * len(settings_list)
+		groups = {}
+		for i, settings in enumerate(settings_list):
+			shape = ELLIPSE if settings.coil_shape == ELLIPSE else CIRCLE
+			groups.setdefault((shape, int(settings.nr_of_legs)), []).append(i)
+
+		for (shape, nr_of_legs), indices in groups.items():
+			name = self.choose(shape, nr_of_legs, len(indices))
+			engine = ENGINES.get(name)
+			if engine is None or not engine.available:
+				engine = ENGINES["scalar"]
+			group = [settings_list[i] for i in indices]
+			try:
+				solved = engine.solve(group)
+			except (ArithmeticError, ValueError, IndexError):
+				solved = _solveScalar(group)
+			for i, result in zip(indices, solved):
+				results[i] = result
+		return results
+
+
+_selector = EngineSelector()
+
+
+def solveMany(settings_list):
+	# solveMany with the tuning of this computer, see EngineSelector
+	return _selector.solveMany(settings_list)
+
+
+def currentTuning():
+	# the tuning solveMany uses, measured now when there is none yet
+	return _selector.tuning
@@ -0,0 +1,150 @@
+"""
+Description:    Library to draw 2D sweep results as a heatmap with contours of catalog capacitor values.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+A heatmap is one image. Every pixel samples the grid at its position with bilinear interpolation, so per image row
+and column at most two grid points are read, whatever the size of the grid: zoomed out the grid is downsampled, zoomed
+in it is interpolated. Contours are drawn into the same image, on the pixels where the value passes a catalog value.
+The grid can be a memory mapped array (see ResultStore.grid), then only the sampled points are read from disk.
+"""
+
+import math
+import numpy as np
+from lib.birdcage_math import E12
+
+# viridis
+COLORS = ((68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37))
+NAN_COLOR = (200, 200, 200)
+CONTOUR_COLOR = (0, 0, 0)
+RANGE_SAMPLES = 256  # resolution of the sample of the whole grid that sets the colour range
+MIN_SPAN = 1  # smallest window, in grid points
+
+
+def colormap(size=256):
+	# [size, 3] uint8 colours from low to high
+	anchors = np.linspace(0, 1, len(COLORS))
+	x = np.linspace(0, 1, size)
+	return np.stack([np.interp(x, anchors, channel) for channel in zip(*COLORS)], axis=1).round().astype(np.uint8)
+
+
+def catalogLevels(low, high, series=E12):
+	# all values of a capacitor series (pF) between low and high
+	if not (0 < low <= high < math.inf):
+		return np.array([])
+	levels = [value * 10 ** decade for decade in range(math.floor(math.log10(low)), math.ceil(math.log10(high)) + 1) for value in series]
+	return np.array([level for level in levels if low <= level <= high])
+
+
+class Heatmap:
+	"""Image of a 2D grid (rows are y, columns are x) in a zoomable window.
+
+	The window is (x0, x1, y0, y1) in grid coordinates, the whole grid is (-0.5, nx - 0.5, -0.5, ny - 0.5).
+	log shows the values on a log scale (default: when all values are positive), levels are the contour values
+	(default: the catalog capacitors in the range when on a log scale).
+	"""
+
+	def __init__(self, grid, levels=None, log=None):
+		self.grid = grid
+		self.ny, self.nx = grid.shape
+		self.reset()
+
+		sample = self.sample(min(RANGE_SAMPLES, self.nx), min(RANGE_SAMPLES, self.ny))
+		finite = sample[np.isfinite(sample)]
+		if log is None:
+			log = finite.size > 0 and bool((finite > 0).all())
+		self.log = log
+		self.range = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+		if levels is None:
+			levels = catalogLevels(*self.range) if log else []
+		self.levels = np.sort(np.asarray(levels, dtype=float))
+		self._colors = colormap()
+
+	def reset(self):
+		self.window = (-0.5, self.nx - 0.5, -0.5, self.ny - 0.5)
+
+	def zoom(self, factor, fx=0.5, fy=0.5):
+		# zooms in (factor > 1) or out around the point at fractions fx (from the left) and fy (from the top) of the image
+		x0, x1, y0, y1 = self.window
+		x = x0 + fx * (x1 - x0)
+		y = y1 - fy * (y1 - y0)
+		width = min(max((x1 - x0) / factor, MIN_SPAN), self.nx)
+		height = min(max((y1 - y0) / factor, MIN_SPAN), self.ny)
+		self._setWindow(x - fx * width, x + (1 - fx) * width, y - (1 - fy) * height, y + fy * height)
+
+	def pan(self, dx, dy):
+		# moves the image by fractions of its size, to the right and down
+		x0, x1, y0, y1 = self.window
+		shift_x = -dx * (x1 - x0)
+		shift_y = dy * (y1 - y0)
+		self._setWindow(x0 + shift_x, x1 + shift_x, y0 + shift_y, y1 + shift_y)
+
+	def _setWindow(self, x0, x1, y0, y1):
+		# keeps the window inside the grid
+		shift_x = max(-0.5 - x0, 0) - max(x1 - (self.nx - 0.5), 0)
+		shift_y = max(-0.5 - y0, 0) - max(y1 - (self.ny - 0.5), 0)
+		self.window = (x0 + shift_x, x1 + shift_x, y0 + shift_y, y1 + shift_y)
+
+	def position(self, fx, fy):
+		# nearest grid point (ix, iy) at fractions of the image
+		x0, x1, y0, y1 = self.window
+		ix = min(max(int(round(x0 + fx * (x1 - x0))), 0), self.nx - 1)
+		iy = min(max(int(round(y1 - fy * (y1 - y0))), 0), self.ny - 1)
+		return ix, iy
+
+	def sample(self, width, height):
+		# [height, width] values of the window, the first row is the top (highest y)
+		x0, x1, y0, y1 = self.window
+		x = x0 + (np.arange(width) + 0.5) / width * (x1 - x0)
+		y = y1 - (np.arange(height) + 0.5) / height * (y1 - y0)
+		i0, i1, tx = self._neighbours(x, self.nx)
+		j0, j1, ty = self._neighbours(y, self.ny)
+
+		# read every needed grid point once
+		columns = np.unique(np.concatenate([i0, i1]))
+		rows = np.unique(np.concatenate([j0, j1]))
+		block = np.asarray(self.grid[np.ix_(rows, columns)], dtype=float)
+		c0 = np.searchsorted(columns, i0)
+		c1 = np.searchsorted(columns, i1)
+		r0 = np.searchsorted(rows, j0)[:, None]
+		r1 = np.searchsorted(rows, j1)[:, None]
+		top = block[r0, c0] * (1 - tx) + block[r0, c1] * tx
+		bottom = block[r1, c0] * (1 - tx) + block[r1, c1] * tx
+		return top * (1 - ty[:, None]) + bottom * ty[:, None]
+
+	@staticmethod
+	def _neighbours(position, size):
+		# grid points on both sides of every position and the weight of the second
+		position = np.clip(position, 0, size - 1)
+		first = np.minimum(np.floor(position).astype(int), max(size - 2, 0))
+		second = np.minimum(first + 1, size - 1)
+		return first, second, position - first
+
+	def render(self, width, height):
+		# [height, width, 3] uint8 image of the window with contours
+		values = self.sample(width, height)
+		finite = np.isfinite(values)
+		low, high = self.range
+		with np.errstate(divide='ignore', invalid='ignore'):
+			if self.log:
+				scaled = (np.log(values) - math.log(low)) / (math.log(high) - math.log(low)) if high > low else np.zeros_like(values)
+			else:
+				scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+		index = np.clip(np.nan_to_num(scaled) * (len(self._colors) - 1), 0, len(self._colors) - 1).astype(int)
+		image = self._colors[index]
+		image[~finite] = NAN_COLOR
+
+		if len(self.levels):
+			level = np.searchsorted(self.levels, np.where(finite, values, -np.inf))
+			contour = np.zeros(values.shape, dtype=bool)
+			contour[:, :-1] |= (level[:, 1:] != level[:, :-1]) & finite[:, 1:] & finite[:, :-1]
+			contour[:-1, :] |= (level[1:, :] != level[:-1, :]) & finite[1:, :] & finite[:-1, :]
+			image[contour] = CONTOUR_COLOR
+		return image
+
+	def ppm(self, width, height):
+		# the image as binary PPM data, which tk.PhotoImage reads directly
+		return b"P6 %d %d 255\n" % (width, height) + self.render(width, height).tobytes()
@@ -8,10 +8,11 @@ License: 	    Copyright (c) 2020 Dimitri Welting. All rights reserved.
 """
 
 import logging
-import logging.config
 import os
+from collections import deque
 
 LOG_CONFIG = os.path.join(os.getcwd(), "conf", "logging.conf")
+SOLVE_LOG_LEVEL = logging.INFO  # level of the input/result blocks logged for every calculation
 
 
 class MyFormatter(logging.Formatter):
@@ -34,17 +35,16 @@ class MyFormatter(logging.Formatter):
 
 		super().__init__(fmt=self.default_fmt, datefmt=self.default_date_fmt, style='%', **kwargs)
 
-	def format(self, record):
-		# Replace the original format with one customized by logging level
-		if record.levelno == logging.INFO:
-			self._style._fmt = self.info_fmt
-		elif record.levelno == logging.DEBUG:
-			self._style._fmt = self.debug_fmt
-		else:
-			self._style._fmt = self.default_fmt
+		# one formatter per logging level, so formatting never changes shared state
+		self._level_formatters = {logging.INFO: logging.Formatter(self.info_fmt, self.default_date_fmt),
+									logging.DEBUG: logging.Formatter(self.debug_fmt, self.default_date_fmt)}
 
-		result = super(MyFormatter, self).format(record)
-		return result
+	def format(self, record):
+		# Use the format customized by logging level
+		formatter = self._level_formatters.get(record.levelno)
+		if formatter is None:
+			return super(MyFormatter, self).format(record)
+		return formatter.format(record)
 
 
 class LoggerConfig:
@@ -71,9 +71,46 @@ class LoggerConfig:
 
 
 
-config = LoggerConfig(LOG_CONFIG)
-logging.config.dictConfig(config.config_dict)
+class StartupHandler(logging.Handler):
+	# Keeps the records logged before setupLogging() is called, they are passed on when logging is configured
+	def __init__(self, capacity=1000):
+		super().__init__()
+		self.records = deque(maxlen=capacity)
+
+	def emit(self, record):
+		self.records.append(record)
+
+
+def setupLogging(file=LOG_CONFIG):
+	# Loading the config (and opening the log file) is postponed until the program has started
+	import atexit
+	import queue
+	import logging.config
+	import logging.handlers
+	config = LoggerConfig(file)
+	logging.config.dictConfig(config.config_dict)
+
+	# The configured handlers are moved to a background thread, logging only puts the record in a queue
+	log_queue = queue.SimpleQueue()
+	listener = logging.handlers.QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+	logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+	listener.start()
+	atexit.register(listener.stop)
+
+	for record in _startup_handler.records:
+		logger.handle(record)
+	_startup_handler.records.clear()
+
+
+def solveLoggingEnabled():
+	# check once per calculation, so building the (multi-line) log messages is skipped when they are not logged
+	return logger.isEnabledFor(SOLVE_LOG_LEVEL)
+
+
+_startup_handler = StartupHandler()
 logger = logging.getLogger('root')
+logger.addHandler(_startup_handler)
+logger.setLevel(logging.DEBUG)
 
 logger.info('---Log Start---')
 
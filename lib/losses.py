@@ -0,0 +1,128 @@
+"""
+Description:    Library to estimate the conductor and capacitor losses and the unloaded Q of birdcage coils.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The homogeneous mode stores the energy sum(L_eff I^2) over the legs and both end rings and loses sum(R I^2) in the
+conductors and in the equivalent series resistance (ESR) of the capacitors, so Q = w * sum(L_eff I^2) / sum(R I^2).
+A conductor carries its current in a layer of about one skin depth under its surface, which gives an effective area of
+perimeter * depth * (1 - exp(-area / (perimeter * depth))): the full area at low frequencies and the skin layer at high
+ones. Strips are taken as STRIP_THICKNESS thick and tubes only conduct on their outside. Edge crowding and proximity
+effects are not included, so the Q is an upper estimate.
+Every frequency on the axis is a retuned coil: the inductances stay the same and the capacitors follow the frequency.
+"""
+
+import math
+import numpy as np
+from lib.birdcage_math import solve, ELLIPSE, RECT, LOWPASS, HIGHPASS
+from lib.birdcage_batch import settingsToColumns, solveColumns, calcGeometry
+
+COPPER_RESISTIVITY = 1.72e-8  # ohm*m at 20 C
+MU0 = 4e-7 * math.pi
+STRIP_THICKNESS = 0.0035  # cm, 35 um copper tape or PCB track
+CAPACITOR_ESR = 0.05  # ohm, typical for high-Q ceramic capacitors at 100-300 MHz
+
+
+def skinDepth(frequency, resistivity=COPPER_RESISTIVITY):
+	# skin depth (cm) at frequency (MHz)
+	return np.sqrt(resistivity / (math.pi * np.asarray(frequency) * 1e6 * MU0)) * 100
+
+
+def conductorResistance(length, config, width, od, id_, frequency, thickness=STRIP_THICKNESS, resistivity=COPPER_RESISTIVITY):
+	"""AC resistance (ohm) of a rectangular strip (RECT) or a (hollow) tube, with lengths in cm and frequency in MHz.
+
+	All arguments may be arrays that broadcast against each other.
+	"""
+	rect = np.asarray(config) == RECT
+	perimeter = np.where(rect, 2 * (np.asarray(width) + thickness), math.pi * np.asarray(od))
+	area = np.where(rect, np.asarray(width) * thickness, math.pi / 4 * (np.asarray(od) ** 2 - np.asarray(id_) ** 2))
+	layer = perimeter * skinDepth(frequency, resistivity)
+	effective_area = layer * -np.expm1(-area / layer)
+	return resistivity * 100 * np.asarray(length) / effective_area
+
+
+class LossResult:
+	# [designs, frequencies] arrays: Q, the resistance (ohm) of one leg and one end ring segment, and the part of the
+	# losses in the capacitors
+
+	def __init__(self, frequencies, q, leg_resistance, er_resistance, capacitor_fraction):
+		self.frequencies = frequencies
+		self.q = q
+		self.leg_resistance = leg_resistance
+		self.er_resistance = er_resistance
+		self.capacitor_fraction = capacitor_fraction
+
+
+def lossColumns(columns, nr_of_legs, frequencies, esr=CAPACITOR_ESR, thickness=STRIP_THICKNESS):
+	"""Losses of a batch of circular coils with the same number of legs, see solveColumns for columns.
+
+	frequencies (MHz) is the frequency axis, shared by all designs. Returns a LossResult.
+	"""
+	results = solveColumns(columns, nr_of_legs)
+	geometry = calcGeometry(columns, nr_of_legs)
+	# the currents are the same for every circular coil
+	leg_sum = np.full(len(results["capacitor"]), (geometry["legcurrs"][0] ** 2).sum())
+	er_sum = np.full(len(results["capacitor"]), (geometry["ercurrs"][0] ** 2).sum())
+	stored = (results["leg_eff_ind"] * leg_sum + 2 * results["er_eff_ind"] * er_sum) * 1e-9
+	return _losses(columns, frequencies, results["er_segment_length"], stored, leg_sum, er_sum, esr, thickness)
+
+
+def lossBatch(settings_list, frequencies, esr=CAPACITOR_ESR, thickness=STRIP_THICKNESS):
+	"""Losses of a list of BirdcageSettings over the frequency axis (MHz), as one LossResult with a row per design.
+
+	Circular coils are calculated per number of legs in one vectorized pass, elliptical coils with the scalar solver.
+	"""
+	frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+	shape = (len(settings_list), len(frequencies))
+	q, leg_resistance, er_resistance, capacitor_fraction = (np.zeros(shape) for _ in range(4))
+
+	groups = {}
+	for i, settings in enumerate(settings_list):
+		if settings.coil_shape == ELLIPSE:
+			groups.setdefault(ELLIPSE, []).append(i)
+		else:
+			groups.setdefault(int(settings.nr_of_legs), []).append(i)
+
+	for key, indices in groups.items():
+		columns = settingsToColumns([settings_list[i] for i in indices])
+		if key == ELLIPSE:
+			result = _ellipseLosses([settings_list[i] for i in indices], columns, frequencies, esr, thickness)
+		else:
+			result = lossColumns(columns, key, frequencies, esr, thickness)
+		q[indices] = result.q
+		leg_resistance[indices] = result.leg_resistance
+		er_resistance[indices] = result.er_resistance
+		capacitor_fraction[indices] = result.capacitor_fraction
+	return LossResult(frequencies, q, leg_resistance, er_resistance, capacitor_fraction)
+
+
+def _ellipseLosses(settings_list, columns, frequencies, esr, thickness):
+	# the scalar solver gives the currents and effective inductances of every leg and end ring segment
+	solvers = [solve(settings) for settings in settings_list]
+	leg_sum = np.array([(np.array(s.legcurrs) ** 2).sum() for s in solvers])
+	er_sum = np.array([(np.array(s.ercurrs) ** 2).sum() for s in solvers])
+	stored = np.array([(np.array(s.legeff) * np.array(s.legcurrs) ** 2).sum() + 2 * (np.array(s.ereff) * np.array(s.ercurrs) ** 2).sum() for s in solvers])
+	er_segment_length = np.array([s.er_segment_length for s in solvers])
+	return _losses(columns, frequencies, er_segment_length, stored, leg_sum, er_sum, esr, thickness)
+
+
+def _losses(columns, frequencies, er_segment_length, stored, leg_sum, er_sum, esr, thickness):
+	# stored is sum(L_eff I^2) in H*A^2, leg_sum and er_sum are sum(I^2) of the legs and of one end ring
+	frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+	f = frequencies[None, :]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		leg_resistance = conductorResistance(np.asarray(columns["leg_length"], dtype=float)[:, None], columns["leg_config"][:, None],
+											columns["leg_width"][:, None], columns["leg_od"][:, None], columns["leg_id"][:, None], f, thickness)
+		er_resistance = conductorResistance(er_segment_length[:, None], columns["er_config"][:, None],
+											columns["er_width"][:, None], columns["er_od"][:, None], columns["er_id"][:, None], f, thickness)
+
+		# capacitors in both end rings (high-pass), in the legs (low-pass) or both (band-pass)
+		coil_mode = np.asarray(columns["coil_mode"])
+		capacitor_loss = esr * (np.where(coil_mode != HIGHPASS, leg_sum, 0) + np.where(coil_mode != LOWPASS, 2 * er_sum, 0))
+		conductor_loss = leg_resistance * leg_sum[:, None] + 2 * er_resistance * er_sum[:, None]
+		total = conductor_loss + capacitor_loss[:, None]
+		q = 2 * math.pi * f * 1e6 * stored[:, None] / total
+	return LossResult(frequencies, q, leg_resistance, er_resistance, capacitor_loss[:, None] / total)
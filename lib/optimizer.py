@@ -0,0 +1,296 @@
+"""
+Description:    Library to search coil designs for the best trade-offs between several objectives.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The search is a genetic algorithm in the style of NSGA-II. Every generation the population gets as many children
+(tournament selection, uniform crossover and mutation), the children are evaluated in one batch and the best half of
+parents and children survives, ranked by non-dominated fronts and crowding distance. Designs that break a hard bound
+never survive a feasible one. All feasible designs that no other design beats on every objective are kept in the
+archive, the Pareto front.
+"""
+
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from lib.logging import logger
+from lib.birdcage_math import BirdcageSettings, solve, ELLIPSE, E12
+from lib.birdcage_batch import solveBatch
+from lib.losses import lossBatch
+from lib.b1_field import calcB1Slice
+from lib.validation import validateSettings
+
+# all objectives are minimized
+OBJECTIVES = ("capacitor_error", "inhomogeneity", "negative_q", "volume")
+OBJECTIVE_NAMES = {"capacitor_error": "Distance to a standard capacitor (%)",
+					"inhomogeneity": "B1 standard deviation (%)",
+					"negative_q": "Unloaded Q (negated)",
+					"volume": "Volume (cm^3)"}
+
+DEFAULT_BOUNDS = {"coil_diameter": (10, 40),
+					"shield_diameter": (12, 50),
+					"leg_length": (5, 40),
+					"leg_width": (0.2, 2),
+					"er_width": (0.2, 2)}
+DEFAULT_LEGS = (8, 12, 16, 20, 24, 28, 32)
+SHIELD_MARGIN = 1.05  # the shield diameter has to be at least this times the (largest) coil diameter
+HOMOGENEITY_RESOLUTION = 16
+MUTATION_SIGMA = 0.1  # standard deviation of a mutation, as a fraction of the bounds
+
+
+def capacitorError(capacitor, series=E12):
+	# relative distance (%) of a capacitor value (pF) to the nearest value of the standard series
+	decade = 10 ** np.floor(np.log10(capacitor))
+	values = np.concatenate((series, [10 * series[0]]))
+	return float(np.min(np.abs(capacitor / (decade * values) - 1)) * 100)
+
+
+def outerDiameter(settings):
+	coil = settings.coil_long_diameter if settings.coil_shape == ELLIPSE else settings.coil_diameter
+	return max(coil, settings.shield_diameter)
+
+
+def violation(settings):
+	# how far a design is outside the hard bounds (0 when it is inside), in cm
+	coil = settings.coil_long_diameter if settings.coil_shape == ELLIPSE else settings.coil_diameter
+	return max(0.0, coil * SHIELD_MARGIN - settings.shield_diameter)
+
+
+def evaluate(settings_list):
+	"""[designs, OBJECTIVES] array of the objectives of a list of BirdcageSettings, nan where a design is invalid or fails.
+
+	The capacitors come from one batch calculation, Q at the resonance frequency from the loss model, and the
+	homogeneity from a coarse transverse B1 slice.
+	"""
+	objectives = np.full((len(settings_list), len(OBJECTIVES)), np.nan)
+	# designs that can not be built are not calculated at all
+	valid = [i for i, code in enumerate(validateSettings(settings_list)) if not code]
+	try:
+		results = solveBatch([settings_list[i] for i in valid])
+	except (ArithmeticError, ValueError):
+		results = [_results(settings_list[i]) for i in valid]  # find the failing elliptical designs one by one
+	for i, result in zip(valid, results):
+		settings = settings_list[i]
+		capacitors = np.asarray(result["capacitors"], dtype=float)
+		if not np.isfinite(capacitors).all() or (capacitors <= 0).any():
+			continue
+		objectives[i, 0] = max(capacitorError(c) for c in capacitors)
+		objectives[i, 3] = math.pi / 4 * outerDiameter(settings) ** 2 * settings.leg_length
+		try:
+			objectives[i, 1] = calcB1Slice(solve(settings), HOMOGENEITY_RESOLUTION).homogeneity()["std"]
+		except (ArithmeticError, ValueError):
+			pass
+
+	for frequency in {settings_list[i].res_freq for i in valid}:
+		rows = [i for i in valid if settings_list[i].res_freq == frequency]
+		objectives[rows, 2] = -lossBatch([settings_list[i] for i in rows], [frequency]).q[:, 0]
+	return objectives
+
+
+def _results(settings):
+	try:
+		return solveBatch([settings])[0]
+	except (ArithmeticError, ValueError):
+		return {"capacitors": [math.nan]}
+
+
+def nonDominatedFronts(objectives):
+	# front number (0 is the Pareto front) of every row of a [designs, objectives] array
+	better_or_equal = (objectives[:, None, :] <= objectives[None, :, :]).all(axis=2)
+	better = (objectives[:, None, :] < objectives[None, :, :]).any(axis=2)
+	dominates = better_or_equal & better  # [i, j]: i dominates j
+	dominated_by = dominates.sum(axis=0)
+	fronts = np.full(len(objectives), -1)
+	front = 0
+	while (fronts < 0).any():
+		current = (dominated_by == 0) & (fronts < 0)
+		fronts[current] = front
+		dominated_by -= dominates[current].sum(axis=0)
+		front += 1
+	return fronts
+
+
+def crowdingDistance(objectives):
+	# distance of every design to its neighbours within its front, larger means more isolated (kept first)
+	distance = np.zeros(len(objectives))
+	for column in objectives.T:
+		order = np.argsort(column)
+		span = column[order[-1]] - column[order[0]]
+		distance[order[[0, -1]]] = np.inf
+		if span > 0:
+			distance[order[1:-1]] += (column[order[2:]] - column[order[:-2]]) / span
+	return distance
+
+
+class Optimizer:
+	"""Multi-objective search around a base design.
+
+	bounds maps settings to (low, high), legs lists the allowed numbers of legs. All other settings, like the
+	frequency and the coil mode, come from base. The population is evaluated in batches, in workers processes when
+	workers > 1. With a checkpoint path the state is saved after every generation and resumed from there.
+	"""
+
+	def __init__(self, base, bounds=None, legs=DEFAULT_LEGS, population=64, seed=None, workers=1, checkpoint=None):
+		self.base = base
+		self.bounds = dict(DEFAULT_BOUNDS if bounds is None else bounds)
+		for key in self.bounds:
+			if key not in BirdcageSettings.DEFAULTS or key in ("nr_of_legs", "res_freq"):
+				raise ValueError(f"Setting '{key}' can not be optimized")
+		self.keys = list(self.bounds)
+		self.low = np.array([self.bounds[key][0] for key in self.keys], dtype=float)
+		self.high = np.array([self.bounds[key][1] for key in self.keys], dtype=float)
+		self.legs = list(legs)
+		self.size = population
+		self.workers = workers
+		self.checkpoint = checkpoint
+		self.rng = np.random.default_rng(seed)
+		self.generation = 0
+		self.archive = []  # dicts with the settings and objectives of the Pareto front
+
+		if checkpoint is not None and os.path.exists(checkpoint):
+			self._load()
+		else:
+			genes = self.rng.uniform(size=(population, len(self.keys)))
+			legs = self.rng.integers(len(self.legs), size=population)
+			self.genes, self.leg_index = genes, legs
+			self.objectives, self.violations = self._evaluate(genes, legs)
+			self._updateArchive(genes, legs, self.objectives, self.violations)
+
+	def settings(self, genes, leg_index):
+		values = self.low + genes * (self.high - self.low)
+		return self.base.copy(nr_of_legs=self.legs[leg_index], **dict(zip(self.keys, values.tolist())))
+
+	def run(self, generations, callback=None):
+		# runs generations more generations, callback(optimizer) is called after every one
+		for _ in range(generations):
+			self.step()
+			if callback is not None:
+				callback(self)
+		return self.archive
+
+	def step(self):
+		genes, legs = self._children()
+		objectives, violations = self._evaluate(genes, legs)
+		self._updateArchive(genes, legs, objectives, violations)
+
+		genes = np.concatenate((self.genes, genes))
+		legs = np.concatenate((self.leg_index, legs))
+		objectives = np.concatenate((self.objectives, objectives))
+		violations = np.concatenate((self.violations, violations))
+		survivors = np.argsort(self._rank(objectives, violations), kind='stable')[:self.size]
+		self.genes, self.leg_index = genes[survivors], legs[survivors]
+		self.objectives, self.violations = objectives[survivors], violations[survivors]
+
+		self.generation += 1
+		logger.info(f"Generation {self.generation}: {len(self.archive)} designs on the Pareto front")
+		if self.checkpoint is not None:
+			self._save()
+
+	def _evaluate(self, genes, legs):
+		settings_list = [self.settings(g, l) for g, l in zip(genes, legs)]
+		violations = np.array([violation(s) for s in settings_list], dtype=float)
+		if self.workers > 1:
+			chunks = [settings_list[i::self.workers] for i in range(self.workers)]
+			with ProcessPoolExecutor(max_workers=self.workers) as executor:
+				parts = list(executor.map(evaluate, chunks))
+			objectives = np.empty((len(settings_list), len(OBJECTIVES)))
+			for i, part in enumerate(parts):
+				objectives[i::self.workers] = part
+		else:
+			objectives = evaluate(settings_list)
+		# a failed calculation counts as infeasible
+		violations[~np.isfinite(objectives).all(axis=1)] = np.inf
+		return objectives, violations
+
+	def _rank(self, objectives, violations):
+		"""Sort keys, lower is better: feasible designs by front and crowding, then infeasible ones by violation."""
+		feasible = violations == 0
+		rank = np.empty(len(objectives))
+		if feasible.any():
+			fronts = nonDominatedFronts(objectives[feasible])
+			crowding = np.zeros(len(fronts))
+			for front in np.unique(fronts):
+				members = fronts == front
+				crowding[members] = crowdingDistance(objectives[feasible][members])
+			# within a front the most isolated designs first, the ends of the front (infinite crowding) before all
+			rank[feasible] = fronts + 1 / (2 + crowding)
+		rank[~feasible] = len(objectives) + np.argsort(np.argsort(violations[~feasible]))
+		return rank
+
+	def _children(self):
+		n = self.size
+		rank = self._rank(self.objectives, self.violations)
+		# binary tournaments
+		first = self.rng.integers(n, size=(n, 2))
+		second = self.rng.integers(n, size=(n, 2))
+		parents_a = np.where(rank[first[:, 0]] <= rank[first[:, 1]], first[:, 0], first[:, 1])
+		parents_b = np.where(rank[second[:, 0]] <= rank[second[:, 1]], second[:, 0], second[:, 1])
+
+		# uniform crossover
+		mask = self.rng.uniform(size=self.genes.shape) < 0.5
+		genes = np.where(mask, self.genes[parents_a], self.genes[parents_b])
+		legs = np.where(self.rng.uniform(size=n) < 0.5, self.leg_index[parents_a], self.leg_index[parents_b])
+
+		# mutation, about one gene per child
+		rate = 1 / (len(self.keys) + 1)
+		mutate = self.rng.uniform(size=genes.shape) < rate
+		genes = np.clip(genes + mutate * self.rng.normal(0, MUTATION_SIGMA, genes.shape), 0, 1)
+		step = (self.rng.uniform(size=n) < rate) * self.rng.choice((-1, 1), size=n)
+		legs = np.clip(legs + step, 0, len(self.legs) - 1)
+		return genes, legs
+
+	def _updateArchive(self, genes, legs, objectives, violations):
+		entries = self.archive + [{"settings": self.settings(g, l).asDict(), "objectives": dict(zip(OBJECTIVES, o.tolist()))}
+									for g, l, o, v in zip(genes, legs, objectives, violations) if v == 0]
+		if not entries:
+			return
+		values = np.array([[entry["objectives"][key] for key in OBJECTIVES] for entry in entries])
+		values, unique = np.unique(values, axis=0, return_index=True)
+		fronts = nonDominatedFronts(values)
+		self.archive = [entries[i] for i in unique[fronts == 0]]
+
+	def paretoFront(self):
+		# the archive as (BirdcageSettings, objectives dict), sorted by capacitor error
+		return [(BirdcageSettings(**entry["settings"]), entry["objectives"]) for entry in sorted(self.archive, key=lambda e: e["objectives"][OBJECTIVES[0]])]
+
+	def summary(self):
+		lines = [f"Pareto front after {self.generation} generations: {len(self.archive)} designs",
+					"legs  " + "  ".join(f"{key:>10}" for key in self.keys) + "  " + "  ".join(f"{key:>15}" for key in OBJECTIVES)]
+		for settings, objectives in self.paretoFront():
+			lines.append(f"{settings.nr_of_legs:>4}  " + "  ".join(f"{getattr(settings, key):>10.3f}" for key in self.keys) + "  "
+							+ "  ".join(f"{objectives[key]:>15.3f}" for key in OBJECTIVES))
+		return "\n".join(lines)
+
+	def _save(self):
+		state = {"generation": self.generation,
+					"keys": self.keys,
+					"legs": self.legs,
+					"genes": self.genes.tolist(),
+					"leg_index": self.leg_index.tolist(),
+					"objectives": self.objectives.tolist(),
+					"violations": self.violations.tolist(),
+					"archive": self.archive,
+					"rng": self.rng.bit_generator.state}
+		temporary = self.checkpoint + ".tmp"
+		with open(temporary, "w") as file:
+			json.dump(state, file)
+		os.replace(temporary, self.checkpoint)  # a crash while saving keeps the previous checkpoint
+
+	def _load(self):
+		with open(self.checkpoint) as file:
+			state = json.load(file)
+		if state["keys"] != self.keys or state["legs"] != self.legs:
+			raise ValueError(f"Checkpoint {self.checkpoint} belongs to an optimization of other settings")
+		self.generation = state["generation"]
+		self.genes = np.array(state["genes"])
+		self.leg_index = np.array(state["leg_index"])
+		self.objectives = np.array(state["objectives"])
+		self.violations = np.array(state["violations"])
+		self.archive = state["archive"]
+		self.rng.bit_generator.state = state["rng"]
+		logger.info(f"Resumed optimization at generation {self.generation} from {self.checkpoint}")
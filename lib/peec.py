@@ -0,0 +1,369 @@
+"""
+Description:    Library to check the inductances of the fast formulas with conductors of finite width (sub-filaments).
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The solver treats every leg and end ring segment as a thin filament: the self inductances are closed formulas for long
+conductors and the mutual inductances are taken between the centre lines. Here every conductor is split into
+sub-filaments over its cross-section (across a strip, or rings and angles of a tube) that carry equal current density,
+and the partial inductance of two conductors is the weighted mean of the Neumann integral over all pairs of their
+sub-filaments, evaluated numerically (PEEC). Sub-filaments of the same conductor are apart by the exact geometric mean
+distance of their cells, so the results converge with few of them; crossCheck also calculates twice as many to show it.
+Parallel filaments of equal length reduce to a one dimensional integral, all others are integrated with Gauss-Legendre
+in both directions, with a Duffy transformation for segments that meet in a corner.
+
+The effective inductances and capacitors are put together with the same rules as BirdcageSolver. With one
+sub-filament per conductor the mutual inductances match the fast formulas, but the self inductances do not: they come
+from the geometric mean distance of the whole cross-section and the exact partial inductance of a straight filament,
+not from the closed formulas, and differ from them by a few tenths of a percent for strips and up to a few percent
+for tubes. Lengths in cm give inductances in nH (mu0 / 4 pi = 1 nH/cm).
+"""
+
+import copy
+import math
+import numpy as np
+from lib.birdcage_math import solve, RECT, ELLIPSE
+
+FILAMENTS = 4  # sub-filaments across a strip; rings of a tube (with twice as many angles)
+NODES = 16  # Gauss-Legendre nodes per integral
+CHUNK_SIZE = 1 << 18  # kernel evaluations per chunk, bounds the memory
+SECTOR_TERMS = 4096  # terms of the series for the geometric mean distance of tube cells
+WIDTH_FRACTIONS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5)
+QUANTITIES = ("leg_self_ind", "er_self_ind", "leg_eff_ind", "er_eff_ind", "capacitor")
+
+_X, _W = np.polynomial.legendre.leggauss(NODES)
+_X = (_X + 1) / 2  # on [0, 1]
+_W = _W / 2
+
+
+def crossSection(config, width, od, id_, filaments=FILAMENTS):
+	"""Sub-filaments of a conductor cross-section: [K, 2] offsets (u along the width of a strip, v perpendicular to it),
+	[K] weights (their share of the current) and the [K, K] geometric mean distances of the cells to each other.
+
+	The distance between the centres of two neighbouring cells is not a good mean, so all cells use their exact geometric
+	mean distance: of two lines for a strip, of two annular sectors for a tube (see _sectorLogGmd).
+	"""
+	if config == RECT:
+		cell = width / filaments
+		u = (np.arange(filaments) + 0.5) * cell - width / 2
+		k = np.abs(np.arange(filaments)[:, None] - np.arange(filaments)[None, :]).astype(float)
+		log_gmd = (_squareLog(k + 1) + _squareLog(np.abs(k - 1)) - 2 * _squareLog(k)) / 2 - 1.5 + math.log(cell)
+		return np.stack([u, np.zeros(filaments)], axis=1), np.full(filaments, 1 / filaments), np.exp(log_gmd)
+
+	outer = od / 2
+	inner = id_ / 2
+	if filaments == 1:
+		# one filament in the centre, with the geometric mean distance of the whole annulus
+		if inner == 0:
+			gmd = outer * math.exp(-0.25)
+		else:
+			area = outer ** 2 - inner ** 2
+			gmd = outer * math.exp(-inner ** 4 / area ** 2 * math.log(outer / inner) + (3 * inner ** 2 - outer ** 2) / (4 * area))
+		return np.zeros((1, 2)), np.ones(1), np.array([[gmd]])
+
+	angles = 2 * filaments
+	edges = inner + np.arange(filaments + 1) * (outer - inner) / filaments
+	radius = np.repeat((edges[1:] + edges[:-1]) / 2, angles)
+	phi = np.tile((np.arange(angles) + 0.5) * 2 * math.pi / angles, filaments)
+	offsets = np.stack([radius * np.cos(phi), radius * np.sin(phi)], axis=1)
+	log_gmd = _sectorLogGmd(edges, angles)  # [ring, ring, angle, angle]
+	log_gmd = log_gmd.transpose(0, 2, 1, 3).reshape(filaments * angles, filaments * angles)
+	return offsets, radius / radius.sum(), np.exp(log_gmd)
+
+
+def _sectorLogGmd(edges, angles, terms=SECTOR_TERMS):
+	"""[rings, rings, angles, angles] log of the geometric mean distance between the annular sectors of a tube, with the
+	ring edges and the number of equal angles.
+
+	With ln|p - q| = ln(R) - sum over m of (r / R)^m cos(m (phi - psi)) / m (r the smaller and R the larger radius of
+	p and q) the integral over two sectors splits into closed integrals over the angles and over the radii. Rings are
+	either the same or one is inside the other.
+	"""
+	r0, r1 = edges[:-1], edges[1:]
+	m = np.arange(1, terms + 1, dtype=float)
+	same = np.eye(len(r0), dtype=bool)
+
+	# radial integrals of r s ln(R) and r s (r / R)^m, for ring a inside ring b and for a ring with itself (for m = 2
+	# the power integrals are logarithms)
+	a0, a1 = r0[:, None], r1[:, None]
+	b0, b1 = r0[None, :], r1[None, :]
+	inside = (a1 ** 2 - a0 ** 2) / 2 * (_powerLog(b1, 2) - _powerLog(b0, 2))
+	self_term = _powerLog(r1, 4) - r0 ** 2 * _powerLog(r1, 2) - (_powerLog(r0, 4) - r0 ** 2 * _powerLog(r0, 2))
+	radial_0 = np.where(same, self_term[:, None], np.where(a1 <= b0, inside, inside.T))
+	i0, o0 = np.minimum(a0, b0)[..., None], np.maximum(a0, b0)[..., None]
+	i1, o1 = np.minimum(a1, b1)[..., None], np.maximum(a1, b1)[..., None]
+	with np.errstate(divide='ignore', invalid='ignore', over='ignore'):  # in the terms of the other case, not used
+		inside_m = np.where(m == 2, (i1 ** 4 - i0 ** 4) / 4 * np.log(o1 / o0),
+							(_ratioPower(i1, o1, m) - _ratioPower(i1, o0, m) - _ratioPower(i0, o1, m) + _ratioPower(i0, o0, m)) / ((2 - m) * (m + 2)))
+		c0, c1 = r0[:, None], r1[:, None]
+		lower = np.where(m == 2, c0 ** 4 * np.log(c1 / np.where(c0 > 0, c0, 1)), (_ratioPower(c0, c1, m) - c0 ** 4) / (2 - m))
+	self_m = 2 / (m + 2) * ((c1 ** 4 - c0 ** 4) / 4 - lower)
+	radial_m = np.where(same[..., None], self_m[:, None, :], inside_m)
+
+	# angular integrals of 1 and cos(m (phi - psi)) over two sectors
+	width = 2 * math.pi / angles
+	start = np.arange(angles) * width
+	shape = (np.exp(1j * m * width) - 1) / (1j * m)  # integral of exp(i m phi) over a sector starting at 0
+	phase = np.exp(1j * m * (start[:, None, None] - start[None, :, None]))
+	angular_m = (phase * np.abs(shape) ** 2).real
+
+	integral = radial_0[:, :, None, None] * width ** 2 - np.einsum('abm,ijm->abij', radial_m / m, angular_m)
+	area = (r1 ** 2 - r0 ** 2) / 2 * width
+	return integral / (area[:, None, None, None] * area[None, :, None, None])
+
+
+def _powerLog(x, k):
+	# integral of x^(k-1) ln(x) from 0, that is x^k (ln(x) / k - 1 / k^2)
+	return np.where(x > 0, x ** k * (np.log(np.where(x > 0, x, 1)) / k - 1 / k ** 2), 0)
+
+
+def _ratioPower(x, y, m):
+	# x^(m + 2) y^(2 - m) for 0 <= x <= y, as x^4 (x / y)^(m - 2) so it can not overflow
+	return np.where(x > 0, x ** 4 * (np.where(x > 0, x, 1) / y) ** (m - 2), 0)
+
+
+def _squareLog(x):
+	return x ** 2 * np.log(np.where(x > 0, x, 1))
+
+
+def parallelMutual(length, distance):
+	"""Mutual inductance (nH) of parallel filaments of equal length side by side, for arrays of lengths and distances (cm).
+
+	The Neumann integral over s and t only depends on u = s - t, and u = distance * sinh(tau) makes the remaining
+	integral smooth.
+	"""
+	length, distance = np.broadcast_arrays(np.asarray(length, dtype=float), np.asarray(distance, dtype=float))
+	flat_length = length.ravel()
+	flat_distance = distance.ravel()
+	result = np.empty(flat_length.shape)
+	chunk = max(1, CHUNK_SIZE // NODES)
+	for start in range(0, len(result), chunk):
+		rows = slice(start, start + chunk)
+		l = flat_length[rows, None]
+		d = flat_distance[rows, None]
+		end = np.arcsinh(l / d)
+		result[rows] = 2 * end[:, 0] * ((l - d * np.sinh(end * _X)) * _W).sum(axis=1)
+	return result.reshape(length.shape)
+
+
+def segmentMutual(a0, a1, b0, b1, corner=False):
+	"""Mutual inductance (nH) of the straight filaments a0 -> a1 and b0 -> b1, for [..., 3] arrays of points (cm).
+
+	corner: a1 is (close to) b0. The integral is then taken from that corner, and split in two triangles that are mapped
+	to the square (Duffy), which removes the 1/R singularity.
+	"""
+	a0, a1, b0, b1 = np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in (a0, a1, b0, b1)))
+	shape = a0.shape[:-1]
+	a0, a1, b0, b1 = (p.reshape(-1, 3) for p in (a0, a1, b0, b1))
+	la = a1 - a0
+	lb = b1 - b0
+	length_a = np.linalg.norm(la, axis=1)
+	length_b = np.linalg.norm(lb, axis=1)
+	cosine = (la * lb).sum(axis=1) / (length_a * length_b)
+
+	s = _X[:, None]
+	t = _X[None, :]
+	weights = _W[:, None] * _W[None, :]
+	result = np.empty(len(a0))
+	chunk = max(1, CHUNK_SIZE // NODES ** 2)
+	for start in range(0, len(result), chunk):
+		rows = slice(start, start + chunk)
+		if corner:
+			# from the corner: a(s) = a1 - s la, b(t) = b0 + t lb; the two triangles s > t and t > s
+			offset = (a1[rows] - b0[rows])[:, None, None, :]
+			first = _inverseDistance(offset - s[..., None] * la[rows, None, None, :] - (s * t)[..., None] * lb[rows, None, None, :])
+			second = _inverseDistance(offset - (s * t)[..., None] * la[rows, None, None, :] - s[..., None] * lb[rows, None, None, :])
+			integral = ((first + second) * s * weights).sum(axis=(1, 2))
+		else:
+			points = (a0[rows] - b0[rows])[:, None, None, :] + s[..., None] * la[rows, None, None, :] - t[..., None] * lb[rows, None, None, :]
+			integral = (_inverseDistance(points) * weights).sum(axis=(1, 2))
+		result[rows] = cosine[rows] * length_a[rows] * length_b[rows] * integral
+	return result.reshape(shape)
+
+
+def _inverseDistance(vectors):
+	return 1 / np.sqrt((vectors ** 2).sum(axis=-1))
+
+
+class CrossCheckResult:
+	# The QUANTITIES of the fast formulas and of the sub-filaments (with nr_of_filaments and twice as many), inductances
+	# in nH and the capacitor in pF
+
+	def __init__(self, fast, filaments, refined, nr_of_filaments):
+		self.fast = fast
+		self.filaments = filaments
+		self.refined = refined
+		self.nr_of_filaments = nr_of_filaments
+
+	def deviation(self):
+		# relative difference of the fast formulas to the sub-filaments, the finer of the two
+		return {key: self.fast[key] / self.refined[key] - 1 for key in QUANTITIES}
+
+	def convergence(self):
+		# relative change of the sub-filament results from nr_of_filaments to twice as many, small when converged
+		return {key: self.refined[key] / self.filaments[key] - 1 for key in QUANTITIES}
+
+	def summary(self):
+		deviation = self.deviation()
+		convergence = self.convergence()
+		k = self.nr_of_filaments
+		lines = [f"{'':<22}{'fast':>12}{f'{k} filaments':>15}{f'{2 * k} filaments':>15}{'change':>10}{'deviation':>12}"]
+		for key in QUANTITIES:
+			unit = "pF" if key == "capacitor" else "nH"
+			lines.append(f"{key + ' (' + unit + ')':<22}{self.fast[key]:>12.5g}{self.filaments[key]:>15.5g}{self.refined[key]:>15.5g}"
+							f"{convergence[key] * 100:>9.3f}%{deviation[key] * 100:>11.3f}%")
+		return "\n".join(lines)
+
+
+def crossCheck(settings, filaments=FILAMENTS):
+	"""Calculates a design with the fast formulas and with sub-filaments (see the module description), with filaments
+	and twice as many to show how far the sub-filaments have converged.
+
+	Raises like solve() for settings that can not be calculated.
+	"""
+	fast = solve(settings)
+	coarse = filamentSolver(fast, filaments).results()
+	fine = filamentSolver(fast, 2 * filaments).results()
+	return CrossCheckResult(*({key: result[key] for key in QUANTITIES} for result in (fast.results(), coarse, fine)), filaments)
+
+
+def filamentSolver(fast, filaments=FILAMENTS):
+	"""A copy of a solved BirdcageSolver with the inductances and capacitors calculated from sub-filaments.
+
+	Only the legs and segments the capacitors depend on are calculated, the effective inductances of the others are nan.
+	"""
+	n = fast.nr_of_legs
+	k = n // 4 - 1
+	if fast.coil_shape == ELLIPSE:
+		leg_rows = np.array(list(range(n // 4 + 1)) + [n - 1])
+		er_rows = np.array(list(range(n // 4)) + [n - 1])
+	else:
+		leg_rows = np.array([k, k + 1])
+		er_rows = np.array([k])
+	x = np.array(fast.xcoords, dtype=float)
+	y = np.array(fast.ycoords, dtype=float)
+
+	leg_self, leg_eff = _legInductances(fast, x, y, np.array(fast.legcurrs, dtype=float), leg_rows, filaments)
+	er_self, er_eff = _ringInductances(fast, x, y, np.array(fast.ercurrs, dtype=float), er_rows, filaments)
+
+	solver = copy.copy(fast)
+	solver.leg_self_ind = leg_self
+	solver.er_self_ind = er_self
+	solver.legeff = [math.nan] * n
+	solver.ereff = [math.nan] * n
+	for row, value in zip(leg_rows, leg_eff):
+		solver.legeff[row] = float(value) * 1e-9
+	for row, value in zip(er_rows, er_eff):
+		solver.ereff[row] = float(value) * 1e-9
+	solver.cap = [0.0] * n
+	solver._calcCapacitance()
+	return solver
+
+
+def _legInductances(fast, x, y, legcurrs, rows, filaments):
+	# self inductance and the effective inductances of the legs in rows (nH), the same terms as BirdcageSolver._calcEffLeg
+	offsets, weights, own = crossSection(fast.leg_config, fast.leg_width, fast.leg_od, fast.leg_id, filaments)
+
+	# the width of a strip is along the coil, tangent to the line through the neighbouring legs
+	tangent = np.stack([np.roll(x, -1) - np.roll(x, 1), np.roll(y, -1) - np.roll(y, 1)], axis=1)
+	tangent /= np.linalg.norm(tangent, axis=1)[:, None]
+	normal = np.stack([tangent[:, 1], -tangent[:, 0]], axis=1)
+	points = np.stack([x, y], axis=1)[:, None, :] + offsets[None, :, :1] * tangent[:, None, :] + offsets[None, :, 1:] * normal[:, None, :]  # [n, K, 2]
+
+	pair_weights = weights[:, None] * weights[None, :]
+	if fast.shield_radius != 0:
+		# image of every sub-filament in the shield
+		images = points * (fast.shield_radius ** 2 / (points ** 2).sum(axis=-1))[..., None]
+	leg_eff = np.empty(len(rows))
+	for index, i in enumerate(rows):
+		distance = np.linalg.norm(points[i][None, :, None, :] - points[:, None, :, :], axis=-1)  # [n, K, K]
+		distance[i] = own
+		mutual = (parallelMutual(fast.leg_length, distance) * pair_weights).sum(axis=(1, 2))
+		if fast.shield_radius != 0:
+			distance = np.linalg.norm(points[i][None, :, None, :] - images[:, None, :, :], axis=-1)
+			mutual -= (parallelMutual(fast.leg_length, distance) * pair_weights).sum(axis=(1, 2))
+		leg_eff[index] = (mutual * legcurrs).sum() / legcurrs[i]
+	leg_self = float((parallelMutual(fast.leg_length, own) * pair_weights).sum())
+	return leg_self, leg_eff
+
+
+def _ringInductances(fast, x, y, ercurrs, rows, filaments):
+	# self inductance and the effective inductances of the end ring segments (leg i to leg i + 1) in rows (nH)
+	n = len(x)
+	offsets, weights, own = crossSection(fast.er_config, fast.er_width, fast.er_od, fast.er_id, filaments)
+	count = len(weights)
+
+	# the width of a strip is along the coil axis (z), the other direction is perpendicular to the segment in the plane
+	start = np.stack([x, y, np.zeros(n)], axis=1)
+	end = np.roll(start, -1, axis=0)
+	direction = (end - start) / np.linalg.norm(end - start, axis=1)[:, None]
+	normal = np.stack([direction[:, 1], -direction[:, 0], np.zeros(n)], axis=1)
+	shift = offsets[None, :, :1] * np.array([0, 0, 1.0]) + offsets[None, :, 1:] * normal[:, None, :]  # [n, K, 3]
+	starts = start[:, None, :] + shift
+	ends = end[:, None, :] + shift
+	pair_weights = (weights[:, None] * weights[None, :]).ravel()
+	p = np.repeat(np.arange(count), count)
+	q = np.tile(np.arange(count), count)
+
+	def mutual(a, b, corner=False):
+		# partial mutual inductances of the segments a[m] and b[m], with all pairs of their sub-filaments
+		result = np.empty(len(a))
+		chunk = max(1, CHUNK_SIZE // NODES // len(p))
+		for first in range(0, len(a), chunk):
+			m = slice(first, first + chunk)
+			values = segmentMutual(starts[a[m]][:, p], ends[a[m]][:, p], starts[b[m]][:, q], ends[b[m]][:, q], corner)
+			result[m] = (values * pair_weights).sum(axis=1)
+		return result
+
+	# partial inductances of the rows with every segment: itself, the neighbours (meeting in a corner) and the others
+	segments = np.arange(n)
+	inductance = np.empty((len(rows), n))
+	er_self = float((parallelMutual(fast.er_segment_length, own.ravel()) * pair_weights).sum())  # of the arc length, like the solver
+	inductance[segments[None, :] == rows[:, None]] = er_self
+	following = (rows + 1) % n
+	inductance[np.arange(len(rows)), following] = mutual(rows, following, corner=True)
+	preceding = (rows - 1) % n
+	inductance[np.arange(len(rows)), preceding] = mutual(preceding, rows, corner=True)
+	offset = (segments[None, :] - rows[:, None]) % n
+	others = (offset >= 2) & (offset <= n - 2)
+	row_index, other = np.nonzero(others)
+	inductance[row_index, other] = mutual(rows[row_index], other)
+
+	# the same terms as BirdcageSolver._calcEffER
+	er_eff = np.full(len(rows), er_self)
+	for index, i in enumerate(rows):
+		if ercurrs[i] == 0:
+			continue
+		ratio = np.array([fast._currentRatio(j, i) for j in range(n)])
+		er_eff[index] += abs(inductance[index, (i + n // 2) % n])
+		er_eff[index] += abs(inductance[index, following[index]]) * ratio[following[index]] + abs(inductance[index, preceding[index]]) * ratio[preceding[index]]
+		ring = others[index] & (offset[index] != n // 2)
+		er_eff[index] += (inductance[index, ring] * np.abs(ratio[ring])).sum()
+	return er_self, er_eff
+
+
+def widthScan(settings, fractions=WIDTH_FRACTIONS, filaments=FILAMENTS):
+	"""Deviation of the fast capacitor from the sub-filaments for strips of increasing width.
+
+	The legs and end ring are strips (RECT) of fraction times the distance between neighbouring legs.
+	Returns [(fraction, deviation)].
+	"""
+	fast = solve(settings)
+	spacing = math.hypot(fast.xcoords[1] - fast.xcoords[0], fast.ycoords[1] - fast.ycoords[0])
+	scan = []
+	for fraction in fractions:
+		width = fraction * spacing
+		result = crossCheck(settings.copy(leg_config=RECT, er_config=RECT, leg_width=width, er_width=width), filaments)
+		scan.append((fraction, result.deviation()["capacitor"]))
+	return scan
+
+
+def widthTable(scan):
+	# a widthScan as text
+	lines = ["strip width / leg spacing   capacitor deviation"]
+	for fraction, deviation in scan:
+		lines.append(f"{fraction:>25.2f}{deviation * 100:>21.3f}%")
+	return "\n".join(lines)
@@ -0,0 +1,274 @@
+"""
+Description:    Library to write sweep results to disk and browse them without loading them.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+A store is a directory with one .npy file per column (the settings, RESULT_COLUMNS and the validation error code)
+and sweep.json with the swept parameters and their values. The rows are in the order of the grid of swept values, so
+a column reshaped to that grid (see grid) gives the results per parameter. Columns are memory mapped, so only the rows
+that are shown are read, and sorting or filtering only reads the columns it needs. The sweep.json is written last, a
+store without it is incomplete. Results can be calculated and stored in float32 (half the memory and disk), the settings
+are always stored exactly; the error of float32 against float64 is measured on the first chunk and saved in sweep.json.
+"""
+
+import json
+import math
+import operator
+import os
+import pickle
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, solve, settingsFromJson, RESULT_COLUMNS, INT_SETTINGS, ELLIPSE
+from lib.logging import logger
+from lib.birdcage_batch import solveColumns, comparePrecision
+from lib.validation import validateColumns
+
+FIELDS = tuple(BirdcageSettings.DEFAULTS.keys()) + RESULT_COLUMNS + ("error_code",)
+METADATA_FILE = "sweep.json"
+CHUNK_SIZE = 65536
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq, "!=": operator.ne}
+_CONDITION = re.compile(r"^\s*(\w+)\s*(<=|>=|==|!=|<|>)\s*(\S+)\s*$")
+
+
+def fieldType(field, dtype=np.float64):
+	# dtype is the type of the results
+	if field in INT_SETTINGS or field == "error_code":
+		return np.int32
+	return dtype if field in RESULT_COLUMNS else np.float64
+
+
+def writeSweep(directory, spec, chunk_size=CHUNK_SIZE, workers=1, dtype=np.float64):
+	"""Calculates every combination of a sweep and writes the results as a store, returns the number of rows.
+
+	spec is the same as the body of a /sweep request: {"settings": {...}, "sweep": {"leg_length": [10, 15, 20], ...}}.
+	The rows are calculated and written in chunks, so the size of a sweep is only limited by the disk.
+	Invalid combinations are not calculated, they get nan results and their error code.
+	With more than one worker the chunks are calculated in worker processes, which write their rows straight into
+	the memory mapped columns and only send back which rows are done.
+	With dtype=np.float32 the results are calculated and stored in single precision (see birdcage_batch).
+	"""
+	job = _sweepJob(spec, dtype)
+	size = math.prod(job["shape"])
+
+	os.makedirs(directory, exist_ok=True)
+	metadata_path = os.path.join(directory, METADATA_FILE)
+	if os.path.exists(metadata_path):
+		os.remove(metadata_path)
+	for field in FIELDS:
+		np.lib.format.open_memmap(os.path.join(directory, field + ".npy"), mode='w+', dtype=fieldType(field, dtype), shape=(size,)).flush()
+
+	chunks = [(start, min(size, start + chunk_size)) for start in range(0, size, chunk_size)]
+	if workers > 1 and len(chunks) > 1:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			for future in [executor.submit(_writeChunk, directory, job, start, stop) for start, stop in chunks]:
+				future.result()
+	else:
+		for start, stop in chunks:
+			_writeChunk(directory, job, start, stop)
+
+	metadata = {"parameters": job["names"], "sweep": dict(zip(job["names"], job["values"])), "settings": job["base"], "rows": size}
+	if job["dtype"] != "float64":
+		errors = _precisionErrors(job, min(size, chunk_size))
+		logger.info(f"{job['dtype']} results differ from float64 up to {errors['capacitor']:.1e} (capacitor) and "
+					f"{max(errors.values()):.1e} (all results) in the first {min(size, chunk_size)} rows")
+		metadata["precision"] = {"dtype": job["dtype"], "error": errors}
+	with open(metadata_path, "w") as file:
+		json.dump(metadata, file)
+	return size
+
+
+def _precisionErrors(job, stop):
+	# largest relative error of every result of the circular coils in the rows 0 to stop, against float64
+	columns = _chunkSettings(job, 0, stop)
+	circle = (validateColumns(columns) == 0) & (columns["coil_shape"] != ELLIPSE)
+	errors = dict.fromkeys(RESULT_COLUMNS, 0.0)
+	for nr_of_legs in np.unique(columns["nr_of_legs"][circle]):
+		rows = np.flatnonzero(circle & (columns["nr_of_legs"] == nr_of_legs))
+		report = comparePrecision({key: column[rows] for key, column in columns.items()}, int(nr_of_legs), job["dtype"])
+		errors = {key: max(errors[key], report["error"][key]) for key in RESULT_COLUMNS}
+	return errors
+
+
+def _sweepJob(spec, dtype=np.float64):
+	# the parts of a sweep spec the chunks need, as plain Python values so they are cheap to send to other processes
+	base = settingsFromJson(spec.get("settings", {}))
+	sweep = spec.get("sweep", {})
+	for name in sweep:
+		if name not in BirdcageSettings.DEFAULTS:
+			raise ValueError(f"Unknown setting '{name}'")
+	names = list(sweep.keys())
+	values = [np.asarray(sweep[name], dtype=fieldType(name)).tolist() for name in names]
+	return {"base": base.asDict(), "names": names, "values": values, "shape": tuple(len(v) for v in values), "dtype": np.dtype(dtype).name}
+
+
+def _chunkSettings(job, start, stop):
+	# setting columns of the rows start to stop of a sweep
+	chunk = {key: np.full(stop - start, value, dtype=fieldType(key)) for key, value in job["base"].items()}
+	for name, values, index in zip(job["names"], job["values"], np.unravel_index(np.arange(start, stop), job["shape"])):
+		chunk[name] = np.asarray(values, dtype=fieldType(name))[index]
+	return chunk
+
+
+def _sweepChunk(job, start, stop):
+	# results and error codes of the rows start to stop of a sweep
+	return _solveChunk(_chunkSettings(job, start, stop), job["dtype"])
+
+
+def _writeChunk(directory, job, start, stop):
+	# may run in a worker process: writes the rows into the columns of the store and only returns which rows
+	for field, column in _sweepChunk(job, start, stop).items():
+		target = np.load(os.path.join(directory, field + ".npy"), mmap_mode='r+')
+		target[start:stop] = column
+		target.flush()
+		del target
+	return start, stop
+
+
+def _pickleChunk(job, start, stop):
+	# the old way for measureTransport: a result dict per design, pickled back to the parent
+	columns = _sweepChunk(job, start, stop)
+	return [{field: columns[field][i].item() for field in FIELDS} for i in range(stop - start)]
+
+
+def measureTransport(spec, directory, workers=2, chunk_size=CHUNK_SIZE):
+	"""Times a sweep with worker processes that write into the memory mapped store, against workers that send a result
+	dict per design back to the parent, which writes them. Returns {name: seconds} and the bytes each way sends back.
+	"""
+	job = _sweepJob(spec)
+	size = math.prod(job["shape"])
+	chunks = [(start, min(size, start + chunk_size)) for start in range(0, size, chunk_size)]
+	times = {}
+
+	start_time = time.perf_counter()
+	writeSweep(directory, spec, chunk_size, workers)
+	times["shared"] = time.perf_counter() - start_time
+
+	start_time = time.perf_counter()
+	columns = {field: np.lib.format.open_memmap(os.path.join(directory, field + ".npy"), mode='r+') for field in FIELDS}
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		futures = [executor.submit(_pickleChunk, job, start, stop) for start, stop in chunks]
+		for (start, stop), future in zip(chunks, futures):
+			rows = future.result()
+			for field in FIELDS:
+				columns[field][start:stop] = [row[field] for row in rows]
+	for column in columns.values():
+		column.flush()
+	times["pickle"] = time.perf_counter() - start_time
+
+	start, stop = chunks[0]
+	times["shared_bytes"] = len(pickle.dumps(_writeChunk(directory, job, start, stop))) * len(chunks)
+	times["pickle_bytes"] = len(pickle.dumps(_pickleChunk(job, start, stop))) * len(chunks)
+	return times
+
+
+def _solveChunk(columns, dtype=np.float64):
+	# results (of dtype) and error codes of a dict of setting arrays, circular coils per number of legs in one vectorized pass
+	size = len(columns["nr_of_legs"])
+	codes = validateColumns(columns)
+	output = dict(columns, error_code=codes)
+	for key in RESULT_COLUMNS:
+		output[key] = np.full(size, np.nan, dtype=dtype)
+
+	valid = codes == 0
+	circle = valid & (columns["coil_shape"] != ELLIPSE)
+	for nr_of_legs in np.unique(columns["nr_of_legs"][circle]):
+		rows = np.flatnonzero(circle & (columns["nr_of_legs"] == nr_of_legs))
+		results = solveColumns({key: column[rows] for key, column in columns.items()}, int(nr_of_legs), dtype)
+		for key in RESULT_COLUMNS:
+			output[key][rows] = results[key]
+
+	for row in np.flatnonzero(valid & (columns["coil_shape"] == ELLIPSE)):
+		try:
+			results = solve(BirdcageSettings(**{key: columns[key][row].item() for key in BirdcageSettings.DEFAULTS})).results()
+		except (ArithmeticError, ValueError, IndexError):
+			continue
+		for key in RESULT_COLUMNS:
+			output[key][row] = results[key]
+	return output
+
+
+def parseConditions(text):
+	"""Conditions of a filter like "capacitor > 5, nr_of_legs == 16" as [(field, operator, value)].
+
+	Raises ValueError with a message for the user.
+	"""
+	conditions = []
+	for part in text.split(","):
+		if not part.strip():
+			continue
+		match = _CONDITION.match(part)
+		if match is None:
+			raise ValueError(f"Can not read condition '{part.strip()}'")
+		field, op, value = match.groups()
+		if field not in FIELDS:
+			raise ValueError(f"Unknown column '{field}'")
+		try:
+			conditions.append((field, op, float(value)))
+		except ValueError:
+			raise ValueError(f"'{value}' is not a number")
+	return conditions
+
+
+class ResultStore:
+	# A store opened for reading. The view holds the row numbers that are shown, in their order.
+
+	def __init__(self, directory):
+		self.directory = directory
+		with open(os.path.join(directory, METADATA_FILE)) as file:
+			metadata = json.load(file)
+		self.parameters = metadata["parameters"]
+		self.sweep = {name: np.asarray(metadata["sweep"][name]) for name in self.parameters}
+		self.shape = tuple(len(self.sweep[name]) for name in self.parameters)
+		self.columns = {field: np.load(os.path.join(directory, field + ".npy"), mmap_mode='r') for field in FIELDS}
+		self.size = metadata["rows"]
+		self.precision = metadata.get("precision")  # {"dtype": ..., "error": {result: largest relative error}} of float32 results
+		self.view = np.arange(self.size)
+
+	def __len__(self):
+		return len(self.view)
+
+	def query(self, conditions=(), sort=None, descending=False):
+		"""Row numbers that match all conditions (see parseConditions), sorted on the column sort.
+
+		Only reads the columns of the conditions and the sort, in chunks. Rows with nan sort last.
+		Does not change the view, so it can run in a background thread; use setView for the result.
+		"""
+		mask = np.ones(self.size, dtype=bool)
+		for field, op, value in conditions:
+			column = self.columns[field]
+			for start in range(0, self.size, CHUNK_SIZE):
+				mask[start:start + CHUNK_SIZE] &= OPERATORS[op](column[start:start + CHUNK_SIZE], value)
+		rows = np.flatnonzero(mask)
+		if sort is not None:
+			keys = np.asarray(self.columns[sort][rows], dtype=float)
+			rows = rows[np.argsort(-keys if descending else keys, kind='stable')]
+		return rows
+
+	def grid(self, field):
+		# a column as an array with one axis per swept parameter, still memory mapped
+		return self.columns[field].reshape(self.shape)
+
+	def rowNumber(self, index):
+		# row of a grid index (one index per swept parameter)
+		return int(np.ravel_multi_index(index, self.shape))
+
+	def setView(self, rows):
+		self.view = rows
+
+	def rows(self, start, count, fields):
+		# {field: array} of count rows of the view from position start, only these rows are read
+		index = self.view[start:start + count]
+		return {field: self.columns[field][index] for field in fields}
+
+	def settings(self, position):
+		# BirdcageSettings of the row at a position of the view
+		return self.rowSettings(self.view[position])
+
+	def rowSettings(self, row):
+		return BirdcageSettings(**{key: self.columns[key][row].item() for key in BirdcageSettings.DEFAULTS})
@@ -0,0 +1,125 @@
+"""
+Description:    Library to calculate how sensitive the capacitor value of a coil design is to every input.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import numpy as np
+from lib.birdcage_math import solve, ELLIPSE, RECT, BANDPASS
+from lib.birdcage_batch import settingsToColumns, calcGeometry, calcSelfInductances, calcEffLeg, calcEffER, calcCapacitance
+
+# settings and their names in the GUI
+INPUTS = {"res_freq": "Resonance Frequency",
+			"coil_diameter": "Coil Diameter",
+			"coil_long_diameter": "Long Diameter",
+			"coil_short_diameter": "Short Diameter",
+			"shield_diameter": "Shield Diameter",
+			"leg_length": "Leg Length",
+			"leg_width": "Leg Width",
+			"leg_od": "Leg OD",
+			"leg_id": "Leg ID",
+			"er_width": "ER Width",
+			"er_od": "ER OD",
+			"er_id": "ER ID",
+			"bp_cap": "Bandpass Capacitor"}
+UNITS = {"res_freq": "MHz", "bp_cap": "pF"}  # all others are in cm
+CAPACITANCE_INPUTS = ("res_freq", "bp_cap")  # only used in the last stage of the calculation
+
+RELATIVE_STEP = 1e-5
+
+
+class SensitivityResult:
+	# derivatives holds d(capacitor)/d(input) in pF per unit of the input, for every input used by the design
+
+	def __init__(self, capacitor, values, derivatives):
+		self.capacitor = capacitor
+		self.values = values
+		self.derivatives = derivatives
+
+	def relative(self):
+		# relative change of the capacitor per relative change of the input (% per %)
+		return {key: derivative * self.values[key] / self.capacitor for key, derivative in self.derivatives.items()}
+
+	def summary(self):
+		relative = self.relative()
+		lines = [f"Capacitor: {self.capacitor:.4f} pF"]
+		for key, derivative in self.derivatives.items():
+			lines.append(f"{INPUTS[key]}: {derivative:.6g} pF/{UNITS.get(key, 'cm')} ({relative[key]:.4g} %/%)")
+		return "\n".join(lines)
+
+
+def usedInputs(settings):
+	# the inputs that influence the capacitor of this design. Zero values (no shield, solid tube) are left out.
+	if settings.coil_shape == ELLIPSE:
+		keys = ["res_freq", "coil_long_diameter", "coil_short_diameter", "shield_diameter", "leg_length"]
+	else:
+		keys = ["res_freq", "coil_diameter", "shield_diameter", "leg_length"]
+	keys += ["leg_width"] if settings.leg_config == RECT else ["leg_od", "leg_id"]
+	keys += ["er_width"] if settings.er_config == RECT else ["er_od", "er_id"]
+	if settings.coil_mode == BANDPASS:
+		keys.append("bp_cap")
+	return [key for key in keys if getattr(settings, key) != 0]
+
+
+def sensitivity(settings, relative_step=RELATIVE_STEP):
+	"""Derivatives of the capacitor value to every used input (see usedInputs), with central differences.
+
+	Circular coils calculate all steps in one vectorized batch. The inductances of the unchanged design are shared by
+	the steps of the frequency and band-pass capacitor, which only enter the capacitance stage.
+	Elliptical coils use the scalar solver for every step.
+	"""
+	keys = usedInputs(settings)
+	values = {key: getattr(settings, key) for key in keys}
+	steps = {key: relative_step * abs(value) for key, value in values.items()}
+
+	if settings.coil_shape == ELLIPSE:
+		capacitor = solve(settings).capacitor
+		derivatives = {key: (solve(settings.copy(**{key: values[key] + steps[key]})).capacitor
+							- solve(settings.copy(**{key: values[key] - steps[key]})).capacitor) / (2 * steps[key]) for key in keys}
+	else:
+		capacitor, derivatives = _circularDerivatives(settings, keys, values, steps)
+	return SensitivityResult(capacitor, values, derivatives)
+
+
+def _circularDerivatives(settings, keys, values, steps):
+	geometric = [key for key in keys if key not in CAPACITANCE_INPUTS]
+	last_stage = [key for key in keys if key in CAPACITANCE_INPUTS]
+	n = settings.nr_of_legs
+
+	# row 0 is the design, then a +step and -step row per geometric input
+	columns = settingsToColumns([settings] * (1 + 2 * len(geometric)))
+	for i, key in enumerate(geometric):
+		columns[key] = columns[key].astype(float)
+		columns[key][1 + 2 * i] += steps[key]
+		columns[key][2 + 2 * i] -= steps[key]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		geometry = calcGeometry(columns, n)
+		leg_self_ind, er_self_ind = calcSelfInductances(columns, geometry["er_segment_length"])
+		legeff = calcEffLeg(columns, geometry, leg_self_ind)
+		ereff = calcEffER(geometry, er_self_ind)
+		cap = calcCapacitance(columns, geometry, legeff, ereff)
+
+		if last_stage:
+			rows = np.zeros(2 * len(last_stage), dtype=int)
+			stage_columns = {key: column[rows] for key, column in columns.items()}
+			for i, key in enumerate(last_stage):
+				stage_columns[key] = stage_columns[key].astype(float)
+				stage_columns[key][2 * i] += steps[key]
+				stage_columns[key][1 + 2 * i] -= steps[key]
+			stage_geometry = {"nr_of_legs": n, "legcurrs": geometry["legcurrs"][rows], "ercurrs": geometry["ercurrs"][rows]}
+			stage_cap = calcCapacitance(stage_columns, stage_geometry, legeff[rows], ereff[rows])
+
+	derivatives = {}
+	for key in keys:
+		if key in geometric:
+			i = geometric.index(key)
+			plus, minus = cap[1 + 2 * i], cap[2 + 2 * i]
+		else:
+			i = last_stage.index(key)
+			plus, minus = stage_cap[2 * i], stage_cap[1 + 2 * i]
+		derivatives[key] = float((plus - minus) / (2 * steps[key]))
+	return float(cap[0]), derivatives
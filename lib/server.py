@@ -0,0 +1,293 @@
+"""
+Description:    Library with a small local HTTP/JSON server to calculate birdcage capacitors from other programs.
+Author: 	    Dimitri Welting
+Website:    	http://github.com/dwelting/
+License: 	    Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+Endpoints:
+	GET  /health    returns {"status": "ok"}
+	POST /solve     body: settings (see BirdcageSettings.DEFAULTS), missing settings use the defaults
+	POST /solve?approx=1
+					the same, answered from the surrogate tables (see lib.surrogate) when they are within their error
+					bound, with "approximate": true, and calculated exactly otherwise
+	POST /sweep     body: {"settings": {...}, "sweep": {"leg_length": [10, 15, 20], ...}}
+					calculates every combination of the swept values
+
+Settings that can not be calculated (see lib.validation) are not solved, their result is
+{"error": ..., "error_code": ...} with the bits of all problems in the error code.
+"""
+
+import asyncio
+import itertools
+import json
+import math
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from lib.logging import logger
+from lib.birdcage_math import RESULT_COLUMNS, settingsFromJson, SettingsError
+from lib.cache import ResultCache, settingsKey
+from lib.validation import validate, validateSettings, errorMessages
+from lib.engines import solveMany, currentTuning
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_SWEEP_SIZE = 100000
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+class RequestError(Exception):
+	def __init__(self, message, status=400):
+		super().__init__(message)
+		self.status = status
+
+
+def _solveMany(settings_list):
+	# runs in a worker thread, with the fastest engine for the shapes, leg counts and size of the batch
+	try:
+		results = solveMany(settings_list)
+	except Exception:
+		logger.exception("Batch calculation failed, calculating the designs one by one")
+		results = [_solveOne(settings) for settings in settings_list]
+
+	for i, result in enumerate(results):
+		if result is None:
+			continue
+		values = [result[key] for key in RESULT_COLUMNS] + list(result["capacitors"])
+		if not all(math.isfinite(v) for v in values):
+			results[i] = None
+	return results
+
+
+def _solveOne(settings):
+	# one design of a failed batch, so a failing design does not take the others with it
+	try:
+		return solveMany([settings])[0]
+	except Exception:
+		logger.exception("Calculation failed")
+		return None
+
+
+def _response(result, code=0):
+	if code:
+		return {"error": "Invalid settings: " + ", ".join(title.lower() for title, _ in errorMessages(code)), "error_code": code}
+	if result is None:
+		return {"error": "No valid result for these settings"}
+	return result
+
+
+class SolveBatcher:
+	# Collects concurrent requests for a short time and calculates them together in one vectorized batch
+
+	def __init__(self, cache, executor, max_batch=1024, max_delay=0.002):
+		self.cache = cache
+		self.executor = executor
+		self.max_batch = max_batch
+		self.max_delay = max_delay
+
+		self._queue = []
+		self._pending = {}
+		self._timer = None
+
+	async def solve(self, settings):
+		key = settingsKey(settings)
+		result = self.cache.get(key)
+		if result is not None:
+			return result
+
+		future = self._pending.get(key)  # same request already waiting for the next batch
+		if future is None:
+			loop = asyncio.get_running_loop()
+			future = loop.create_future()
+			self._pending[key] = future
+			self._queue.append((key, settings))
+			if len(self._queue) >= self.max_batch:
+				self._flush()
+			elif self._timer is None:
+				self._timer = loop.call_later(self.max_delay, self._flush)
+		return await future
+
+	async def solveMany(self, settings_list):
+		# for sweeps: skip batching delay, calculate all cache misses at once
+		keys = [settingsKey(s) for s in settings_list]
+		results = [self.cache.get(key) for key in keys]
+		missing = [i for i, result in enumerate(results) if result is None]
+		if missing:
+			loop = asyncio.get_running_loop()
+			solved = await loop.run_in_executor(self.executor, _solveMany, [settings_list[i] for i in missing])
+			for i, result in zip(missing, solved):
+				results[i] = result
+				if result is not None:
+					self.cache.put(keys[i], result)
+		return results
+
+	def _flush(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		batch, self._queue = self._queue, []
+		if batch:
+			asyncio.ensure_future(self._run(batch))
+
+	async def _run(self, batch):
+		loop = asyncio.get_running_loop()
+		try:
+			results = await loop.run_in_executor(self.executor, _solveMany, [settings for _, settings in batch])
+		except Exception as e:
+			for key, _ in batch:
+				self._pending.pop(key).set_exception(e)
+			return
+
+		for (key, _), result in zip(batch, results):
+			if result is not None:
+				self.cache.put(key, result)
+			self._pending.pop(key).set_result(result)
+
+
+class SolveServer:
+	def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=100000, workers=2):
+		self.host = host
+		self.port = port
+		self.cache = ResultCache(cache_size)
+		self.executor = ThreadPoolExecutor(max_workers=workers)
+		self.batcher = SolveBatcher(self.cache, self.executor)
+		self.surrogate = None  # loaded with the first approximate request
+
+	def run(self):
+		try:
+			asyncio.run(self.serve())
+		except KeyboardInterrupt:
+			pass
+		finally:
+			self.executor.shutdown()
+
+	async def serve(self):
+		# load (or the first time measure) the engine tuning before the first request
+		await asyncio.get_running_loop().run_in_executor(self.executor, currentTuning)
+		server = await asyncio.start_server(self._handleConnection, self.host, self.port)
+		logger.info(f"Solve server listening on http://{self.host}:{self.port}")
+		async with server:
+			await server.serve_forever()
+
+	async def _handleConnection(self, reader, writer):
+		try:
+			while True:
+				try:
+					header = await reader.readuntil(b"\r\n\r\n")
+				except (asyncio.IncompleteReadError, ConnectionError):
+					break
+				except asyncio.LimitOverrunError:
+					await self._write(writer, 431, {"error": "Request header too large"}, False)
+					break
+
+				lines = header.decode("latin-1").split("\r\n")
+				try:
+					method, path, version = lines[0].split(" ", 2)
+				except ValueError:
+					await self._write(writer, 400, {"error": "Malformed request"}, False)
+					break
+
+				headers = {}
+				for line in lines[1:]:
+					if ":" in line:
+						name, value = line.split(":", 1)
+						headers[name.strip().lower()] = value.strip()
+
+				try:
+					length = int(headers.get("content-length", 0) or 0)
+				except ValueError:
+					length = -1
+				if length < 0:
+					await self._write(writer, 400, {"error": "Malformed request"}, False)
+					break
+				if length > MAX_BODY_SIZE:
+					await self._write(writer, 413, {"error": "Request too large"}, False)
+					break
+				body = await reader.readexactly(length) if length else b""
+
+				keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+				status, response = await self._dispatch(method, path, body)
+				await self._write(writer, status, response, keep_alive)
+				if not keep_alive:
+					break
+		except (asyncio.IncompleteReadError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+	async def _dispatch(self, method, path, body):
+		path, _, query = path.partition("?")
+		try:
+			if path == "/health":
+				return 200, {"status": "ok", "cache_size": len(self.cache), "cache_hits": self.cache.hits}
+			if path not in ("/solve", "/sweep"):
+				raise RequestError("Not found", 404)
+			if method != "POST":
+				raise RequestError("Method not allowed", 405)
+
+			try:
+				request = json.loads(body or b"{}")
+			except ValueError:
+				raise RequestError("Body is not valid JSON")
+
+			if path == "/solve":
+				settings = settingsFromJson(request)
+				code = validate(settings)
+				if code:
+					return 200, _response(None, code)
+				if parse_qs(query).get("approx", ["0"])[-1] != "0":
+					result = self._approximate(settings)
+					if result is not None:
+						return 200, result
+				return 200, _response(await self.batcher.solve(settings))
+			return 200, await self._sweep(request)
+		except RequestError as e:
+			return e.status, {"error": str(e)}
+		except SettingsError as e:
+			return 400, {"error": str(e)}
+		except Exception:
+			logger.exception(f"Request {method} {path} failed")
+			return 500, {"error": "Internal server error"}
+
+	def _approximate(self, settings):
+		# surrogate result of a valid design, None when it has to be calculated exactly
+		if self.surrogate is None:
+			from lib.surrogate import Surrogate
+			self.surrogate = Surrogate()
+		result = self.surrogate.lookup(settings)
+		return None if result is None else dict(result, approximate=True)
+
+	async def _sweep(self, request):
+		if not isinstance(request, dict):
+			raise RequestError("Body should be a JSON object")
+		base = settingsFromJson(request.get("settings", {}))
+		sweep = request.get("sweep", {})
+		if not isinstance(sweep, dict) or not all(isinstance(v, list) for v in sweep.values()):
+			raise RequestError("'sweep' should map setting names to lists of values")
+
+		size = 1
+		for values in sweep.values():
+			size *= len(values)
+		if size > MAX_SWEEP_SIZE:
+			raise RequestError(f"Sweep too large ({size} > {MAX_SWEEP_SIZE} combinations)")
+
+		names = list(sweep.keys())
+		combinations = list(itertools.product(*sweep.values()))
+		settings_list = [settingsFromJson(dict(zip(names, values)), base) for values in combinations]
+
+		# invalid combinations are left out before solving
+		codes = validateSettings(settings_list)
+		solved = iter(await self.batcher.solveMany([s for s, code in zip(settings_list, codes) if not code]))
+		results = [None if code else next(solved) for code in codes]
+		return {"parameters": names,
+				"results": [dict(zip(names, values), **_response(result, code)) for values, result, code in zip(combinations, results, codes)]}
+
+	@staticmethod
+	async def _write(writer, status, response, keep_alive):
+		reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+				431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+		body = json.dumps(response).encode()
+		writer.write(f"HTTP/1.1 {status} {reasons.get(status, '')}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+						f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body)
+		await writer.drain()
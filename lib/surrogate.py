@@ -0,0 +1,182 @@
+"""
+Description:    Library with precomputed tables to answer capacitor calculations instantly, with a small approximation.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+For a circular coil only the mutual inductance of the legs needs a table. All inductances scale with the coil size,
+and the legs and end ring only differ from each other through their self inductance, which is a closed formula.
+The mutual inductance between the end ring segments only depends on the number of legs. So per number of legs the
+mutual leg inductance per cm coil diameter is stored on a grid over log(leg length / coil diameter) and
+coil diameter / shield diameter (0 without a shield). Everything else, including the capacitor of every coil mode,
+is calculated exactly from the interpolated value.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from lib.logging import logger
+from lib.birdcage_math import solve, selfInductance, RESULT_COLUMNS, CIRCLE
+from lib.birdcage_batch import calcGeometry, calcEffLeg, calcEffER, calcCapacitance
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "pyBirdcagebuilder", "surrogate")
+DEFAULT_LEGS = tuple(range(8, 33, 4))
+MAX_ERROR = 1e-3  # relative error of the capacitor above which the exact calculation is used
+
+# the grid, changing it needs new tables
+X_MIN = math.log(0.05)  # log(leg length / coil diameter)
+X_MAX = math.log(20)
+Y_MAX = 0.95  # coil diameter / shield diameter
+NX = 384
+NY = 192
+CHUNK_SIZE = 4096
+
+
+def tablePath(directory, nr_of_legs):
+	return os.path.join(directory, f"legs_{nr_of_legs}_{NX}x{NY}.npy")
+
+
+def _legMutual(x, y, nr_of_legs):
+	# mutual leg inductance (nH) per cm coil diameter for arrays of grid coordinates
+	columns = {"coil_diameter": np.ones(len(x)),
+				"leg_length": np.exp(x),
+				"shield_diameter": np.where(y > 0, 1 / np.where(y > 0, y, 1), 0)}
+	with np.errstate(divide='ignore', invalid='ignore'):  # the shield part is calculated for y = 0 too, and dropped
+		geometry = calcGeometry(columns, nr_of_legs)
+		legeff = calcEffLeg(columns, geometry, np.zeros(len(x)))
+	return legeff[:, nr_of_legs // 4 - 1] * 1e9
+
+
+def buildTable(nr_of_legs, directory=DEFAULT_DIRECTORY):
+	"""Calculates and saves the table of one number of legs.
+
+	The file holds a [2, NX, NY] array: the grid values, and the largest interpolation error (nH/cm) of the cells
+	(measured in the cell centres) in [1, :NX-1, :NY-1].
+	"""
+	xs = np.linspace(X_MIN, X_MAX, NX)
+	ys = np.linspace(0, Y_MAX, NY)
+	table = np.zeros((2, NX, NY))
+
+	x, y = (a.ravel() for a in np.meshgrid(xs, ys, indexing='ij'))
+	values = np.concatenate([_legMutual(x[i:i + CHUNK_SIZE], y[i:i + CHUNK_SIZE], nr_of_legs) for i in range(0, len(x), CHUNK_SIZE)])
+	table[0] = values.reshape(NX, NY)
+
+	centre_x, centre_y = (a.ravel() for a in np.meshgrid((xs[1:] + xs[:-1]) / 2, (ys[1:] + ys[:-1]) / 2, indexing='ij'))
+	exact = np.concatenate([_legMutual(centre_x[i:i + CHUNK_SIZE], centre_y[i:i + CHUNK_SIZE], nr_of_legs) for i in range(0, len(centre_x), CHUNK_SIZE)])
+	interpolated = (table[0, :-1, :-1] + table[0, 1:, :-1] + table[0, :-1, 1:] + table[0, 1:, 1:]) / 4
+	table[1, :-1, :-1] = np.abs(interpolated - exact.reshape(NX - 1, NY - 1))
+
+	os.makedirs(directory, exist_ok=True)
+	path = tablePath(directory, nr_of_legs)
+	temporary = path + ".tmp.npy"
+	np.save(temporary, table)
+	os.replace(temporary, path)  # other processes never see a half written table
+	return path
+
+
+def buildTables(legs=DEFAULT_LEGS, directory=DEFAULT_DIRECTORY, workers=None):
+	# (re)builds the tables of all numbers of legs in parallel processes
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for path in executor.map(buildTable, legs, [directory] * len(legs)):
+			logger.info(f"Surrogate table written to {path}")
+
+
+class Surrogate:
+	# Approximate calculations from the tables in directory. Tables are memory mapped, so loading is instant and
+	# processes share the memory.
+
+	def __init__(self, directory=DEFAULT_DIRECTORY, max_error=MAX_ERROR):
+		self.directory = directory
+		self.max_error = max_error
+		self._tables = {}
+		self.hits = 0
+		self.misses = 0
+
+	def _table(self, nr_of_legs):
+		if nr_of_legs not in self._tables:
+			path = tablePath(self.directory, nr_of_legs)
+			if os.path.exists(path):
+				values = np.load(path, mmap_mode='r')
+				self._tables[nr_of_legs] = (values, *self._constants(nr_of_legs))
+			else:
+				self._tables[nr_of_legs] = None
+		return self._tables[nr_of_legs]
+
+	@staticmethod
+	def _constants(nr_of_legs):
+		# geometry (for the currents) and mutual end ring inductance (nH per cm coil diameter) used by the capacitor formulas
+		geometry = calcGeometry({"coil_diameter": np.ones(1)}, nr_of_legs)
+		er_mutual = calcEffER(geometry, np.zeros(1))[0, nr_of_legs // 4 - 1] * 1e9
+		return geometry, float(er_mutual)
+
+	def results(self, settings):
+		# the same dict as BirdcageSolver.results(), approximated when possible
+		result = self.lookup(settings)
+		if result is None:
+			self.misses += 1
+			return solve(settings).results()
+		self.hits += 1
+		return result
+
+	def lookup(self, settings):
+		"""Approximate results of a design, or None when the tables can not answer within max_error.
+
+		That is for elliptical coils, missing tables and designs outside the grid.
+		"""
+		if settings.coil_shape != CIRCLE:
+			return None
+		table = self._table(int(settings.nr_of_legs))
+		if table is None:
+			return None
+		values, geometry, er_mutual = table
+
+		diameter = settings.coil_diameter
+		try:
+			x = math.log(settings.leg_length / diameter)
+			y = diameter / settings.shield_diameter if settings.shield_diameter != 0 else 0
+		except (ArithmeticError, ValueError):
+			return None
+		if not (X_MIN <= x <= X_MAX and 0 <= y <= Y_MAX):
+			return None
+
+		# bilinear interpolation
+		fx = (x - X_MIN) / (X_MAX - X_MIN) * (NX - 1)
+		fy = y / Y_MAX * (NY - 1)
+		i = min(int(fx), NX - 2)
+		j = min(int(fy), NY - 2)
+		fx -= i
+		fy -= j
+		cell = values[0, i:i + 2, j:j + 2]
+		leg_mutual = ((cell[0, 0] * (1 - fy) + cell[0, 1] * fy) * (1 - fx) + (cell[1, 0] * (1 - fy) + cell[1, 1] * fy) * fx) * diameter
+		error = values[1, i, j] * diameter
+
+		try:
+			er_segment_length = 2 * math.pi * (diameter / 2 / settings.nr_of_legs)
+			er_self_ind = selfInductance(er_segment_length, settings.er_config, settings.er_width, settings.er_od, settings.er_id)
+			leg_self_ind = selfInductance(settings.leg_length, settings.leg_config, settings.leg_width, settings.leg_od, settings.leg_id)
+			er_eff_ind = er_self_ind + er_mutual * diameter
+			leg_eff_ind = leg_self_ind + leg_mutual
+		except (ArithmeticError, ValueError):
+			return None
+		# the capacitor depends monotonically on the leg inductance, so the error bound follows from the two ends
+		capacitor, low, high = _capacitors(settings, geometry, (leg_eff_ind, leg_eff_ind - error, leg_eff_ind + error), er_eff_ind)
+		bound = max(abs(low - capacitor), abs(high - capacitor))
+		if not math.isfinite(capacitor) or not bound <= self.max_error * abs(capacitor):
+			return None
+
+		return dict(zip(RESULT_COLUMNS, (capacitor, er_segment_length, er_self_ind, leg_self_ind, er_eff_ind, leg_eff_ind)),
+					capacitors=[capacitor] * (settings.nr_of_legs // 4))
+
+
+def _capacitors(settings, geometry, leg_eff_inds, er_eff_ind):
+	# capacitors (pF) of a circular coil for a list of effective leg inductances (nH), see birdcage_batch.calcCapacitance
+	k = int(settings.nr_of_legs) // 4 - 1
+	count = len(leg_eff_inds)
+	columns = {key: np.full(count, getattr(settings, key)) for key in ("coil_mode", "bp_config", "bp_cap", "res_freq")}
+	legeff = np.repeat(np.array(leg_eff_inds, dtype=float)[:, None], 2, axis=1) * 1e-9  # the same for legs k and k + 1
+	ereff = np.full((count, 2), er_eff_ind * 1e-9)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return calcCapacitance(columns, geometry, legeff, ereff, legs=(k, k + 1)).tolist()
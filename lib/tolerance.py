@@ -0,0 +1,226 @@
+"""
+Description:    Library for Monte Carlo tolerance analysis of a calculated birdcage coil.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+The coil is modelled as a ladder network of nr_of_legs meshes. Mesh k runs up leg k, over end ring segment k to leg k+1,
+down leg k+1 and back over the bottom end ring segment k. The legs and end ring segments get the effective inductances
+of the solver (the mutual inductances are already folded in), the capacitors sit where the coil mode puts them.
+Every sample draws its own capacitor values and inductances, and the resonance frequencies follow from the
+eigenvalues of the mesh equations  S J = w^2 L J.
+"""
+
+import math
+import numpy as np
+from lib.birdcage_math import solve, CIRCLE, HIGHPASS, LOWPASS, BANDPASS, LEG
+from lib.birdcage_batch import settingsToColumns, solveColumns
+
+GEOMETRY_SETTINGS = ("coil_diameter", "shield_diameter", "leg_length", "leg_width", "leg_od", "leg_id", "er_width", "er_od", "er_id")
+PERCENTILES = (1, 5, 50, 95, 99)
+CHUNK_SIZE = 20000  # samples calculated at once
+
+
+class ToleranceResult:
+	# Frequencies (MHz) of every sample. f_low/f_high are the two (nominally equal) frequencies of the homogeneous mode,
+	# frequency is their mean, splitting their difference and mode_distance the distance to the nearest other mode.
+
+	def __init__(self, f_low, f_high, mode_distance):
+		self.f_low = f_low
+		self.f_high = f_high
+		self.frequency = (f_low + f_high) / 2
+		self.splitting = f_high - f_low
+		self.mode_distance = mode_distance
+
+	def __len__(self):
+		return len(self.frequency)
+
+	def percentiles(self, q=PERCENTILES):
+		# {name: {percentile: value}} for all distributions
+		return {name: dict(zip(q, np.percentile(getattr(self, name), q))) for name in ("frequency", "splitting", "mode_distance", "f_low", "f_high")}
+
+	def summary(self, q=PERCENTILES):
+		lines = [f"{len(self)} samples, percentiles " + ", ".join(f"{p}%" for p in q)]
+		for name, values in self.percentiles(q).items():
+			lines.append(f"{name}: " + ", ".join(f"{v:.4f}" for v in values.values()) + " MHz")
+		return "\n".join(lines)
+
+
+def toleranceAnalysis(settings, samples=100000, cap_tolerance=0.05, bp_cap_tolerance=None, inductance_tolerance=0.0, geometry=None, seed=None):
+	"""Spread of the resonance frequency of a coil design built with imperfect parts.
+
+	cap_tolerance is the relative tolerance of the calculated capacitors (0.05 for +-5%), bp_cap_tolerance that of the
+	fixed band-pass capacitors (default the same). Capacitor values are drawn uniformly within their tolerance.
+	inductance_tolerance is the relative standard deviation of every single leg and end ring segment inductance.
+	geometry maps GEOMETRY_SETTINGS to relative standard deviations, e.g. {"leg_length": 0.01}. These change the whole
+	coil per sample and are recalculated with the vectorized solver, while the capacitors stay at their nominal values.
+
+	Returns a ToleranceResult. Only circular coils are supported.
+	"""
+	if settings.coil_shape != CIRCLE:
+		raise ValueError("Tolerance analysis is only available for circular coils")
+	geometry = geometry or {}
+	for key in geometry:
+		if key not in GEOMETRY_SETTINGS:
+			raise ValueError(f"Setting '{key}' can not be varied, use one of {', '.join(GEOMETRY_SETTINGS)}")
+	if bp_cap_tolerance is None:
+		bp_cap_tolerance = cap_tolerance
+
+	rng = np.random.default_rng(seed)
+	n = settings.nr_of_legs
+	k = n // 4 - 1
+	nominal = solve(settings)
+	ring_cap, leg_cap = _capacitors(settings, nominal.capacitor)
+	tolerances = _capTolerances(settings, cap_tolerance, bp_cap_tolerance)
+
+	# the nominal ladder sets the frequency scale (its homogeneous mode is the design frequency) and the mode order
+	nominal_l = _inductanceMatrix(*_uniform(nominal.legeff[k], nominal.ereff[k], n, 1))
+	nominal_s = _elastanceMatrix(*_uniform(leg_cap, ring_cap, n, 1))
+	pair = _homogeneousModes(nominal_l, nominal_s)
+	omega = _modeFrequencies(nominal_l, nominal_s)[0]
+	scale = settings.res_freq / omega[pair].mean()
+
+	varied_inductance = bool(geometry) or bool(inductance_tolerance)
+	f_low, f_high, distance = [], [], []
+	for first in range(0, samples, CHUNK_SIZE):
+		size = min(CHUNK_SIZE, samples - first)
+
+		if varied_inductance:
+			if geometry:
+				legeff, ereff = _sampleGeometry(settings, geometry, size, rng)
+			else:
+				legeff, ereff = np.full(size, nominal.legeff[k]), np.full(size, nominal.ereff[k])
+			leg_l, top_l, bottom_l = _uniform(legeff[:, None], ereff[:, None], n, size)
+			if inductance_tolerance:
+				leg_l = leg_l * rng.normal(1, inductance_tolerance, (size, n))
+				top_l = top_l * rng.normal(1, inductance_tolerance, (size, n))
+				bottom_l = bottom_l * rng.normal(1, inductance_tolerance, (size, n))
+			inductance = _inductanceMatrix(leg_l, top_l, bottom_l)
+		else:
+			inductance = nominal_l
+
+		leg_c, top_c, bottom_c = _uniform(leg_cap, ring_cap, n, size)
+		if leg_c is not None:
+			leg_c = leg_c * rng.uniform(1 - tolerances[0], 1 + tolerances[0], (size, n))
+		if top_c is not None:
+			top_c = top_c * rng.uniform(1 - tolerances[1], 1 + tolerances[1], (size, n))
+			bottom_c = bottom_c * rng.uniform(1 - tolerances[1], 1 + tolerances[1], (size, n))
+
+		omega = _modeFrequencies(inductance, _elastanceMatrix(leg_c, top_c, bottom_c)) * scale
+		low, high = omega[:, pair[0]], omega[:, pair[1]]
+		neighbours = omega[:, [i for i in (pair[0] - 1, pair[1] + 1) if 0 <= i < n]]
+		f_low.append(low)
+		f_high.append(high)
+		distance.append(np.abs(neighbours - (low + high)[:, None] / 2).min(axis=1))
+
+	return ToleranceResult(np.concatenate(f_low), np.concatenate(f_high), np.concatenate(distance))
+
+
+def _capacitors(settings, capacitor):
+	# (end ring, leg) capacitors in pF of the coil mode, None where there is no capacitor
+	if settings.coil_mode == HIGHPASS:
+		return capacitor, None
+	if settings.coil_mode == LOWPASS:
+		return None, capacitor
+	if settings.bp_config == LEG:
+		return capacitor, settings.bp_cap
+	return settings.bp_cap, capacitor
+
+
+def _capTolerances(settings, cap_tolerance, bp_cap_tolerance):
+	# (leg, end ring) tolerances
+	if settings.coil_mode != BANDPASS:
+		return cap_tolerance, cap_tolerance
+	if settings.bp_config == LEG:
+		return bp_cap_tolerance, cap_tolerance
+	return cap_tolerance, bp_cap_tolerance
+
+
+def _uniform(leg, ring, n, size):
+	# the same value for every leg and both end ring segments of every mesh, as [size, n] arrays
+	def spread(value):
+		if value is None:
+			return None
+		return np.broadcast_to(np.asarray(value, dtype=float), (size, n)).astype(float)
+	return spread(leg), spread(ring), spread(ring)
+
+
+def _sampleGeometry(settings, geometry, size, rng):
+	columns = settingsToColumns([settings] * size)
+	for key, deviation in geometry.items():
+		columns[key] = columns[key] * rng.normal(1, deviation, size)
+	results = solveColumns(columns, settings.nr_of_legs)
+	return results["leg_eff_ind"] * 1e-9, results["er_eff_ind"] * 1e-9
+
+
+def _inductanceMatrix(leg, top, bottom):
+	# [size, n, n] mesh inductance matrix (H) from the leg and end ring segment inductances
+	next_leg = np.roll(leg, -1, axis=1)
+	diagonal = top + bottom + leg + next_leg
+	return _cyclic(diagonal, -next_leg)
+
+
+def _elastanceMatrix(leg, top, bottom):
+	# [size, n, n] mesh elastance matrix (1/F) from the capacitors in pF. None means no capacitor (short).
+	size, n = (leg if leg is not None else top).shape
+	leg_s = np.zeros((size, n)) if leg is None else 1 / (leg * 1e-12)
+	ring_s = np.zeros((size, n)) if top is None else 1 / (top * 1e-12) + 1 / (bottom * 1e-12)
+	next_leg = np.roll(leg_s, -1, axis=1)
+	return _cyclic(ring_s + leg_s + next_leg, -next_leg)
+
+
+def _cyclic(diagonal, upper):
+	# symmetric matrix with diagonal[k] at (k, k) and upper[k] at (k, k+1) and (k+1, k), wrapping around
+	size, n = diagonal.shape
+	index = np.arange(n)
+	matrix = np.zeros((size, n * n))
+	matrix[:, index * (n + 1)] = diagonal
+	matrix[:, index * n + (index + 1) % n] += upper
+	matrix[:, (index + 1) % n * n + index] += upper
+	return matrix.reshape(size, n, n)
+
+
+def _symmetricPencil(inductance, elastance):
+	"""Turns S J = w^2 L J into an ordinary symmetric eigenproblem A y = x.
+
+	Returns A and whether its eigenvalues x are w^2 (True) or 1/w^2 (False). Without leg capacitors S is diagonal,
+	so A = S^-1/2 L S^-1/2 is a cheap scaling. Otherwise the Cholesky factor L = R R^T gives A = R^-1 S R^-T.
+	An inductance matrix of a single coil is shared by all samples.
+	"""
+	index = np.arange(elastance.shape[1])
+	diagonal = elastance[:, index, index]
+	if np.count_nonzero(elastance) == np.count_nonzero(diagonal):
+		scaling = 1 / np.sqrt(diagonal)
+		return scaling[:, :, None] * inductance * scaling[:, None, :], False
+
+	inverse = np.linalg.inv(np.linalg.cholesky(inductance))
+	return inverse @ elastance @ np.swapaxes(inverse, 1, 2), True
+
+
+def _modeFrequencies(inductance, elastance):
+	# [size, n] resonance frequencies of all modes in units of the ladder, sorted from low to high
+	symmetric, squared = _symmetricPencil(inductance, elastance)
+	values = np.clip(np.linalg.eigvalsh(symmetric), 0, None)
+	with np.errstate(divide='ignore'):
+		omega = np.sqrt(values if squared else 1 / values) / (2 * math.pi)
+	return np.sort(omega, axis=1)
+
+
+def _homogeneousModes(inductance, elastance):
+	"""Indices (in the sorted frequencies) of the two homogeneous (m=1) modes of a single coil.
+
+	These are the two modes whose mesh currents overlap most with the ideal cos/sin currents. The samples use the same
+	indices, which holds as long as the spread in frequency stays below the spacing of the modes.
+	"""
+	n = inductance.shape[1]
+	values, vectors = np.linalg.eig(np.linalg.solve(inductance[0], elastance[0]))
+	order = np.argsort(np.sqrt(np.clip(values.real, 0, None)))
+	currents = vectors.real[:, order]
+	currents /= np.linalg.norm(currents, axis=0)
+
+	phase = 2 * math.pi * (np.arange(n) + 0.5) / n
+	ideal = np.stack((np.cos(phase), np.sin(phase)), axis=1) / math.sqrt(n / 2)
+	overlap = ((ideal.T @ currents) ** 2).sum(axis=0)
+	return np.sort(np.argsort(overlap)[-2:])
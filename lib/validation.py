@@ -0,0 +1,128 @@
+"""
+Description:    Library to check coil settings before they are calculated, for single designs and whole batches.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+Every problem has its own bit in the error code of a design, 0 means valid. The checks only use comparisons and
+boolean operators, so the same code runs on plain numbers (validate, without NumPy) and on arrays (validateColumns).
+Nothing raises: invalid rows get a code and can be filtered out before they are calculated.
+"""
+
+import math
+from lib.birdcage_math import BirdcageSettings, ELLIPSE, CIRCLE, RECT, TUBE, HIGHPASS, LOWPASS, BANDPASS, LEG, ER, SHORT, LONG
+
+INVALID_VALUE = 1  # a used input is zero, negative, nan or infinite
+UNKNOWN_OPTION = 2  # a configuration setting has no known value
+INVALID_LEG_COUNT = 4  # not a multiple of 4, or less than 8
+SHIELD_INSIDE_COIL = 8  # the shield is not larger than the coil
+ID_NOT_BELOW_OD = 16  # a tube is thicker inside than outside
+LEGS_OVERLAP = 32  # the legs are wider than the space between them
+INVALID_ELLIPSE = 64  # the short diameter is larger than the long diameter
+ELLIPSE_NOT_HIGHPASS = 128  # elliptical coils can only be calculated as high-pass
+
+# title and text of every error, for message boxes and service responses
+MESSAGES = {INVALID_VALUE: ("Input zero", "One or more inputs are zero, negative or not a number.\nPlease input valid values."),
+			UNKNOWN_OPTION: ("Unknown option", "One or more configuration settings are unknown."),
+			INVALID_LEG_COUNT: ("Invalid number of legs", "The number of legs should be a multiple of 4, and at least 8."),
+			SHIELD_INSIDE_COIL: ("Invalid shield", "Shield diameter is not larger than the coil diameter.\nPlease input valid values."),
+			ID_NOT_BELOW_OD: ("Invalid tube", "The inner diameter of a tube is not smaller than the outer diameter.\nPlease input valid values."),
+			LEGS_OVERLAP: ("Overlapping legs", "The legs are wider than the space between them.\nUse fewer or narrower legs or a larger coil."),
+			INVALID_ELLIPSE: ("Invalid ellipse", "Short diameter is larger than the long diameter.\nPlease input valid values."),
+			ELLIPSE_NOT_HIGHPASS: ("Invalid configuration", "Elliptical coils can only be calculated as high-pass.")}
+
+OPTIONS = {"leg_config": (RECT, TUBE),
+			"er_config": (RECT, TUBE),
+			"coil_mode": (HIGHPASS, LOWPASS, BANDPASS),
+			"bp_config": (LEG, ER),
+			"coil_shape": (ELLIPSE, CIRCLE),
+			"shortaxis": (SHORT, LONG)}
+
+
+def errorMessages(code):
+	# (title, text) of every error in a code
+	return [message for bit, message in MESSAGES.items() if code & bit]
+
+
+def validate(settings):
+	# error code of one BirdcageSettings, works without NumPy
+	return int(_errors(settings.asDict(), math.sin, int))
+
+
+def validateColumns(columns):
+	"""Error codes (an int array, 0 is valid) of every row of a batch, see settingsToColumns.
+
+	Missing columns use the defaults.
+	"""
+	import numpy as np
+	size = max(len(np.atleast_1d(column)) for column in columns.values())
+	values = {key: np.broadcast_to(np.asarray(columns.get(key, default), dtype=float), size) for key, default in BirdcageSettings.DEFAULTS.items()}
+	with np.errstate(invalid='ignore'):
+		return _errors(values, np.sin, lambda v: v.astype(int))
+
+
+def validateSettings(settings_list):
+	# error codes of a list of BirdcageSettings, vectorized when NumPy is available
+	try:
+		from lib.birdcage_batch import settingsToColumns
+	except ImportError:
+		return [validate(settings) for settings in settings_list]
+	return validateColumns(settingsToColumns(settings_list)).tolist()
+
+
+def _bad(value):
+	# zero, negative, nan or infinite
+	return (value <= 0) | (value != value) | (value == math.inf)
+
+
+def _errors(v, sin, to_int):
+	ellipse = v["coil_shape"] == ELLIPSE
+	circle = v["coil_shape"] != ELLIPSE
+	leg_rect = v["leg_config"] == RECT
+	leg_tube = v["leg_config"] != RECT
+	er_rect = v["er_config"] == RECT
+	er_tube = v["er_config"] != RECT
+	legs = v["nr_of_legs"]
+
+	invalid = _bad(v["res_freq"]) | _bad(v["leg_length"]) \
+		| (circle & _bad(v["coil_diameter"])) | (ellipse & (_bad(v["coil_long_diameter"]) | _bad(v["coil_short_diameter"]))) \
+		| (leg_rect & _bad(v["leg_width"])) | (leg_tube & _bad(v["leg_od"])) \
+		| (er_rect & _bad(v["er_width"])) | (er_tube & _bad(v["er_od"])) \
+		| ((v["coil_mode"] == BANDPASS) & _bad(v["bp_cap"])) \
+		| (v["shield_diameter"] < 0) | (v["shield_diameter"] != v["shield_diameter"]) | (v["shield_diameter"] == math.inf) \
+		| (leg_tube & ((v["leg_id"] < 0) | (v["leg_id"] != v["leg_id"]))) | (er_tube & ((v["er_id"] < 0) | (v["er_id"] != v["er_id"])))
+
+	unknown = False
+	for key, options in OPTIONS.items():
+		known = False
+		for option in options:
+			known = known | (v[key] == option)
+		unknown = unknown | (known == False)  # "not known", which also works on arrays
+
+	leg_count = (legs % 4 != 0) | (legs < 8) | (legs != legs)
+
+	# the largest diameter of the coil
+	outer = circle * v["coil_diameter"] + ellipse * v["coil_long_diameter"]
+	shield = (v["shield_diameter"] != 0) & (v["shield_diameter"] <= outer)
+
+	tube = (leg_tube & (v["leg_id"] >= v["leg_od"])) | (er_tube & (v["er_id"] >= v["er_od"]))
+
+	# distance between neighbouring legs: the chord for a circle, for an ellipse the same fraction of its circumference
+	# (Ramanujan's approximation)
+	a = v["coil_long_diameter"] / 2
+	b = v["coil_short_diameter"] / 2
+	circumference = circle * math.pi * v["coil_diameter"] + ellipse * math.pi * (3 * (a + b) - ((3 * a + b) * (a + 3 * b)) ** 0.5)
+	count = legs + (legs == 0)  # 0 legs is already a leg count error
+	angle = math.pi / count
+	spacing = circumference / count * sin(angle) / angle
+	width = leg_rect * v["leg_width"] + leg_tube * v["leg_od"]
+	overlap = (legs > 0) & (width >= spacing)
+
+	ellipse_shape = ellipse & (v["coil_short_diameter"] > v["coil_long_diameter"])
+	ellipse_mode = ellipse & (v["coil_mode"] != HIGHPASS)
+
+	return (INVALID_VALUE * to_int(invalid) + UNKNOWN_OPTION * to_int(unknown) + INVALID_LEG_COUNT * to_int(leg_count)
+			+ SHIELD_INSIDE_COIL * to_int(shield) + ID_NOT_BELOW_OD * to_int(tube) + LEGS_OVERLAP * to_int(overlap)
+			+ INVALID_ELLIPSE * to_int(ellipse_shape) + ELLIPSE_NOT_HIGHPASS * to_int(ellipse_mode))
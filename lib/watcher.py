@@ -0,0 +1,246 @@
+"""
+Description:    Library to watch a directory of coil designs and keep their results up to date while they are edited.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+A design is a JSON file with settings (see BirdcageSettings.DEFAULTS, missing settings use the defaults), its results
+are written next to it as <name>.result.json, in the same format as a /solve response of the server. Result files are
+written to a temporary file first and then renamed, so a reader never sees half a file.
+
+On Linux the directory is watched with inotify, elsewhere it is polled. A calculation is split in stages (see STAGES):
+the solver after every stage is cached under the settings of that and the earlier stages, so when an edit only changes
+e.g. the frequency, only the capacitance stage is calculated again. The cache is shared by all files, so copied
+designs and undone edits are not calculated at all.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import math
+import os
+import select
+import struct
+import tempfile
+import time
+from lib.logging import logger
+from lib.birdcage_math import BirdcageSettings, solve, settingsFromJson, SettingsError, STAGES, RESULT_COLUMNS
+from lib.cache import ResultCache
+from lib.validation import validate, errorMessages
+
+RESULT_SUFFIX = ".result.json"
+POLL_TIME = 0.2  # s between scans when inotify is not available
+CACHE_SIZE = 10000  # solvers per stage
+
+# inotify events of a finished write, a file renamed into the directory and a removed file, see inotify(7)
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+_EVENT = struct.Struct("iIII")
+
+
+def isDesignFile(name):
+	return name.endswith(".json") and not name.endswith(RESULT_SUFFIX) and not name.startswith(".")
+
+
+def resultPath(path):
+	return path[:-len(".json")] + RESULT_SUFFIX
+
+
+def writeAtomic(path, data):
+	# writes JSON to a temporary file in the same directory and renames it, which replaces the file in one step
+	directory, name = os.path.split(path)
+	fd, temporary = tempfile.mkstemp(dir=directory or ".", prefix="." + name, suffix=".tmp")
+	try:
+		with os.fdopen(fd, "w") as file:
+			json.dump(data, file, indent=1)
+		os.replace(temporary, path)
+	except BaseException:
+		os.remove(temporary)
+		raise
+
+
+class StagedSolver:
+	# Calculates settings with the stages of earlier calculations that are still valid. Safe to share between threads.
+
+	def __init__(self, cache_size=CACHE_SIZE):
+		self.cache = ResultCache(cache_size * len(STAGES))
+
+	@staticmethod
+	def stageKeys(settings):
+		# cache key of every stage: its name and the settings of it and the stages before it
+		keys = []
+		values = ()
+		for stage, names in STAGES:
+			values += tuple(getattr(settings, name) for name in names)
+			keys.append((stage,) + values)
+		return keys
+
+	def solve(self, settings):
+		"""Returns the solver of settings and the names of the stages that were calculated (none when cached).
+
+		Raises like solve() for settings that can not be calculated.
+		"""
+		keys = self.stageKeys(settings)
+		previous = None
+		cached = 0  # number of stages that can be taken over
+		for depth in range(len(keys), 0, -1):
+			previous = self.cache.get(keys[depth - 1])
+			if previous is not None:
+				cached = depth
+				break
+
+		if cached == len(keys):
+			return previous, []
+		if previous is None:
+			solver = solve(settings)
+		else:
+			solver = previous.update(settings, STAGES[cached][0])
+		for key in keys[cached:]:
+			self.cache.put(key, solver)
+		return solver, [stage for stage, _ in STAGES[cached:]]
+
+
+class _Inotify:
+	# The events of one directory through the inotify calls of the C library. Raises OSError or AttributeError where it is not available.
+
+	def __init__(self, directory):
+		libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+		self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+		if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE) < 0:
+			os.close(self.fd)
+			raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+	def read(self, timeout):
+		# names of the files with events, waits at most timeout seconds. None when events were lost.
+		if not select.select([self.fd], [], [], timeout)[0]:
+			return []
+		try:
+			data = os.read(self.fd, 65536)
+		except BlockingIOError:
+			return []
+		names = []
+		offset = 0
+		while offset < len(data):
+			_, mask, _, length = _EVENT.unpack_from(data, offset)
+			if mask & IN_Q_OVERFLOW:
+				return None
+			name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+			names.append(os.fsdecode(name))
+			offset += _EVENT.size + length
+		return list(dict.fromkeys(names))
+
+	def close(self):
+		os.close(self.fd)
+
+
+class DesignWatcher:
+	"""Keeps the result files of the designs in a directory up to date.
+
+	Only designs that changed are calculated, and of those only the stages with changed settings (see StagedSolver).
+	"""
+
+	def __init__(self, directory, solver=None):
+		self.directory = directory
+		self.solver = solver or StagedSolver()
+		self._designs = {}  # name: (modification time, size, settings) of the calculated version
+
+	def scan(self):
+		# updates all designs that changed since the last scan, returns their names
+		names = [name for name in sorted(os.listdir(self.directory)) if isDesignFile(name)]
+		for name in set(self._designs) - set(names):
+			del self._designs[name]
+		return [name for name in names if self.update(name)]
+
+	def update(self, name):
+		# calculates a design again and writes its result file when the design changed, returns whether it did
+		path = os.path.join(self.directory, name)
+		try:
+			stat = os.stat(path)
+		except FileNotFoundError:
+			self._designs.pop(name, None)
+			return False
+		known = self._designs.get(name)
+		if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+			return False
+
+		start = time.perf_counter()
+		previous = known[2] if known is not None else None
+		try:
+			with open(path) as file:
+				settings = settingsFromJson(json.load(file))
+		except (OSError, ValueError) as e:  # e.g. not completely written yet, read again when it changes
+			self._designs[name] = (stat.st_mtime_ns, stat.st_size, previous)
+			logger.warning(f"{name}: can not read the design ({e})")
+			return False
+		except SettingsError as e:
+			self._designs[name] = (stat.st_mtime_ns, stat.st_size, None)
+			writeAtomic(resultPath(path), {"error": str(e)})
+			logger.warning(f"{name}: {e}")
+			return True
+
+		self._designs[name] = (stat.st_mtime_ns, stat.st_size, settings)
+		if previous is None:
+			changed = "new design"
+		else:
+			changed = ", ".join(key for key in BirdcageSettings.DEFAULTS if getattr(previous, key) != getattr(settings, key))
+			if not changed:  # saved without changes
+				return False
+
+		result, stages = self._solve(settings)
+		writeAtomic(resultPath(path), result)
+		if "error" in result:
+			logger.warning(f"{name}: {changed}; {result['error']}")
+		else:
+			logger.info(f"{name}: {changed}; calculated {', '.join(stages) or 'nothing (cached)'} in {(time.perf_counter() - start) * 1000:.1f} ms")
+		return True
+
+	def _solve(self, settings):
+		# result in the format of a /solve response of the server, and the calculated stages
+		code = validate(settings)
+		if code:
+			return {"error": "Invalid settings: " + ", ".join(title.lower() for title, _ in errorMessages(code)), "error_code": code}, []
+		try:
+			solver, stages = self.solver.solve(settings)
+			result = solver.results()
+		except (ArithmeticError, ValueError, IndexError):
+			return {"error": "No valid result for these settings"}, []
+		if not all(math.isfinite(v) for v in [result[key] for key in RESULT_COLUMNS] + list(result["capacitors"])):
+			return {"error": "No valid result for these settings"}, stages
+		return result, stages
+
+	def run(self, stop=None):
+		"""Calculates all designs and then every change, until interrupted or stop() returns True.
+
+		stop is checked at least every POLL_TIME seconds.
+		"""
+		try:
+			events = _Inotify(self.directory)  # before the first scan, so no change is missed
+			logger.info(f"Watching {self.directory} for changed designs")
+		except (OSError, AttributeError):
+			events = None
+			logger.info(f"Watching {self.directory} for changed designs (polling, inotify is not available)")
+
+		try:
+			self.scan()
+			while stop is None or not stop():
+				if events is None:
+					time.sleep(POLL_TIME)
+					self.scan()
+					continue
+				names = events.read(POLL_TIME)
+				if names is None:
+					self.scan()
+				for name in names or ():
+					if isDesignFile(name):
+						self.update(name)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			if events is not None:
+				events.close()
@@ -11,14 +11,18 @@ License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
 				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
 """
 
+import time
+_START_TIME = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, font
-from tkinter import messagebox as mb
 import math
 import os
+import threading
 import lib.my_tk as my_tk
-from lib.logging import logger
+from lib.logging import logger, setupLogging, solveLoggingEnabled, SOLVE_LOG_LEVEL
 from lib.birdcage_math import CalculateBirdcage
+from lib.validation import validate, errorMessages
 from lib.config import MyConfig
 
 
@@ -28,6 +32,11 @@ WEBSITE = "github.com/dwelting/pyBirdcagebuilder"
 
 ICON_FOLDER = os.path.join(os.getcwd(), "icon", "")
 MAX_PRECISION = 2
+STARTUP_BUDGET = 500  # ms until the window is drawn, checked with --startup-time
+REDRAW_LEGS = 256  # size of the coil used by --redraw-time
+BROWSER_ROWS = 16  # rows of the sweep results table
+QUERY_POLL_TIME = 50  # ms between checks whether a filter or sort is finished
+HEATMAP_SIZE = 400  # pixels of the heatmap image
 
 
 class MainApplication:
@@ -52,6 +61,7 @@ class MainApplication:
 		self.window = window
 
 		self.Config = MyConfig(self)
+		self._design_library = None
 
 		# menubar
 		self.menuBar = MyMenuBar(self)
@@ -60,18 +70,48 @@ class MainApplication:
 		self.tab_control = ttk.Notebook(window)  # tabs
 
 		self.calcCapacitance = CalculateBirdcage(self)
-		self.guiTabSettings = MySettingsTab(self)
-		self.guiTabResults = MyResultsTab(self)
-		self.guiTabMoreInfo = MyMoreInfoTab(self)
-
-		self.tab_control.add(self.guiTabSettings.tab, text=' Settings ')
-		self.tab_control.add(self.guiTabResults.tab, text=' Results ')
-		self.tab_control.add(self.guiTabMoreInfo.tab, text=' More Information ')
+		self.guiTabSettings = MySettingsTab(self, self._addTab(' Settings '))
+
+		# the other tabs are only build when they are first needed
+		self._tabs = {}
+		self._lazy_tabs = {"guiTabResults": (MyResultsTab, self._addTab(' Results ')),
+							"guiTabMoreInfo": (MyMoreInfoTab, self._addTab(' More Information ')),
+							"guiTabBrowser": (MyBrowserTab, self._addTab(' Sweeps '))}
+		self.tab_control.bind("<<NotebookTabChanged>>", lambda e: self._buildSelectedTab())
 		self.tab_control.pack(expand=1, fill='both', padx=(5, 5), pady=(5, 5))
 		
 		if os.name == 'posix':
 			bg = ttk.Style().lookup('TFrame', 'background')
 			self.guiTabSettings.tab.tk_setPalette(background=bg)  # only useful in linux. Hides color inconsistencies between widget bg and frame bg
+
+	@property
+	def guiTabResults(self):
+		return self._getTab("guiTabResults")
+
+	@property
+	def guiTabMoreInfo(self):
+		return self._getTab("guiTabMoreInfo")
+
+	@property
+	def guiTabBrowser(self):
+		return self._getTab("guiTabBrowser")
+
+	def _addTab(self, text):
+		tab = ttk.Frame(self.tab_control)
+		self.tab_control.add(tab, text=text)
+		return tab
+
+	def _getTab(self, name):
+		if name not in self._tabs:
+			tab_class, tab = self._lazy_tabs[name]
+			self._tabs[name] = tab_class(self, tab)
+		return self._tabs[name]
+
+	def _buildSelectedTab(self):
+		selected = self.tab_control.select()
+		for name, (_, tab) in self._lazy_tabs.items():
+			if str(tab) == selected:
+				self._getTab(name)
 		
 	def _setWindow(self, window):
 		window.title(f"{PROGRAM_NAME}")  # {VERSION}")
@@ -90,11 +130,44 @@ class MainApplication:
 		except tk.TclError:
 			logger.warn("Icon error: no application icon found?")
 
+	@property
+	def designLibrary(self):
+		# opened when first needed, it reads the library and the index
+		if self._design_library is None:
+			from lib.design_library import DesignLibrary
+			self._design_library = DesignLibrary()
+		return self._design_library
+
+	def saveDesign(self):
+		from tkinter import messagebox as mb
+		try:
+			numbers = self.designLibrary.add([self.calcCapacitance.settingsFromGui()])
+		except ImportError:
+			mb.showwarning("NumPy missing", "The design library needs NumPy.")
+			return
+		except (ValueError, OSError) as e:
+			mb.showwarning("Design not saved", str(e))
+			return
+		logger.info(f"Design saved to the library as number {numbers[0]}")
+
+	def findSimilarDesigns(self):
+		from tkinter import messagebox as mb
+		try:
+			library = self.designLibrary
+		except ImportError:
+			mb.showwarning("NumPy missing", "The design library needs NumPy.")
+			return
+		if not len(library):
+			mb.showinfo("Empty library", "No designs have been saved to the library yet.")
+			return
+		MyNearestWindow(self, library)
+
 	def startCalculation(self):
 		inputs_ = self.guiTabSettings.validateInputs()
 		if not inputs_:
 			return
-		logger.info("Calculation started with values:\n\t\t\t" + "\n\t\t\t".join("{}: {}".format(k, v) for k, v in inputs_.items()))
+		if solveLoggingEnabled():
+			logger.log(SOLVE_LOG_LEVEL, "Calculation started with values:\n\t\t\t" + "\n\t\t\t".join("{}: {}".format(k, v) for k, v in inputs_.items()))
 		self.calcCapacitance.calculate()
 		self.guiTabResults.drawCapacitors()
 		self.guiTabResults.drawGraph()
@@ -105,20 +178,20 @@ class MyMenuBar:
 	def __init__(self, parent):
 		self.parent = parent
 
-		self.coil_shape = tk.BooleanVar()  # selects which coil type
-		self.coil_shape.set(True)
+		self.coil_shape = tk.IntVar()  # selects which coil type
+		self.coil_shape.set(self.parent.CIRCLE)
 
 		self.menu = tk.Menu(parent.window)
 		self._fileMenu()
-		# self._optionMenu() #todo add when elliptical is fixed
+		self._optionMenu()
 		self._helpMenu()
 
 	def _optionMenu(self):
 		optionmenu = tk.Menu(self.menu, tearoff=0)
 		self.menu.add_cascade(label="Options", menu=optionmenu)
 
-		optionmenu.add_checkbutton(label="Circular", onvalue=self.parent.CIRCLE, offvalue=self.parent.ELLIPSE, command=lambda e: print("Not yet implemented"), variable=self.coil_shape)
-		optionmenu.add_checkbutton(label="Eliptical", onvalue=self.parent.ELLIPSE, offvalue=self.parent.CIRCLE, command=lambda e: print("Not yet implemented"), variable=self.coil_shape)
+		optionmenu.add_radiobutton(label="Circular", value=self.parent.CIRCLE, variable=self.coil_shape)
+		optionmenu.add_radiobutton(label="Elliptical", value=self.parent.ELLIPSE, variable=self.coil_shape)
 
 	def _helpMenu(self):
 		helpmenu = tk.Menu(self.menu, tearoff=0)
@@ -134,13 +207,16 @@ class MyMenuBar:
 		# filemenu.add_command(label="Save config as...", command=self.parent.Config.saveAs)
 		# filemenu.add_command(label="Load config", command=self.parent.Config.load)
 		# filemenu.add_separator()
+		filemenu.add_command(label="Save design to library", command=self.parent.saveDesign)
+		filemenu.add_command(label="Find similar designs...", command=self.parent.findSimilarDesigns)
+		filemenu.add_separator()
 		filemenu.add_command(label="Exit", command=self.parent.window.quit)
 
 
 class MyMoreInfoTab:
-	def __init__(self, parent):
+	def __init__(self, parent, tab):
 		self.parent = parent
-		self.tab = ttk.Frame(parent.tab_control)
+		self.tab = tab
 
 		self.v_ind_self_legs = tk.DoubleVar()  # calculated self inductance of legs
 		self.v_ind_self_er = tk.DoubleVar()  # calculated self inductance of end ring
@@ -173,26 +249,33 @@ class MyMoreInfoTab:
 	
 	
 class MyResultsTab:
-	def __init__(self, parent):
+	def __init__(self, parent, tab):
 		self.parent = parent
-		self.tab = ttk.Frame(parent.tab_control)
+		self.tab = tab
 
 		self.v_cap_res = tk.DoubleVar()  # calculated cap value
+		self.v_caps_res = tk.StringVar()  # all different cap values of an elliptical coil
 
 		lbl_cap = tk.Label(self.tab, text="Calculated Capacitance (pF)", font=myfont_bold, foreground="blue")
 		txt_cap_res = my_tk.MyEntry(self.tab, text=self.v_cap_res, read_only=True, decimals=MAX_PRECISION)
+		lbl_caps = tk.Label(self.tab, textvariable=self.v_caps_res, font=myfont_small, justify='left', wraplength=300)
 
 		tk.Grid.columnconfigure(self.tab, 1, weight=0)
 		tk.Grid.columnconfigure(self.tab, 0, weight=1)
 		tk.Grid.columnconfigure(self.tab, 3, weight=1)
 		lbl_cap.grid(column=1, row=0, columnspan=2, sticky=tk.NW, pady=(5, 5), padx=(5, 0))
 		txt_cap_res.grid(column=1, row=1, sticky=tk.NW, pady=(0, 50), padx=(5, 0))
+		lbl_caps.grid(column=2, row=1, sticky=tk.NW, padx=(5, 0))
 	
 		self._initializeGraphs()
 	
 	def _initializeGraphs(self):
-		# current graph
+		# The graphs are retained: the axes are drawn once and the items of the legs are kept in pools (see _pool)
+		# and only moved on a new result. Redraws are collected into one update when Tk is idle.
 		self.canvas_size = 200
+		self._pools = {}
+		self._visible = {}
+		self._redraw_pending = False
 
 		frm_curr_plot = tk.LabelFrame(self.tab)
 		lbl_curr_plot = tk.Label(frm_curr_plot, text="Current distribution in the legs", font=myfont_small_bold, foreground="blue")
@@ -202,6 +285,7 @@ class MyResultsTab:
 
 		self.canvas_curr = tk.Canvas(frm_curr_plot, width=self.canvas_size, height=self.canvas_size, borderwidth=0, highlightbackground="grey")
 		self._drawGraphAxis()
+		self.curr_line = self.canvas_curr.create_line(0, 0, 0, 0, width=1, fill='green', state='hidden')  # one line through all legs
 		self.canvas_curr.pack(pady=(10, 10))
 
 		lbl_curr_plot2 = tk.Label(frm_curr_plot, text="Angular position of leg (degree)\nZero beginning at +X direction", font=myfont_small, foreground="black")
@@ -221,51 +305,110 @@ class MyResultsTab:
 		frm_curr_plot.grid(column=1, row=2, sticky=tk.NW, padx=(5, 10))
 		frm_cap_pos.grid(column=2, row=2, sticky=tk.NW)
 
+	def _pool(self, canvas, name, count, create):
+		# Returns count items of a pool of alike canvas items. Missing items are made with create(), the rest is hidden.
+		items = self._pools.setdefault(name, [])
+		while len(items) < count:
+			items.append(create())
+		visible = self._visible.get(name, 0)
+		for item in items[count:visible]:
+			canvas.itemconfigure(item, state='hidden')
+		for item in items[visible:count]:
+			canvas.itemconfigure(item, state='normal')
+		self._visible[name] = count
+		return items[:count]
+
 	def _drawCapacitorAxis(self):
-		if self.parent.menuBar.coil_shape.get() == self.parent.CIRCLE:
-			self.canvas_cap.create_oval(20, 20, self.canvas_size-20, self.canvas_size-20, outline="green", width=1)
+		self.cap_outline = self.canvas_cap.create_oval(20, 20, self.canvas_size-20, self.canvas_size-20, outline="green", width=1)
+		self.canvas_cap.create_line(self.canvas_size/2, 0, self.canvas_size/2, self.canvas_size, fill="blue", width=1)
+		self.canvas_cap.create_line(0, self.canvas_size/2, self.canvas_size, self.canvas_size/2, fill="blue", width=1)
+		self.canvas_cap.create_text(self.canvas_size/2+((self.canvas_size-40)/2)-20, self.canvas_size/2+10, text="+X", font='freemono 9', fill='black')
+
+	def _updateCapacitorAxis(self):
+		# outline of the drawn result, not of the (maybe changed) settings in the gui
+		result = self.parent.calcCapacitance.result
+		if result.coil_shape != self.parent.ELLIPSE:
+			self.canvas_cap.coords(self.cap_outline, 20, 20, self.canvas_size-20, self.canvas_size-20)
 		else:
-			ratio = self.parent.guiTabSettings.v_coil_short_diameter.get() / self.parent.guiTabSettings.v_coil_long_diameter.get()
+			ratio = result.settings.coil_short_diameter / result.settings.coil_long_diameter
 			x_min = 20
 			x_max = self.canvas_size - 20
 			y_min = self.canvas_size/2 - ((self.canvas_size/2 - 20) * ratio)
 			y_max = self.canvas_size/2 + ((self.canvas_size/2 - 20) * ratio)
-			self.canvas_cap.create_oval(x_min, y_min, x_max, y_max, outline="green", width=1)
-
-		self.canvas_cap.create_line(self.canvas_size/2, 0, self.canvas_size/2, self.canvas_size, fill="blue", width=1)
-		self.canvas_cap.create_line(0, self.canvas_size/2, self.canvas_size, self.canvas_size/2, fill="blue", width=1)
-		self.canvas_cap.create_text(self.canvas_size/2+((self.canvas_size-40)/2)-20, self.canvas_size/2+10, text="+X", font='freemono 9', fill='black')
+			self.canvas_cap.coords(self.cap_outline, x_min, y_min, x_max, y_max)
 
 	def drawCapacitors(self):
-		self.canvas_cap.delete("all")
-		self._drawCapacitorAxis()
-		thetas = self.parent.calcCapacitance.thetas
-		bc_mode = self.parent.guiTabSettings.v_rb_config_selected.get()
+		self._scheduleRedraw()
+
+	def drawGraph(self):
+		self._scheduleRedraw()
+
+	def _scheduleRedraw(self):
+		if not self._redraw_pending:
+			self._redraw_pending = True
+			self.tab.after_idle(self.redraw)
+
+	def redraw(self):
+		# draws the current result on both graphs
+		self._redraw_pending = False
+		if self.parent.calcCapacitance.result is None:
+			return
+		self._renderCapacitors()
+		self._renderGraph()
 
-		# if self.parent.menuBar.coil_shape.get() == ELLIPSE:
-		#	ratio = self.parent.guiTabSettings.v_coil_short_diameter.get() / self.parent.guiTabSettings.v_coil_long_diameter.get()
-		# else:
-		#	ratio = 1
+	def _legDots(self, name, count):
+		return self._pool(self.canvas_cap, name, count, lambda: self.canvas_cap.create_oval(0, 0, 0, 0, fill='red'))
+
+	def _capacitorLabels(self, name, count):
+		return self._pool(self.canvas_cap, name, count, lambda: self.canvas_cap.create_text(0, 0, text="c", fill='blue'))
+
+	def _renderCapacitors(self):
+		self._updateCapacitorAxis()
+		result = self.parent.calcCapacitance.result
+		thetas = result.thetas
+		bc_mode = result.coil_mode
+
+		if result.coil_shape == self.parent.ELLIPSE:
+			self._renderEllipseCapacitors()
+			return
 
 		r = ((self.canvas_size-40)/2)
-		for theta in thetas:
+		for item, theta in zip(self._legDots("legs", len(thetas)), thetas):
 			x = r * math.sin(theta) + self.canvas_size/2
 			y = r * math.cos(theta) + self.canvas_size/2
-			self.canvas_cap.create_oval(x - 4, y - 4, x + 4, y + 4, fill='red')
+			self.canvas_cap.coords(item, x - 4, y - 4, x + 4, y + 4)
 
 		r_hp = ((self.canvas_size-40)/2) + 6  # radius
 		r_lp = r_hp + 4  # radius
 		offset = thetas[0]  # rotate the c's to be in between the dots
-		for theta in thetas:  # angle and radius to x/y coords
-			if bc_mode != self.parent.LOWPASS:  # if highpass or bandpass
-				x = r_hp * math.sin(theta - offset) + (self.canvas_size/2) + 1
-				y = r_hp * math.cos(theta - offset) + (self.canvas_size/2) - 1
-				self.canvas_cap.create_text(x, y, text="c", fill='blue')
-
-			if bc_mode != self.parent.HIGHPASS:  # if lowpass or bandpass
-				x = r_lp * math.sin(theta) + (self.canvas_size/2) + 1
-				y = r_lp * math.cos(theta) + (self.canvas_size/2) - 1
-				self.canvas_cap.create_text(x, y, text="c", fill='blue')
+		hp_labels = self._capacitorLabels("hp_caps", len(thetas) if bc_mode != self.parent.LOWPASS else 0)  # if highpass or bandpass
+		for item, theta in zip(hp_labels, thetas):  # angle and radius to x/y coords
+			x = r_hp * math.sin(theta - offset) + (self.canvas_size/2) + 1
+			y = r_hp * math.cos(theta - offset) + (self.canvas_size/2) - 1
+			self.canvas_cap.coords(item, x, y)
+
+		lp_labels = self._capacitorLabels("lp_caps", len(thetas) if bc_mode != self.parent.HIGHPASS else 0)  # if lowpass or bandpass
+		for item, theta in zip(lp_labels, thetas):
+			x = r_lp * math.sin(theta) + (self.canvas_size/2) + 1
+			y = r_lp * math.cos(theta) + (self.canvas_size/2) - 1
+			self.canvas_cap.coords(item, x, y)
+
+	def _renderEllipseCapacitors(self):
+		# elliptical coils are always high-pass, draw the legs on the ellipse and the c's in between
+		result = self.parent.calcCapacitance.result
+		scale = ((self.canvas_size-40)/2) / result.coil_radius
+		scale_hp = (((self.canvas_size-40)/2) + 8) / result.coil_radius
+		self._capacitorLabels("lp_caps", 0)
+
+		for item, x, y in zip(self._legDots("legs", result.nr_of_legs), result.xcoords, result.ycoords):
+			x = x * scale + self.canvas_size/2
+			y = -y * scale + self.canvas_size/2
+			self.canvas_cap.coords(item, x - 4, y - 4, x + 4, y + 4)
+
+		for i, item in enumerate(self._capacitorLabels("hp_caps", result.nr_of_legs)):
+			x = (result.xcoords[i] + result.xcoords[(i + 1) % result.nr_of_legs]) / 2 * scale_hp + self.canvas_size/2
+			y = -(result.ycoords[i] + result.ycoords[(i + 1) % result.nr_of_legs]) / 2 * scale_hp + self.canvas_size/2
+			self.canvas_cap.coords(item, x, y)
 
 	def _drawGraphAxis(self):
 		from_edge_l = 10
@@ -282,40 +425,451 @@ class MyResultsTab:
 		self.canvas_curr.create_text((from_edge_r-from_edge_l)/2+from_edge_l, self.canvas_size/2+15, text="180", font='freemono 9')
 		self.canvas_curr.create_text(self.canvas_size-10, self.canvas_size/2+15, text="360", font='freemono 9')
 
-	def drawGraph(self):
-		self.canvas_curr.delete("all")
-		self._drawGraphAxis()
-
-		legcurrs = self.parent.calcCapacitance.legcurrs
-		nr_of_legs = self.parent.calcCapacitance.nr_of_legs
+	def _renderGraph(self):
+		legcurrs = self.parent.calcCapacitance.result.legcurrs
+		nr_of_legs = self.parent.calcCapacitance.result.nr_of_legs
 		offset = 10
 
-		highest_curr = 0
-		for curr in legcurrs:
-			if abs(curr) > highest_curr:
-				highest_curr = abs(curr)
+		highest_curr = max(abs(curr) for curr in legcurrs)
 		scale = self.canvas_size/2 / highest_curr / 1.3
 
-		old_x = 0
-		old_y = 0
-		for i, curr in enumerate(legcurrs):  # create the lines
-			x = ((self.canvas_size-20) / (nr_of_legs-1)) * i + offset
-			y = -curr * scale + self.canvas_size/2
-			if i > 0:
-				self.canvas_curr.create_line(x, y, old_x, old_y, width=1, fill='green')
-			old_x = x
-			old_y = y
+		points = []
+		for i, curr in enumerate(legcurrs):
+			points.append(((self.canvas_size-20) / (nr_of_legs-1)) * i + offset)
+			points.append(-curr * scale + self.canvas_size/2)
+		self.canvas_curr.coords(self.curr_line, *points)
+		self.canvas_curr.itemconfigure(self.curr_line, state='normal')
+
+		dots = self._pool(self.canvas_curr, "curr_dots", nr_of_legs, lambda: self.canvas_curr.create_oval(0, 0, 0, 0, fill='red'))
+		for i, item in enumerate(dots):
+			x, y = points[2 * i], points[2 * i + 1]
+			self.canvas_curr.coords(item, x - 4, y - 4, x + 4, y + 4)
+
+
+class MyBrowserTab:
+	# Browses sweep results written with --sweep (see lib.result_store). The table is virtual: it always has
+	# BROWSER_ROWS items, which get the values of the rows at the scroll position, so only those rows are read and the
+	# size of the results does not matter. Filtering and sorting run in a background thread.
+
+	def __init__(self, parent, tab):
+		self.parent = parent
+		self.tab = tab
+		self.store = None
+		self.fields = []
+		self.offset = 0  # position in the view of the first row in the table
+		self.selected = None  # position in the view of the selected row
+		self.sort = None
+		self.descending = False
+		self._query = 0  # number of the last started query, results of older ones are dropped
+		self._query_result = None
+
+		self.v_status = tk.StringVar(value="No sweep results opened")
+		self.v_filter = tk.StringVar()
+
+		frm_top = tk.Frame(self.tab)
+		btn_open = tk.Button(frm_top, text="Open...", command=self.open)
+		lbl_status = tk.Label(frm_top, textvariable=self.v_status, font=myfont_small, anchor='w')
+		btn_heatmap = tk.Button(frm_top, text="Heatmap...", command=self.showHeatmap)
+		btn_open.pack(side=tk.LEFT)
+		btn_heatmap.pack(side=tk.LEFT, padx=(5, 0))
+		lbl_status.pack(side=tk.LEFT, padx=(5, 0))
+
+		frm_filter = tk.Frame(self.tab)
+		lbl_filter = tk.Label(frm_filter, text="Filter", font=myfont_bold)
+		txt_filter = tk.Entry(frm_filter, textvariable=self.v_filter, bg="white")
+		txt_filter.bind("<Return>", lambda e: self._startQuery())
+		btn_filter = tk.Button(frm_filter, text="Apply", command=self._startQuery)
+		lbl_filter.pack(side=tk.LEFT)
+		txt_filter.pack(side=tk.LEFT, fill='x', expand=1, padx=(5, 5))
+		btn_filter.pack(side=tk.LEFT)
+		lbl_example = tk.Label(self.tab, text="e.g. capacitor > 5, nr_of_legs == 16", font=myfont_small, anchor='w')
+
+		frm_table = tk.Frame(self.tab)
+		self.tree = ttk.Treeview(frm_table, show='headings', height=BROWSER_ROWS, selectmode='browse')
+		self.scrollbar = ttk.Scrollbar(frm_table, orient=tk.VERTICAL, command=self._scroll)
+		scrollbar_x = ttk.Scrollbar(frm_table, orient=tk.HORIZONTAL, command=self.tree.xview)
+		self.tree.configure(xscrollcommand=scrollbar_x.set)
+		for i in range(BROWSER_ROWS):
+			self.tree.insert("", "end", iid=str(i))
+		self.tree.bind("<ButtonRelease-1>", self._click)
+		self.tree.bind("<Double-1>", lambda e: self.loadIntoSettings())
+		self.tree.bind("<Up>", lambda e: self._moveSelection(-1))
+		self.tree.bind("<Down>", lambda e: self._moveSelection(1))
+		self.tree.bind("<Prior>", lambda e: self._moveSelection(-BROWSER_ROWS))
+		self.tree.bind("<Next>", lambda e: self._moveSelection(BROWSER_ROWS))
+		self.tree.bind("<MouseWheel>", lambda e: self._scroll("scroll", -3 if e.delta > 0 else 3, "units"))
+		self.tree.bind("<Button-4>", lambda e: self._scroll("scroll", -3, "units"))
+		self.tree.bind("<Button-5>", lambda e: self._scroll("scroll", 3, "units"))
+		self.tree.grid(column=0, row=0, sticky=tk.NSEW)
+		self.scrollbar.grid(column=1, row=0, sticky=tk.NS)
+		scrollbar_x.grid(column=0, row=1, sticky=tk.EW)
+		tk.Grid.columnconfigure(frm_table, 0, weight=1)
+
+		btn_load = tk.Button(self.tab, text="Load into Settings", command=self.loadIntoSettings)
+
+		tk.Grid.columnconfigure(self.tab, 0, weight=1)
+		frm_top.grid(column=0, row=0, sticky=tk.EW, pady=(5, 5), padx=(5, 5))
+		frm_filter.grid(column=0, row=1, sticky=tk.EW, padx=(5, 5))
+		lbl_example.grid(column=0, row=2, sticky=tk.EW, pady=(0, 5), padx=(5, 5))
+		frm_table.grid(column=0, row=3, sticky=tk.NSEW, padx=(5, 5))
+		btn_load.grid(column=0, row=4, pady=(5, 5))
+
+	def open(self, directory=None):
+		from tkinter import messagebox as mb
+		try:
+			from lib.result_store import ResultStore
+		except ImportError:
+			mb.showwarning("NumPy missing", "Browsing sweep results needs NumPy.")
+			return
+		if directory is None:
+			from tkinter import filedialog
+			directory = filedialog.askdirectory(title="Open sweep results")
+			if not directory:
+				return
+		try:
+			store = ResultStore(directory)
+		except (OSError, ValueError, KeyError):
+			mb.showwarning("Invalid sweep results", f"{directory} does not contain complete sweep results.")
+			return
+
+		self.store = store
+		self.fields = store.parameters + ["capacitor", "leg_eff_ind", "er_eff_ind", "error_code"]
+		self.sort = None
+		self._query += 1  # drops a running query on the previous results
+		self.tree.configure(columns=self.fields)
+		for field in self.fields:
+			self.tree.heading(field, text=field, command=lambda f=field: self._sortBy(f))
+			self.tree.column(field, width=90, minwidth=60, stretch=False)
+		self.offset = 0
+		self.selected = None
+		self._showStatus()
+		self._show()
+
+	def showHeatmap(self):
+		from tkinter import messagebox as mb
+		if self.store is None or len(self.store.parameters) < 2:
+			mb.showwarning("No 2D sweep", "Open sweep results with at least two swept settings first.")
+			return
+		MyHeatmapWindow(self.parent, self.store)
 
-		for i, curr in enumerate(legcurrs):  # create the dots
-			x = ((self.canvas_size-20) / (nr_of_legs-1)) * i + offset
-			y = -curr * scale + self.canvas_size/2
-			self.canvas_curr.create_oval(x - 4, y - 4, x + 4, y + 4, fill='red')
+	def loadIntoSettings(self):
+		if self.store is None or self.selected is None:
+			self.v_status.set("Select a row first")
+			return
+		self.parent.guiTabSettings.setSettings(self.store.settings(self.selected))
+		self.parent.tab_control.select(0)
+
+	def _show(self):
+		count = len(self.store) if self.store is not None else 0
+		self.offset = max(0, min(self.offset, count - BROWSER_ROWS))
+		rows = self.store.rows(self.offset, BROWSER_ROWS, self.fields) if count else {}
+		for i in range(BROWSER_ROWS):
+			if self.offset + i < count:
+				values = [self._format(field, rows[field][i]) for field in self.fields]
+			else:
+				values = ()
+			self.tree.item(str(i), values=values)
+
+		if self.selected is not None and self.offset <= self.selected < self.offset + BROWSER_ROWS:
+			self.tree.selection_set(str(self.selected - self.offset))
+		else:
+			self.tree.selection_set(())
+		if count:
+			self.scrollbar.set(self.offset / count, min(1, (self.offset + BROWSER_ROWS) / count))
+		else:
+			self.scrollbar.set(0, 1)
+
+	@staticmethod
+	def _format(field, value):
+		if field == "error_code":
+			from lib.validation import errorMessages
+			return ", ".join(title for title, _ in errorMessages(int(value)))
+		if value != value:
+			return "-"
+		if float(value).is_integer():
+			return str(int(value))
+		return f"{value:.4g}"
+
+	def _scroll(self, action, amount, unit=None):
+		# scrollbar commands: ("moveto", fraction) or ("scroll", steps, "units" or "pages")
+		if self.store is None:
+			return
+		if action == "moveto":
+			self.offset = int(float(amount) * len(self.store))
+		else:
+			self.offset += int(amount) * (BROWSER_ROWS if unit == "pages" else 1)
+		self._show()
+
+	def _click(self, event):
+		row = self.tree.identify_row(event.y)
+		if row and self.store is not None and self.offset + int(row) < len(self.store):
+			self.selected = self.offset + int(row)
+
+	def _moveSelection(self, step):
+		if self.store is None or not len(self.store):
+			return "break"
+		position = self.offset if self.selected is None else self.selected + step
+		self.selected = max(0, min(position, len(self.store) - 1))
+		if self.selected < self.offset:
+			self.offset = self.selected
+		elif self.selected >= self.offset + BROWSER_ROWS:
+			self.offset = self.selected - BROWSER_ROWS + 1
+		self._show()
+		return "break"
+
+	def _sortBy(self, field):
+		if self.sort == field:
+			self.descending = not self.descending
+		else:
+			self.sort = field
+			self.descending = False
+		for f in self.fields:
+			arrow = (" \u25bc" if self.descending else " \u25b2") if f == self.sort else ""
+			self.tree.heading(f, text=f + arrow)
+		self._startQuery()
+
+	def _startQuery(self):
+		if self.store is None:
+			return
+		from lib.result_store import parseConditions
+		try:
+			conditions = parseConditions(self.v_filter.get())
+		except ValueError as e:
+			self.v_status.set(str(e))
+			return
+
+		self._query += 1
+		number = self._query
+		store, sort, descending = self.store, self.sort, self.descending
+
+		def work():
+			try:
+				self._query_result = (number, store.query(conditions, sort, descending), None)
+			except (OSError, ValueError, KeyError) as e:
+				self._query_result = (number, None, e)
+
+		self.v_status.set("Filtering and sorting...")
+		threading.Thread(target=work, daemon=True).start()
+		self.tab.after(QUERY_POLL_TIME, self._pollQuery, number)
+
+	def _pollQuery(self, number):
+		if number != self._query:
+			return  # a newer query has started
+		if self._query_result is None or self._query_result[0] != number:
+			self.tab.after(QUERY_POLL_TIME, self._pollQuery, number)
+			return
+		_, rows, error = self._query_result
+		if error is not None:
+			logger.error(f"Sweep query failed: {error}")
+			self.v_status.set("Filtering failed")
+			return
+		self.store.setView(rows)
+		self.offset = 0
+		self.selected = None
+		self._showStatus()
+		self._show()
+
+	def _showStatus(self):
+		self.v_status.set(f"{len(self.store):,} of {self.store.size:,} designs")
+
+
+class MyHeatmapWindow:
+	# Heatmap of two swept settings of a result store (see lib.heatmap), with the other swept settings fixed by sliders.
+	# The canvas has one image that is rendered again on zoom (mouse wheel) and pan (drag). A double click loads the
+	# design under the mouse into the settings tab.
+	VALUES = ("capacitor", "leg_eff_ind", "er_eff_ind", "leg_self_ind", "er_self_ind")
+
+	def __init__(self, parent, store):
+		self.parent = parent
+		self.store = store
+		self.heatmap = None
+		self._render_pending = False
+		self._drag = None
+
+		self.top = tk.Toplevel()
+		self.top.transient(root)
+		self.top.title("Sweep heatmap")
+		self.top.resizable(0, 0)
+
+		parameters = store.parameters
+		self.v_x = tk.StringVar(value=parameters[-1])
+		self.v_y = tk.StringVar(value=parameters[-2])
+		self.v_value = tk.StringVar(value="capacitor")
+		self.v_info = tk.StringVar()
+		self.v_fixed = {name: tk.IntVar(value=0) for name in parameters}
+
+		frm_axes = tk.Frame(self.top)
+		for column, (text, variable, values) in enumerate((("X", self.v_x, parameters), ("Y", self.v_y, parameters), ("Value", self.v_value, self.VALUES))):
+			tk.Label(frm_axes, text=text, font=myfont_bold).grid(column=2 * column, row=0, padx=(5, 2))
+			box = ttk.Combobox(frm_axes, textvariable=variable, values=values, state='readonly', width=14)
+			box.bind("<<ComboboxSelected>>", lambda e: self._newHeatmap())
+			box.grid(column=2 * column + 1, row=0)
+
+		# the swept settings that are not on an axis are fixed at one of their values
+		self.frm_fixed = tk.Frame(self.top)
+		self.scales = {}
+		for name in parameters:
+			values = store.sweep[name]
+			scale = tk.Scale(self.frm_fixed, label=name, variable=self.v_fixed[name], from_=0, to=len(values) - 1, orient=tk.HORIZONTAL,
+							showvalue=False, length=HEATMAP_SIZE, command=lambda v, n=name: self._fixedChanged(n))
+			self.scales[name] = scale
+
+		self.canvas = tk.Canvas(self.top, width=HEATMAP_SIZE, height=HEATMAP_SIZE, highlightthickness=0)
+		self.image = tk.PhotoImage(width=HEATMAP_SIZE, height=HEATMAP_SIZE)
+		self.canvas.create_image(0, 0, image=self.image, anchor=tk.NW)
+		self.canvas.bind("<MouseWheel>", lambda e: self._zoom(1.25 if e.delta > 0 else 0.8, e))
+		self.canvas.bind("<Button-4>", lambda e: self._zoom(1.25, e))
+		self.canvas.bind("<Button-5>", lambda e: self._zoom(0.8, e))
+		self.canvas.bind("<ButtonPress-1>", self._startDrag)
+		self.canvas.bind("<B1-Motion>", self._dragTo)
+		self.canvas.bind("<Motion>", self._showInfo)
+		self.canvas.bind("<Double-1>", self._loadDesign)
+
+		frm_bottom = tk.Frame(self.top)
+		lbl_info = tk.Label(frm_bottom, textvariable=self.v_info, font=myfont_small, anchor='w', justify='left')
+		btn_reset = ttk.Button(frm_bottom, text="Reset view", command=self._resetView)
+		lbl_info.pack(side=tk.LEFT, fill='x', expand=1)
+		btn_reset.pack(side=tk.RIGHT)
+
+		frm_axes.grid(column=0, row=0, pady=(5, 5))
+		self.frm_fixed.grid(column=0, row=1, padx=(5, 5))
+		self.canvas.grid(column=0, row=2, padx=(5, 5))
+		frm_bottom.grid(column=0, row=3, sticky=tk.EW, pady=(5, 5), padx=(5, 5))
+		self._newHeatmap()
+
+	def _newHeatmap(self):
+		x, y = self.v_x.get(), self.v_y.get()
+		if x == y:
+			self.v_info.set("Choose two different settings")
+			return
+		for name, scale in self.scales.items():
+			if name in (x, y):
+				scale.pack_forget()
+			else:
+				scale.pack()
+				self._fixedChanged(name, render=False)
+
+		from lib.heatmap import Heatmap
+		grid = self.store.grid(self.v_value.get())[self._index(slice(None), slice(None))]
+		parameters = self.store.parameters
+		if parameters.index(x) < parameters.index(y):
+			grid = grid.T  # rows are y
+		self.heatmap = Heatmap(grid)
+		self._scheduleRender()
+
+	def _index(self, ix, iy):
+		# index into the grid of the store of x and y with the fixed settings
+		return tuple(ix if name == self.v_x.get() else iy if name == self.v_y.get() else self.v_fixed[name].get()
+					for name in self.store.parameters)
+
+	def _fixedChanged(self, name, render=True):
+		value = self.store.sweep[name][self.v_fixed[name].get()]
+		self.scales[name].config(label=f"{name}: {value:g}")
+		if render and self.heatmap is not None:
+			self._newHeatmap()
+
+	def _scheduleRender(self):
+		# zoom and drag events come faster than renders, so they are collected into one render when Tk is idle
+		if not self._render_pending:
+			self._render_pending = True
+			self.top.after_idle(self._render)
+
+	def _render(self):
+		self._render_pending = False
+		self.image.configure(data=self.heatmap.ppm(HEATMAP_SIZE, HEATMAP_SIZE))
+		x0, x1, y0, y1 = self.heatmap.window
+		xs, ys = self.store.sweep[self.v_x.get()], self.store.sweep[self.v_y.get()]
+		self.v_info.set(f"{self.v_x.get()}: {self._axisValue(xs, x0):g} to {self._axisValue(xs, x1):g}\n"
+						f"{self.v_y.get()}: {self._axisValue(ys, y0):g} to {self._axisValue(ys, y1):g}")
+
+	@staticmethod
+	def _axisValue(values, position):
+		# value of a setting at a (fractional) grid position
+		position = min(max(position, 0), len(values) - 1)
+		i = min(int(position), len(values) - 2) if len(values) > 1 else 0
+		if i + 1 >= len(values):
+			return float(values[i])
+		return float(values[i] + (position - i) * (values[i + 1] - values[i]))
+
+	def _zoom(self, factor, event):
+		self.heatmap.zoom(factor, event.x / HEATMAP_SIZE, event.y / HEATMAP_SIZE)
+		self._scheduleRender()
+
+	def _startDrag(self, event):
+		self._drag = (event.x, event.y)
+
+	def _dragTo(self, event):
+		if self._drag is None:
+			return
+		self.heatmap.pan((event.x - self._drag[0]) / HEATMAP_SIZE, (event.y - self._drag[1]) / HEATMAP_SIZE)
+		self._drag = (event.x, event.y)
+		self._scheduleRender()
+
+	def _resetView(self):
+		self.heatmap.reset()
+		self._scheduleRender()
+
+	def _row(self, event):
+		ix, iy = self.heatmap.position(event.x / HEATMAP_SIZE, event.y / HEATMAP_SIZE)
+		return self.store.rowNumber(self._index(ix, iy))
+
+	def _showInfo(self, event):
+		if self.heatmap is None:
+			return
+		row = self._row(event)
+		value = self.store.columns[self.v_value.get()][row]
+		text = ", ".join(f"{name}: {self.store.columns[name][row]:g}" for name in (self.v_x.get(), self.v_y.get()))
+		self.v_info.set(f"{text}\n{self.v_value.get()}: {value:.4g}")
+
+	def _loadDesign(self, event):
+		if self.heatmap is None:
+			return
+		self.parent.guiTabSettings.setSettings(self.store.rowSettings(self._row(event)))
+		self.parent.tab_control.select(0)
+
+
+class MyNearestWindow:
+	# The saved designs that are closest to the settings in the settings tab, a double click loads one.
+	COUNT = 20
+
+	def __init__(self, parent, library):
+		self.parent = parent
+		self.library = library
+
+		self.top = tk.Toplevel()
+		self.top.transient(root)
+		self.top.title("Similar designs")
+		self.top.resizable(0, 0)
+
+		columns = ("distance", "res_freq", "nr_of_legs", "diameter", "shield_diameter", "leg_length", "capacitor")
+		self.tree = ttk.Treeview(self.top, columns=columns, show='headings', height=self.COUNT, selectmode='browse')
+		for column in columns:
+			self.tree.heading(column, text=column)
+			self.tree.column(column, width=90, stretch=False)
+		self.tree.bind("<Double-1>", lambda e: self._load())
+		btn_load = ttk.Button(self.top, text="Load into Settings", command=self._load)
+		self.tree.grid(column=0, row=0, padx=(5, 5), pady=(5, 5))
+		btn_load.grid(column=0, row=1, pady=(0, 5))
+
+		library.reload()
+		for number, distance in library.nearest(parent.calcCapacitance.settingsFromGui(), self.COUNT):
+			settings = library.settings(number)
+			diameter = settings.coil_long_diameter if settings.coil_shape == parent.ELLIPSE else settings.coil_diameter
+			values = (distance, settings.res_freq, settings.nr_of_legs, diameter, settings.shield_diameter, settings.leg_length,
+					library.results(number)["capacitor"])
+			self.tree.insert("", "end", iid=str(number), values=[f"{v:.4g}" for v in values])
+
+	def _load(self):
+		selected = self.tree.selection()
+		if selected:
+			self.parent.guiTabSettings.setSettings(self.library.settings(int(selected[0])))
+			self.parent.tab_control.select(0)
 
 
 class MySettingsTab:
-	def __init__(self, parent):
+	def __init__(self, parent, tab):
 		self.parent = parent
-		self.tab = ttk.Frame(parent.tab_control)
+		self.tab = tab
 
 		self.v_res_freq = tk.DoubleVar()  # variable for Resonance frequency
 		self.v_rb_legs_selected = tk.IntVar()  # variable for state of radiobuttons
@@ -350,6 +904,7 @@ class MySettingsTab:
 		self.v_rb_config_selected.trace("w", lambda *args: self._guiSettingsAdjust())
 		self.v_rb_legs_selected.trace("w", lambda *args: self._guiSettingsAdjust())
 		self.v_rb_er_selected.trace("w", lambda *args: self._guiSettingsAdjust())
+		self.parent.menuBar.coil_shape.trace("w", lambda *args: self._guiSettingsAdjust())
 		self._guiSettingsAdjust()
 
 		self.setDefaults()
@@ -357,7 +912,7 @@ class MySettingsTab:
 	def _setGui(self):
 		#todo make sub functions for each gui part
 
-		lbl_title = tk.Label(self.tab, text="Circular Birdcage Coil ", font=myfont_bold, foreground="blue")
+		self.lbl_title = tk.Label(self.tab, text="Circular Birdcage Coil ", font=myfont_bold, foreground="blue")
 	
 		lf_type_of_legs = tk.LabelFrame(self.tab, text="Type of Leg", font=myfont_bold)
 		rb_leg_r = tk.Radiobutton(lf_type_of_legs, text='Rectangular', value=self.parent.RECT, variable=self.v_rb_legs_selected)
@@ -373,11 +928,11 @@ class MySettingsTab:
 	
 		lf_config = tk.LabelFrame(self.tab, text="Configuration", font=myfont_bold)
 		rb_config_hp = tk.Radiobutton(lf_config, text='High-Pass', value=self.parent.HIGHPASS, variable=self.v_rb_config_selected)
-		rb_config_lp = tk.Radiobutton(lf_config, text='Low-Pass', value=self.parent.LOWPASS, variable=self.v_rb_config_selected)
-		rb_config_bp = tk.Radiobutton(lf_config, text='Band-Pass', value=self.parent.BANDPASS, variable=self.v_rb_config_selected)
+		self.rb_config_lp = tk.Radiobutton(lf_config, text='Low-Pass', value=self.parent.LOWPASS, variable=self.v_rb_config_selected)
+		self.rb_config_bp = tk.Radiobutton(lf_config, text='Band-Pass', value=self.parent.BANDPASS, variable=self.v_rb_config_selected)
 		rb_config_hp.pack(anchor="w")
-		rb_config_lp.pack(anchor="w")
-		rb_config_bp.pack(anchor="w")
+		self.rb_config_lp.pack(anchor="w")
+		self.rb_config_bp.pack(anchor="w")
 
 		self.frm_bp = tk.LabelFrame(lf_config)
 		lb_bp_cap = tk.Label(self.frm_bp, text="Predetermined\ncapacitor (pF)", justify='left', fg='blue')
@@ -398,10 +953,10 @@ class MySettingsTab:
 	
 		lf_dimensions = tk.LabelFrame(self.tab, text="Dimensions (cm)", font=myfont_bold)
 		lb_leg_length = tk.Label(lf_dimensions, text="Leg Length")
-		lb_coil_radius = tk.Label(lf_dimensions, text="Coil Diameter ")
+		self.lb_coil_radius = tk.Label(lf_dimensions, text="Coil Diameter ")
 		lb_shield_radius = tk.Label(lf_dimensions, text="RF shield Diameter ")
 		txt_leg_length = my_tk.NumInput(lf_dimensions, text=self.v_leg_length, width=7, bg="white", min_value=0)
-		txt_coil_radius = my_tk.NumInput(lf_dimensions, text=self.v_coil_diameter, width=7, bg="white", min_value=0)
+		self.txt_coil_radius = my_tk.NumInput(lf_dimensions, text=self.v_coil_diameter, width=7, bg="white", min_value=0)
 		txt_shield_radius = my_tk.NumInput(lf_dimensions, text=self.v_shield_diameter, width=7, bg="white", min_value=0)
 
 		self.lb_leg_width = tk.Label(lf_dimensions, text="Leg Width")
@@ -418,6 +973,17 @@ class MySettingsTab:
 		self.txt_er_od = my_tk.NumInput(lf_dimensions, text=self.v_er_od, width=7, bg="white", min_value=0)
 		self.txt_er_id = my_tk.NumInput(lf_dimensions, text=self.v_er_id, width=7, bg="white", min_value=0)
 
+		# elliptical coil
+		self.lb_long_diameter = tk.Label(lf_dimensions, text="Long Diameter ")
+		self.lb_short_diameter = tk.Label(lf_dimensions, text="Short Diameter ")
+		self.txt_long_diameter = my_tk.NumInput(lf_dimensions, text=self.v_coil_long_diameter, width=7, bg="white", min_value=0)
+		self.txt_short_diameter = my_tk.NumInput(lf_dimensions, text=self.v_coil_short_diameter, width=7, bg="white", min_value=0)
+		self.frm_axis = tk.Frame(lf_dimensions)
+		rb_axis_short = tk.Radiobutton(self.frm_axis, text='Short axis', value=self.parent.SHORT, variable=self.v_coil_shortaxis)
+		rb_axis_long = tk.Radiobutton(self.frm_axis, text='Long axis', value=self.parent.LONG, variable=self.v_coil_shortaxis)
+		rb_axis_short.pack(anchor="w")
+		rb_axis_long.pack(anchor="w")
+
 		# automatic segment length calculation textbox, label
 		self.lb_seg_length = tk.Label(lf_dimensions, text="ER Seg. length", foreground='blue')
 		self.txt_seg_length = my_tk.MyEntry(lf_dimensions, text=self.v_er_seg_length, fg='grey', read_only=True, decimals=MAX_PRECISION)
@@ -425,8 +991,8 @@ class MySettingsTab:
 	
 		lb_leg_length.grid(column=0, row=1, sticky=tk.W, pady=(0, 10))
 		txt_leg_length.grid(column=1, row=1, sticky=tk.W, pady=(0, 10), padx=(0, 10))
-		lb_coil_radius.grid(column=0, row=0, sticky=tk.W, pady=(0, 10))
-		txt_coil_radius.grid(column=1, row=0, sticky=tk.W, pady=(0, 10))
+		self.lb_coil_radius.grid(column=0, row=0, sticky=tk.W, pady=(0, 10))
+		self.txt_coil_radius.grid(column=1, row=0, sticky=tk.W, pady=(0, 10))
 		lb_shield_radius.grid(column=2, row=0, sticky=tk.W, pady=(0, 10))
 		txt_shield_radius.grid(column=3, row=0, sticky=tk.W, pady=(0, 10), padx=(0, 10))
 		self.lb_seg_length.grid(column=2, row=3, sticky=tk.W, pady=(0, 10))
@@ -442,6 +1008,12 @@ class MySettingsTab:
 		self.lb_leg_id.grid(column=0, row=3, sticky=tk.W, pady=(0, 10))
 		self.txt_leg_id.grid(column=1, row=3, sticky=tk.W, pady=(0, 10), padx=(0, 10))
 	
+		self.lb_long_diameter.grid(column=0, row=0, sticky=tk.W, pady=(0, 10))
+		self.txt_long_diameter.grid(column=1, row=0, sticky=tk.W, pady=(0, 10))
+		self.lb_short_diameter.grid(column=0, row=4, sticky=tk.W, pady=(0, 10))
+		self.txt_short_diameter.grid(column=1, row=4, sticky=tk.W, pady=(0, 10))
+		self.frm_axis.grid(column=2, row=4, columnspan=2, sticky=tk.W, pady=(0, 10))
+
 		self.lb_er_od.grid(column=2, row=1, sticky=tk.W, pady=(0, 10))
 		self.txt_er_od.grid(column=3, row=1, sticky=tk.W, pady=(0, 10), padx=(0, 10))
 		self.lb_er_id.grid(column=2, row=2, sticky=tk.W, pady=(0, 10))
@@ -462,7 +1034,7 @@ class MySettingsTab:
 		tk.Grid.rowconfigure(self.tab, 1, weight=1)
 		tk.Grid.rowconfigure(self.tab, 10, weight=100)
 	
-		lbl_title.grid(column=1, row=0, sticky=tk.N+tk.EW, pady=(5, 10))
+		self.lbl_title.grid(column=1, row=0, sticky=tk.N+tk.EW, pady=(5, 10))
 		lf_type_of_legs.grid(column=1, row=1, sticky=tk.NSEW, pady=(0, 10), padx=(5, 10))
 		lf_type_of_er.grid(column=1, row=2, sticky=tk.NSEW, pady=(0, 10), padx=(5, 10))
 		lf_config.grid(column=2, row=0, rowspan=2, sticky=tk.NSEW, pady=(0, 10), padx=(0, 10))
@@ -487,19 +1059,38 @@ class MySettingsTab:
 					"Long Diameter": self.v_coil_long_diameter.get(),
 					"Short Diameter": self.v_coil_short_diameter.get()}
 
-		for key, value in inputs_.items():
-			if key == "Shield Diameter":
-				continue
-			if value == 0:
-				mb.showwarning("Input zero", "One or more inputs are zero.\nPlease input valid values.")
-				return False
-
-		if inputs_["Shield Diameter"] == inputs_["Coil Diameter"]:
-			mb.showwarning("Zero shield distance", "Shield distance is equal to coil diameter.\nPlease input valid values.")
+		code = validate(self.parent.calcCapacitance.settingsFromGui())
+		if code:
+			from tkinter import messagebox as mb
+			messages = errorMessages(code)
+			mb.showwarning(messages[0][0], "\n\n".join(text for _, text in messages))
 			return False
-		
+
 		return inputs_
 	
+	def setSettings(self, settings):
+		# shows a BirdcageSettings in the settings tab
+		self.parent.menuBar.coil_shape.set(settings.coil_shape)
+		self.v_res_freq.set(settings.res_freq)
+		self.v_nr_of_legs.set(settings.nr_of_legs)
+		self.v_coil_diameter.set(settings.coil_diameter)
+		self.v_shield_diameter.set(settings.shield_diameter)
+		self.v_leg_length.set(settings.leg_length)
+		self.v_leg_width.set(settings.leg_width)
+		self.v_leg_od.set(settings.leg_od)
+		self.v_leg_id.set(settings.leg_id)
+		self.v_er_width.set(settings.er_width)
+		self.v_er_od.set(settings.er_od)
+		self.v_er_id.set(settings.er_id)
+		self.v_bp_cap.set(settings.bp_cap)
+		self.v_rb_legs_selected.set(settings.leg_config)
+		self.v_rb_er_selected.set(settings.er_config)
+		self.v_rb_config_selected.set(settings.coil_mode)
+		self.v_rb_bp.set(settings.bp_config)
+		self.v_coil_shortaxis.set(settings.shortaxis)
+		self.v_coil_long_diameter.set(settings.coil_long_diameter)
+		self.v_coil_short_diameter.set(settings.coil_short_diameter)
+
 	def setDefaults(self):
 		self.v_res_freq.set(298)
 		self.v_nr_of_legs.set(12)
@@ -565,6 +1156,36 @@ class MySettingsTab:
 		else:
 			self.frm_bp.pack_forget()
 
+		if self.parent.menuBar.coil_shape.get() == self.parent.ELLIPSE:
+			self.lbl_title.config(text="Elliptical Birdcage Coil ")
+			self.lb_coil_radius.grid_remove()
+			self.txt_coil_radius.grid_remove()
+
+			self.lb_long_diameter.grid()
+			self.txt_long_diameter.grid()
+			self.lb_short_diameter.grid()
+			self.txt_short_diameter.grid()
+			self.frm_axis.grid()
+
+			# elliptical coils can only be calculated as high-pass
+			self.rb_config_lp.config(state=tk.DISABLED)
+			self.rb_config_bp.config(state=tk.DISABLED)
+			if self.v_rb_config_selected.get() != self.parent.HIGHPASS:
+				self.v_rb_config_selected.set(self.parent.HIGHPASS)
+		else:
+			self.lbl_title.config(text="Circular Birdcage Coil ")
+			self.lb_coil_radius.grid()
+			self.txt_coil_radius.grid()
+
+			self.lb_long_diameter.grid_remove()
+			self.txt_long_diameter.grid_remove()
+			self.lb_short_diameter.grid_remove()
+			self.txt_short_diameter.grid_remove()
+			self.frm_axis.grid_remove()
+
+			self.rb_config_lp.config(state=tk.NORMAL)
+			self.rb_config_bp.config(state=tk.NORMAL)
+
 
 class MyAboutWindow:
 	def __init__(self):
@@ -650,7 +1271,153 @@ class MyAboutWindow:
 
 
 
+def parseArguments():
+	import argparse
+	parser = argparse.ArgumentParser(prog=PROGRAM_NAME, description="Calculates ideal capacitor values for birdcage coil designs.")
+	parser.add_argument("--serve", action="store_true", help="run a local HTTP/JSON server instead of the GUI")
+	parser.add_argument("--host", default="127.0.0.1", help="address the server listens on (default: %(default)s)")
+	parser.add_argument("--port", type=int, default=8765, help="port the server listens on (default: %(default)s)")
+	parser.add_argument("--startup-time", action="store_true", help=f"measure the time until the window is drawn and exit, fails above {STARTUP_BUDGET} ms")
+	parser.add_argument("--redraw-time", action="store_true", help=f"measure the time to redraw the result graphs of a {REDRAW_LEGS} leg coil and exit")
+	parser.add_argument("--build-surrogate", nargs="*", type=int, metavar="LEGS", help="(re)build the tables for instant approximate answers "
+						"for the given numbers of legs (default: 8 to 32) and exit")
+	parser.add_argument("--optimize", type=int, metavar="GENERATIONS", help="search the default design space for the best trade-offs "
+						"between capacitor availability, homogeneity, Q and size, print the Pareto front and exit")
+	parser.add_argument("--checkpoint", metavar="FILE", help="save the --optimize state to FILE after every generation and resume from it")
+	parser.add_argument("--sweep", nargs=2, metavar=("SPEC", "DIRECTORY"), help="calculate the sweep in the JSON file SPEC (the same as "
+						"a /sweep request) into DIRECTORY for the Sweeps tab and exit")
+	parser.add_argument("--float32", action="store_true", help="let --sweep calculate and store the results in single precision "
+						"(half the memory and disk, the error against double precision is logged)")
+	parser.add_argument("--transport-time", action="store_true", help="let --sweep compare the time of writing results from the worker "
+						"processes straight into DIRECTORY with sending them back pickled")
+	parser.add_argument("--library", metavar="DIRECTORY", help="design library for --library-add and --nearest (default: ~/.pyBirdcagebuilder/library)")
+	parser.add_argument("--library-add", metavar="FILE", help="save the designs in FILE (JSON settings, a list of them, or a --sweep "
+						"directory) to the design library and exit")
+	parser.add_argument("--nearest", metavar="FILE", help="print the saved designs closest to the settings in the JSON file FILE and exit")
+	parser.add_argument("--count", type=int, default=5, help="number of designs printed by --nearest (default: %(default)s)")
+	parser.add_argument("--radius", type=float, help="let --nearest print all designs within this distance (1 is about 10%% "
+						"difference in one size) instead")
+	parser.add_argument("--watch", metavar="DIRECTORY", help="keep the results of the designs in DIRECTORY (JSON settings files) up "
+						"to date in <name>.result.json files while they are edited, until interrupted")
+	parser.add_argument("--autotune", action="store_true", help="time the solver engines on this computer again, save and print "
+						"the fastest per coil shape, number of legs and batch size and exit")
+	parser.add_argument("--cross-check", metavar="FILE", help="calculate the settings in the JSON file FILE also with conductors of "
+						"finite width (sub-filaments), print how far the fast formulas are off, also for wider strips, and exit")
+	parser.add_argument("--filaments", type=int, default=None, help="sub-filaments across a strip or rings of a tube for --cross-check "
+						"(default: 4), the results are also calculated with twice as many to show the convergence")
+	parser.add_argument("--workers", type=int, default=None, help="number of processes for --build-surrogate, --optimize and --sweep "
+						"(default: all CPUs)")
+	return parser.parse_args()
+
+
+def measureRedrawTime(app, root, repeats=20):
+	"""Returns the first (items are created) and the median later redraw time in ms of the result graphs.
+
+	The results switch between REDRAW_LEGS and REDRAW_LEGS - 4 legs, so every redraw moves and hides items.
+	"""
+	from lib.birdcage_math import BirdcageSettings, solve
+	results = [solve(BirdcageSettings(nr_of_legs=REDRAW_LEGS - 4 * (i % 2))) for i in range(2)]
+	tab = app.guiTabResults
+	app.tab_control.select(1)
+	root.update()
+
+	times = []
+	for i in range(repeats + 1):
+		app.calcCapacitance.result = results[i % 2]
+		start = time.perf_counter()
+		tab.redraw()
+		root.update()
+		times.append((time.perf_counter() - start) * 1000)
+	return times[0], sorted(times[1:])[repeats // 2]
+
+
+def preloadNumericBackends():
+	# imports the NumPy based modules in the background, so they are ready when first needed
+	try:
+		import lib.birdcage_batch  # noqa
+	except ImportError:
+		logger.debug("NumPy not available, using the scalar solver only")
+
+
 if __name__ == "__main__":
+	args = parseArguments()
+	if args.serve:
+		setupLogging()
+		from lib.server import SolveServer
+		SolveServer(args.host, args.port).run()
+		raise SystemExit
+	if args.watch is not None:
+		setupLogging()
+		from lib.watcher import DesignWatcher
+		DesignWatcher(args.watch).run()
+		raise SystemExit
+	if args.autotune:
+		setupLogging()
+		from lib.engines import autotune, tuningTable
+		print(tuningTable(autotune()))
+		raise SystemExit
+	if args.cross_check is not None:
+		setupLogging()
+		import json
+		from lib.peec import crossCheck, widthScan, widthTable, FILAMENTS
+		from lib.birdcage_math import settingsFromJson
+		with open(args.cross_check) as file:
+			settings = settingsFromJson(json.load(file))
+		filaments = args.filaments or FILAMENTS
+		print(crossCheck(settings, filaments).summary())
+		print()
+		print(widthTable(widthScan(settings, filaments=filaments)))
+		raise SystemExit
+	if args.build_surrogate is not None:
+		setupLogging()
+		from lib.surrogate import buildTables, DEFAULT_LEGS
+		buildTables(args.build_surrogate or DEFAULT_LEGS, workers=args.workers)
+		raise SystemExit
+	if args.optimize is not None:
+		setupLogging()
+		from lib.birdcage_math import BirdcageSettings
+		from lib.optimizer import Optimizer
+		optimizer = Optimizer(BirdcageSettings(), workers=args.workers or os.cpu_count(), checkpoint=args.checkpoint)
+		optimizer.run(args.optimize)
+		print(optimizer.summary())
+		raise SystemExit
+	if args.library_add is not None or args.nearest is not None:
+		setupLogging()
+		import json
+		from lib.design_library import DesignLibrary, DEFAULT_DIRECTORY
+		from lib.birdcage_math import settingsFromJson
+		library = DesignLibrary(args.library or DEFAULT_DIRECTORY)
+		if args.library_add is not None:
+			if os.path.isdir(args.library_add):
+				from lib.result_store import ResultStore
+				count = library.importSweep(ResultStore(args.library_add))
+			else:
+				with open(args.library_add) as file:
+					designs = json.load(file)
+				count = len(library.add([settingsFromJson(d) for d in (designs if isinstance(designs, list) else [designs])]))
+			logger.info(f"{count} designs saved to the library ({len(library)} in total)")
+		else:
+			with open(args.nearest) as file:
+				settings = settingsFromJson(json.load(file))
+			matches = library.within(settings, args.radius) if args.radius is not None else library.nearest(settings, args.count)
+			print(library.summary(matches))
+		raise SystemExit
+	if args.sweep is not None:
+		setupLogging()
+		import json
+		from lib.result_store import writeSweep, measureTransport
+		with open(args.sweep[0]) as file:
+			spec = json.load(file)
+		workers = args.workers or os.cpu_count()
+		if args.transport_time:
+			times = measureTransport(spec, args.sweep[1], max(workers, 2))
+			print(f"Shared memory map: {times['shared']:.2f} s, {times['shared_bytes']} bytes sent back\n"
+				f"Pickled results:   {times['pickle']:.2f} s, {times['pickle_bytes']} bytes sent back")
+			raise SystemExit
+		rows = writeSweep(args.sweep[1], spec, workers=workers, dtype="float32" if args.float32 else "float64")
+		logger.info(f"{rows} sweep results written to {args.sweep[1]}")
+		raise SystemExit
+
 	root = tk.Tk()
 	root.withdraw()
 
@@ -667,6 +1434,20 @@ if __name__ == "__main__":
 
 	mygui = MainApplication(root)
 	root.deiconify()
-
-	logger.info("Program start successfully")
+	root.update()
+
+	startup_time = (time.perf_counter() - _START_TIME) * 1000
+	if args.startup_time:
+		print(f"Startup time until first paint: {startup_time:.0f} ms (budget {STARTUP_BUDGET} ms)")
+		root.destroy()
+		raise SystemExit(startup_time > STARTUP_BUDGET)
+	if args.redraw_time:
+		first, median = measureRedrawTime(mygui, root)
+		print(f"Redraw time at {REDRAW_LEGS} legs: first {first:.1f} ms, then {median:.1f} ms")
+		root.destroy()
+		raise SystemExit
+
+	setupLogging()
+	threading.Thread(target=preloadNumericBackends, daemon=True).start()
+	logger.info(f"Program start successfully ({startup_time:.0f} ms)")
 	root.mainloop()
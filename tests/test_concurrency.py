@@ -0,0 +1,53 @@
+"""
+Description:    Tests that solve() gives the same results when it is called from many threads at once.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import itertools
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from lib.birdcage_math import BirdcageSettings, solve, HIGHPASS, LOWPASS, BANDPASS, RECT, TUBE, LEG, ER, ELLIPSE
+
+THREADS = 8
+REPEATS = 4
+
+
+def designs():
+	# every mode and conductor type at several leg counts, and elliptical coils
+	settings = []
+	for nr_of_legs, (coil_mode, bp_config), config in itertools.product((8, 12, 16, 32), ((HIGHPASS, LEG), (LOWPASS, LEG), (BANDPASS, LEG), (BANDPASS, ER)), (RECT, TUBE)):
+		settings.append(BirdcageSettings(nr_of_legs=nr_of_legs, coil_mode=coil_mode, bp_config=bp_config, leg_config=config, er_config=config))
+	for nr_of_legs, shortaxis in itertools.product((8, 16, 24), (0, 1)):
+		settings.append(BirdcageSettings(nr_of_legs=nr_of_legs, coil_shape=ELLIPSE, shortaxis=shortaxis))
+	return settings
+
+
+class ConcurrentSolveTest(unittest.TestCase):
+
+	def testSameAsSerial(self):
+		settings = designs()
+		serial = [solve(s).results() for s in settings]
+		with ThreadPoolExecutor(THREADS) as executor:
+			parallel = list(executor.map(lambda s: solve(s).results(), settings * REPEATS))
+		for i, result in enumerate(parallel):
+			self.assertEqual(result, serial[i % len(settings)], settings[i % len(settings)].asDict())
+
+	def testSharedSettings(self):
+		# one settings object used by all threads at once must not be changed by the calculation
+		settings = BirdcageSettings(nr_of_legs=16, coil_mode=BANDPASS)
+		expected = solve(settings).results()
+		before = settings.asDict()
+		with ThreadPoolExecutor(THREADS) as executor:
+			results = list(executor.map(lambda _: solve(settings).results(), range(THREADS * REPEATS)))
+		self.assertTrue(all(result == expected for result in results))
+		self.assertEqual(settings.asDict(), before)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,133 @@
+"""
+Description:    Tests of the design library and its KD-tree against a brute force search.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import math
+import tempfile
+import unittest
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, HIGHPASS, LOWPASS
+from lib.design_library import KDTree, DesignLibrary, FIELDS, SETTINGS, INDEX_FILE
+
+
+def bruteNearest(points, point, k):
+	distances = ((points - point) ** 2).sum(axis=1)
+	order = np.argsort(distances, kind='stable')[:k]
+	return order, distances[order]
+
+
+def bruteWithin(points, point, radius):
+	distances = ((points - point) ** 2).sum(axis=1)
+	return set(np.flatnonzero(distances <= radius ** 2).tolist())
+
+
+def randomRecords(rng, count):
+	# rows of FIELDS with random circular designs of two coil modes, the results are not used by the search
+	rows = np.zeros((count, len(FIELDS)))
+	values = dict(BirdcageSettings().asDict(),
+				res_freq=rng.uniform(50, 500, count),
+				nr_of_legs=rng.choice([8, 12, 16, 32], count),
+				coil_diameter=rng.uniform(10, 40, count),
+				shield_diameter=rng.uniform(42, 60, count),
+				leg_length=rng.uniform(5, 40, count),
+				leg_width=rng.uniform(0.2, 2, count),
+				er_width=rng.uniform(0.2, 2, count),
+				coil_mode=rng.choice([HIGHPASS, LOWPASS], count))
+	for i, field in enumerate(SETTINGS):
+		rows[:, i] = values[field]
+	return rows
+
+
+class KDTreeTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.default_rng(1)
+		self.points = rng.normal(size=(5000, 5)) * (1, 2, 5, 0.5, 1)
+		self.queries = np.concatenate([rng.normal(size=(20, 5)) * 3, self.points[:5]])
+		self.tree = KDTree(self.points, leaf_size=16)
+
+	def testNearest(self):
+		for point in self.queries:
+			for k in (1, 7, 100):
+				indices, distances = self.tree.nearest(point, k)
+				expected, expected_distances = bruteNearest(self.points, point, k)
+				self.assertEqual(indices.tolist(), expected.tolist())
+				np.testing.assert_allclose(distances, expected_distances, rtol=1e-12)
+
+	def testWithin(self):
+		for point in self.queries:
+			for radius in (0.5, 2, 6):
+				indices, distances = self.tree.within(point, radius)
+				self.assertEqual(len(indices), len(set(indices.tolist())))
+				self.assertEqual(set(indices.tolist()), bruteWithin(self.points, point, radius))
+				np.testing.assert_allclose(distances, ((self.points[indices] - point) ** 2).sum(axis=1), rtol=1e-12)
+
+	def testSavedOrder(self):
+		# a tree from a saved order is the same tree
+		tree = KDTree(self.points, leaf_size=16, order=self.tree.order.copy())
+		for point in self.queries:
+			self.assertEqual(tree.nearest(point, 10)[0].tolist(), self.tree.nearest(point, 10)[0].tolist())
+
+	def testSmall(self):
+		for n in (0, 1, 2, 17):
+			points = np.arange(n * 2, dtype=float).reshape(n, 2)
+			tree = KDTree(points, leaf_size=4)
+			self.assertEqual(tree.nearest(np.zeros(2), 3)[0].tolist(), list(range(min(n, 3))))
+			self.assertEqual(set(tree.within(np.zeros(2), 5)[0].tolist()), bruteWithin(points, np.zeros(2), 5))
+
+
+class DesignLibraryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.rng = np.random.default_rng(2)
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def compare(self, library):
+		# also the first and last saved design and the first one that is not in the tree
+		numbers = (0, len(library.tree) - 1, len(library.tree), len(library) - 1)
+		for number in numbers:
+			if number < len(library):
+				self.assertEqual(library.nearest(library.settings(number), 1), [(number, 0.0)])
+		for settings in (BirdcageSettings(), BirdcageSettings(coil_mode=LOWPASS, res_freq=128, nr_of_legs=16, leg_length=12)) \
+				+ tuple(library.settings(number) for number in numbers if number < len(library)):
+			point = library._point(settings)
+			expected, expected_distances = bruteNearest(library.coordinates, point, 12)
+			self.assertEqual([number for number, _ in library.nearest(settings, 12)], expected.tolist())
+			for radius in (5, 15):
+				matches = library.within(settings, radius)
+				self.assertEqual({number for number, _ in matches}, bruteWithin(library.coordinates, point, radius))
+				self.assertEqual([d for _, d in matches], sorted(d for _, d in matches))
+
+	def testPendingRows(self):
+		library = DesignLibrary(self.directory.name)
+		library._append(randomRecords(self.rng, 3000))
+		self.assertEqual(len(library.tree), 3000)
+		self.compare(library)
+
+		# appended after the tree was built: searched one by one until the tree is rebuilt
+		library._append(randomRecords(self.rng, 500))
+		self.assertEqual(len(library.tree), 3000)
+		self.compare(library)
+
+		# another program reading the same library uses the saved index and the pending rows
+		other = DesignLibrary(self.directory.name)
+		self.assertEqual(len(other.tree), 3000)
+		self.compare(other)
+
+		library._append(randomRecords(self.rng, 1500))
+		self.assertEqual(len(library.tree), 5000)
+		self.compare(library)
+		self.assertEqual(np.load(f"{self.directory.name}/{INDEX_FILE}").tolist(), library.tree.order.tolist())
+		self.assertTrue(math.isfinite(library.nearest(BirdcageSettings(), 1)[0][1]))
+
+
+if __name__ == "__main__":
+	unittest.main()
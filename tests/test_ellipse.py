@@ -0,0 +1,35 @@
+"""
+Description:    Tests of the elliptical coil calculation.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import unittest
+from lib.birdcage_math import BirdcageSettings, solve, ELLIPSE, SHORT, LONG, RECT, TUBE
+
+
+class EllipseTest(unittest.TestCase):
+
+	def testPracticallyCircular(self):
+		# every capacitor of a practically circular ellipse equals the capacitor of the circular coil, for both drive axes
+		for nr_of_legs in (8, 12, 16, 32, 64):
+			for config in (RECT, TUBE):
+				circle = solve(BirdcageSettings(nr_of_legs=nr_of_legs, coil_diameter=20, leg_config=config, er_config=config)).capacitor
+				for shortaxis in (SHORT, LONG):
+					ellipse = solve(BirdcageSettings(nr_of_legs=nr_of_legs, coil_shape=ELLIPSE, coil_long_diameter=20.0001, coil_short_diameter=20,
+													shortaxis=shortaxis, leg_config=config, er_config=config))
+					self.assertEqual(len(ellipse.capacitors), nr_of_legs // 4)
+					for capacitor in ellipse.capacitors:
+						self.assertAlmostEqual(capacitor / circle, 1, delta=1e-5, msg=f"{nr_of_legs} legs, shortaxis {shortaxis}")
+
+	def testElliptical(self):
+		# a real ellipse needs different capacitors around the quadrant
+		capacitors = solve(BirdcageSettings(nr_of_legs=16, coil_shape=ELLIPSE, coil_long_diameter=30, coil_short_diameter=22)).capacitors
+		self.assertGreater(max(capacitors) / min(capacitors), 1.01)
+
+
+if __name__ == "__main__":
+	unittest.main()
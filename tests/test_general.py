@@ -0,0 +1,44 @@
+"""
+Description:    Tests of the general solver for arbitrary leg positions.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import itertools
+import unittest
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, solve, HIGHPASS, LOWPASS, BANDPASS, LEG, ER, RECT, TUBE
+from lib.birdcage_general import GeneralBirdcage, circularPositions, allModes
+
+
+class RegularCoilTest(unittest.TestCase):
+
+	def testSameAsSolver(self):
+		# equally spaced legs with the homogeneous pattern give the capacitors and inductances of the solver, in every mode
+		for nr_of_legs, (coil_mode, bp_config), config in itertools.product((8, 12, 16, 32, 64), ((HIGHPASS, LEG), (LOWPASS, LEG), (BANDPASS, LEG), (BANDPASS, ER)), (RECT, TUBE)):
+			settings = BirdcageSettings(nr_of_legs=nr_of_legs, coil_mode=coil_mode, bp_config=bp_config, leg_config=config, er_config=config)
+			expected = solve(settings).results()
+			result = GeneralBirdcage(settings, *circularPositions(nr_of_legs, settings.coil_diameter)).solve()
+			message = f"{nr_of_legs} legs, mode {coil_mode}, bp_config {bp_config}, config {config}"
+
+			capacitors = result.capacitors[np.isfinite(result.capacitors)]
+			self.assertGreaterEqual(len(capacitors), nr_of_legs - 2, message)
+			np.testing.assert_allclose(capacitors, expected["capacitor"], rtol=1e-9, err_msg=message)
+			np.testing.assert_allclose(np.nanmax(result.er_eff_ind), expected["er_eff_ind"], rtol=1e-9, err_msg=message)
+			np.testing.assert_allclose(result.leg_eff_ind, expected["leg_eff_ind"], rtol=1e-9, err_msg=message)
+
+	def testAllModes(self):
+		# solving all patterns at once gives the same as one at a time
+		x, y = circularPositions(16, 30, removed=(3, 4))
+		coil = GeneralBirdcage(BirdcageSettings(), x, y)
+		modes, currents, quadrature = allModes(x, y)
+		together = coil.solve(currents, quadrature).capacitors
+		for i in range(len(modes)):
+			np.testing.assert_allclose(coil.solve(currents[i], quadrature[i]).capacitors, together[i])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,33 @@
+"""
+Description:    Tests of the multi-objective design search.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import unittest
+import numpy as np
+from lib.birdcage_math import BirdcageSettings
+from lib.optimizer import Optimizer, DEFAULT_BOUNDS
+
+
+class OptimizerTest(unittest.TestCase):
+
+	def testFailedDesignInsideShield(self):
+		# every design fits inside the shield, so only the failed calculations make a design infeasible
+		bounds = dict(DEFAULT_BOUNDS, coil_diameter=(10, 20), shield_diameter=(30, 50))
+		optimizer = Optimizer(BirdcageSettings(), bounds=bounds, population=16, seed=1)
+		failed = ~np.isfinite(optimizer.objectives).all(axis=1)
+		self.assertTrue(failed.any())
+		self.assertTrue(np.isinf(optimizer.violations[failed]).all())
+		self.assertTrue((optimizer.violations[~failed] == 0).all())
+
+		optimizer.run(2)
+		self.assertEqual(optimizer.generation, 2)
+		self.assertTrue(all(np.isfinite(list(design["objectives"].values())).all() for design in optimizer.archive))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,60 @@
+"""
+Description:    Tests of the sub-filament cross-check of the inductance formulas.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import math
+import unittest
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, TUBE
+from lib.peec import crossSection, crossCheck, _sectorLogGmd
+
+
+def cellPoints(r0, r1, phi0, phi1, count):
+	# midpoints and areas of a count x count grid over an annular sector
+	r = r0 + (np.arange(count) + 0.5) * (r1 - r0) / count
+	phi = phi0 + (np.arange(count) + 0.5) * (phi1 - phi0) / count
+	r, phi = (a.ravel() for a in np.meshgrid(r, phi, indexing='ij'))
+	return np.stack([r * np.cos(phi), r * np.sin(phi)], axis=1), r
+
+
+class SectorGmdTest(unittest.TestCase):
+
+	def testNumerical(self):
+		# the same as a plain numerical mean of ln(distance) over both cells
+		edges = np.array([0.3, 0.4, 0.5])
+		width = 2 * math.pi / 8
+		log_gmd = _sectorLogGmd(edges, 8)
+		for a, i, b, j in ((0, 0, 1, 0), (0, 0, 1, 1), (1, 2, 0, 5), (0, 0, 0, 2), (1, 3, 1, 4)):
+			p, p_weight = cellPoints(edges[a], edges[a + 1], i * width, (i + 1) * width, 50)
+			q, q_weight = cellPoints(edges[b], edges[b + 1], j * width, (j + 1) * width, 50)
+			logs = np.log(np.linalg.norm(p[:, None, :] - q[None, :, :], axis=-1))
+			expected = (logs * p_weight[:, None] * q_weight[None, :]).sum() / (p_weight.sum() * q_weight.sum())
+			self.assertAlmostEqual(log_gmd[a, b, i, j], expected, delta=2e-3, msg=(a, i, b, j))
+
+	def testWholeTube(self):
+		# all cells together have the geometric mean distance of the whole tube
+		for od, id_ in ((1, 0.6), (1, 0), (3, 2.9), (25, 10)):
+			whole = math.log(crossSection(TUBE, 0, od, id_, 1)[2][0, 0])
+			for filaments in (2, 4, 8):
+				_, weights, gmd = crossSection(TUBE, 0, od, id_, filaments)
+				self.assertTrue(np.isfinite(gmd).all())
+				self.assertAlmostEqual((weights[:, None] * weights[None, :] * np.log(gmd)).sum(), whole, delta=1e-9)
+
+
+class CrossCheckTest(unittest.TestCase):
+
+	def testConverged(self):
+		for settings in (BirdcageSettings(), BirdcageSettings(leg_config=TUBE, er_config=TUBE)):
+			result = crossCheck(settings, 2)
+			for key, change in result.convergence().items():
+				self.assertLess(abs(change), 1e-3, msg=key)
+			self.assertLess(abs(result.deviation()["capacitor"]), 0.02)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,95 @@
+"""
+Description:    Tests of the request handling of the solve server.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import asyncio
+import json
+import unittest
+from unittest import mock
+import lib.server
+from lib.birdcage_math import BirdcageSettings
+from lib.server import SolveServer
+
+
+async def request(server, data):
+	# sends raw request bytes to a connection handler and returns the status code and the JSON body of the response
+	listener = await asyncio.start_server(server._handleConnection, "127.0.0.1", 0)
+	async with listener:
+		port = listener.sockets[0].getsockname()[1]
+		reader, writer = await asyncio.open_connection("127.0.0.1", port)
+		writer.write(data)
+		await writer.drain()
+		response = await reader.read()
+		writer.close()
+	header, _, body = response.partition(b"\r\n\r\n")
+	return int(header.split(b" ")[1]), json.loads(body)
+
+
+class ServerRequestTest(unittest.TestCase):
+
+	def setUp(self):
+		self.server = SolveServer(workers=1)
+
+	def tearDown(self):
+		self.server.executor.shutdown()
+
+	def testMalformedContentLength(self):
+		for length in (b"abc", b"-5"):
+			status, body = asyncio.run(request(self.server, b"POST /solve HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}"))
+			self.assertEqual(status, 400)
+			self.assertEqual(body, {"error": "Malformed request"})
+
+	def testUnknownSetting(self):
+		body = b'{"coil_radius": 15}'
+		status, response = asyncio.run(request(self.server, b"POST /solve HTTP/1.1\r\nConnection: close\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body))
+		self.assertEqual(status, 400)
+		self.assertEqual(response, {"error": "Unknown setting 'coil_radius'"})
+
+	def testHeaderTooLarge(self):
+		status, body = asyncio.run(request(self.server, b"GET /health HTTP/1.1\r\nX-Padding: " + b"a" * 70000 + b"\r\n\r\n"))
+		self.assertEqual(status, 431)
+
+	def testInternalError(self):
+		body = b'{"nr_of_legs": 16}'
+		with mock.patch("lib.server.solveMany", side_effect=RuntimeError("solver failed")):
+			status, response = asyncio.run(request(self.server, b"POST /solve HTTP/1.1\r\nConnection: close\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body))
+		self.assertEqual(status, 200)
+		self.assertEqual(response, {"error": "No valid result for these settings"})
+
+		with mock.patch("lib.server._solveMany", side_effect=RuntimeError("solver failed")):
+			status, response = asyncio.run(request(self.server, b"POST /solve HTTP/1.1\r\nConnection: close\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body))
+		self.assertEqual(status, 500)
+		self.assertEqual(response, {"error": "Internal server error"})
+
+	def testHealth(self):
+		status, body = asyncio.run(request(self.server, b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n"))
+		self.assertEqual(status, 200)
+		self.assertEqual(body["status"], "ok")
+
+
+class SolveManyTest(unittest.TestCase):
+
+	def testFailingDesign(self):
+		# a design that breaks the batch is left out, the others are still calculated
+		solveMany = lib.server.solveMany
+
+		def failing(settings_list):
+			if any(settings.nr_of_legs == 16 for settings in settings_list):
+				raise RuntimeError("solver failed")
+			return solveMany(settings_list)
+
+		designs = [BirdcageSettings(nr_of_legs=8), BirdcageSettings(nr_of_legs=16), BirdcageSettings(nr_of_legs=12)]
+		with mock.patch("lib.server.solveMany", side_effect=failing):
+			results = lib.server._solveMany(designs)
+		self.assertIsNone(results[1])
+		self.assertEqual(results[0], solveMany([designs[0]])[0])
+		self.assertEqual(results[2], solveMany([designs[2]])[0])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,82 @@
+"""
+Description:    Tests of the precomputed approximate calculations.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import asyncio
+import json
+import tempfile
+import unittest
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, solve, ELLIPSE, HIGHPASS, LOWPASS, BANDPASS, LEG, ER
+from lib.surrogate import Surrogate, buildTable, _capacitors, MAX_ERROR
+from lib.server import SolveServer
+from tests.test_server import request
+
+MODES = ((HIGHPASS, LEG), (LOWPASS, LEG), (BANDPASS, LEG), (BANDPASS, ER))
+
+
+class SurrogateTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.directory = tempfile.TemporaryDirectory()
+		buildTable(8, cls.directory.name)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.directory.cleanup()
+
+	def testWithinError(self):
+		surrogate = Surrogate(self.directory.name)
+		rng = np.random.default_rng(1)
+		answered = 0
+		for _ in range(200):
+			coil_mode, bp_config = MODES[rng.integers(len(MODES))]
+			settings = BirdcageSettings(nr_of_legs=8, coil_mode=coil_mode, bp_config=bp_config, res_freq=float(rng.uniform(64, 300)),
+										coil_diameter=float(rng.uniform(10, 30)), shield_diameter=float(rng.uniform(32, 60)),
+										leg_length=float(rng.uniform(5, 40)))
+			result = surrogate.lookup(settings)
+			if result is None:
+				continue
+			answered += 1
+			self.assertAlmostEqual(result["capacitor"] / solve(settings).capacitor, 1, delta=MAX_ERROR)
+		self.assertGreater(answered, 150)
+
+	def testCapacitorFormula(self):
+		# with the exact inductances the capacitor is the exact one
+		for nr_of_legs in (8, 16, 32):
+			geometry = Surrogate._constants(nr_of_legs)[0]
+			for coil_mode, bp_config in MODES:
+				solver = solve(BirdcageSettings(nr_of_legs=nr_of_legs, coil_mode=coil_mode, bp_config=bp_config))
+				capacitor, = _capacitors(solver.settings, geometry, [solver.results()["leg_eff_ind"]], solver.results()["er_eff_ind"])
+				self.assertAlmostEqual(capacitor / solver.capacitor, 1, delta=1e-12)
+
+	def testExactFallback(self):
+		surrogate = Surrogate(self.directory.name)
+		for settings in (BirdcageSettings(nr_of_legs=12), BirdcageSettings(nr_of_legs=8, coil_shape=ELLIPSE, shield_diameter=44)):
+			self.assertIsNone(surrogate.lookup(settings))
+			self.assertEqual(surrogate.results(settings), solve(settings).results())
+		self.assertEqual(surrogate.misses, 2)
+
+	def testServer(self):
+		server = SolveServer(workers=1)
+		server.surrogate = Surrogate(self.directory.name)
+		try:
+			for design, approximate in (({"nr_of_legs": 8}, True), ({"nr_of_legs": 12}, False)):
+				body = json.dumps(design).encode()
+				status, response = asyncio.run(request(server, b"POST /solve?approx=1 HTTP/1.1\r\nConnection: close\r\nContent-Length: "
+														+ str(len(body)).encode() + b"\r\n\r\n" + body))
+				self.assertEqual(status, 200)
+				self.assertEqual(response.get("approximate", False), approximate)
+				self.assertAlmostEqual(response["capacitor"] / solve(BirdcageSettings(**design)).capacitor, 1, delta=MAX_ERROR)
+		finally:
+			server.executor.shutdown()
+
+
+if __name__ == "__main__":
+	unittest.main()
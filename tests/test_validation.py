@@ -0,0 +1,69 @@
+"""
+Description:    Tests of the checks on coil settings before they are calculated.
+Author: 		Dimitri Welting
+Website: 		http://github.com/dwelting/pyBirdcagebuilder
+License: 		Copyright (c) 2020 Dimitri Welting. All rights reserved.
+				Distributed under the MIT license. The full text of the license can be found in the LICENSE file or on the above-mentioned website.
+				This code is free to download and use. Any paid service providing this code is not endorsed by the author.
+"""
+
+import math
+import unittest
+import numpy as np
+from lib.birdcage_math import BirdcageSettings, ELLIPSE, TUBE, LOWPASS, BANDPASS
+from lib.birdcage_batch import settingsToColumns
+from lib.validation import validate, validateColumns, validateSettings, INVALID_VALUE, UNKNOWN_OPTION, INVALID_LEG_COUNT, \
+	SHIELD_INSIDE_COIL, ID_NOT_BELOW_OD, LEGS_OVERLAP, INVALID_ELLIPSE, ELLIPSE_NOT_HIGHPASS
+
+# settings and the error code they should get
+CASES = ((BirdcageSettings(), 0),
+		(BirdcageSettings(shield_diameter=30), SHIELD_INSIDE_COIL),
+		(BirdcageSettings(shield_diameter=25), SHIELD_INSIDE_COIL),
+		(BirdcageSettings(shield_diameter=0), 0),  # no shield
+		(BirdcageSettings(leg_config=TUBE, leg_od=1, leg_id=1), ID_NOT_BELOW_OD),
+		(BirdcageSettings(er_config=TUBE, er_od=1, er_id=1.2), ID_NOT_BELOW_OD),
+		(BirdcageSettings(leg_od=1, leg_id=1), 0),  # the tube sizes of strips are not used
+		(BirdcageSettings(nr_of_legs=64, coil_diameter=10, shield_diameter=12, leg_width=1), LEGS_OVERLAP),
+		(BirdcageSettings(nr_of_legs=64, coil_diameter=10, shield_diameter=12, leg_width=0.4), 0),
+		(BirdcageSettings(coil_shape=ELLIPSE, shield_diameter=44), 0),
+		(BirdcageSettings(coil_shape=ELLIPSE, shield_diameter=44, coil_mode=LOWPASS), ELLIPSE_NOT_HIGHPASS),
+		(BirdcageSettings(coil_shape=ELLIPSE, shield_diameter=44, coil_mode=BANDPASS), ELLIPSE_NOT_HIGHPASS),
+		(BirdcageSettings(coil_shape=ELLIPSE, shield_diameter=44, coil_short_diameter=42), INVALID_ELLIPSE),
+		(BirdcageSettings(coil_shape=ELLIPSE), SHIELD_INSIDE_COIL),  # the long diameter counts
+		(BirdcageSettings(nr_of_legs=10), INVALID_LEG_COUNT),
+		(BirdcageSettings(leg_length=0), INVALID_VALUE),
+		(BirdcageSettings(res_freq=math.nan), INVALID_VALUE),
+		(BirdcageSettings(coil_mode=7), UNKNOWN_OPTION),
+		(BirdcageSettings(shield_diameter=30, leg_config=TUBE, leg_id=1, coil_mode=LOWPASS), SHIELD_INSIDE_COIL | ID_NOT_BELOW_OD))
+
+
+class ValidationTest(unittest.TestCase):
+
+	def testCodes(self):
+		for settings, code in CASES:
+			self.assertEqual(validate(settings), code, msg=str(settings.asDict()))
+
+	def testColumnsEqualScalar(self):
+		# every row of a batch gets the same code as the design on its own
+		settings_list = [settings for settings, _ in CASES]
+		rng = np.random.default_rng(1)
+		for _ in range(500):
+			settings_list.append(BirdcageSettings(nr_of_legs=int(rng.choice([4, 8, 10, 12, 16, 32, 64])),
+												coil_shape=int(rng.integers(2)),
+												coil_mode=int(rng.integers(1, 4)),
+												leg_config=int(rng.integers(1, 3)),
+												coil_diameter=float(rng.uniform(5, 40)),
+												coil_long_diameter=float(rng.uniform(5, 40)),
+												coil_short_diameter=float(rng.uniform(5, 40)),
+												shield_diameter=float(rng.uniform(0, 50)),
+												leg_width=float(rng.uniform(0, 3)),
+												leg_od=float(rng.uniform(0.1, 2)),
+												leg_id=float(rng.uniform(0, 2))))
+		codes = validateColumns(settingsToColumns(settings_list))
+		self.assertEqual(codes.tolist(), [validate(settings) for settings in settings_list])
+		self.assertEqual(validateSettings(settings_list), codes.tolist())
+		self.assertGreater(len(set(codes.tolist())), 5)
+
+
+if __name__ == "__main__":
+	unittest.main()